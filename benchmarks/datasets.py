@@ -0,0 +1,103 @@
+"""Issue datasets for the benchmarks.
+
+seed_issues() turns similarity_model/data/issues.csv into Firestore-shaped
+issue documents; synthetic_issues() scales it to any size by spreading
+variants of those complaints over many generated pincodes.
+"""
+import csv
+import os
+import random
+import re
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CSV_PATH = os.path.join(ROOT, "similarity_model", "data", "issues.csv")
+
+PINCODE = re.compile(r"\b\d{6}\b")
+
+STATUSES = ["Pending"] * 6 + ["In Progress"] * 3 + ["Resolved"]
+
+FEEDBACK = [
+    "Thank you, the work was done quickly and properly.",
+    "Still not fixed after weeks, very disappointing.",
+    "The team came but left the job half done.",
+    "Great response from the authorities, much appreciated!",
+    "Nobody has visited the site yet.",
+    "Temporary patch only, the problem is back again.",
+    "Excellent work, the street looks clean now.",
+    "Terrible service, complaints are being ignored.",
+    "Okay for now, let's see if it lasts.",
+    "Worst handling of a simple issue I have seen.",
+]
+
+QUALIFIERS = ["", "", "urgent", "again", "near the school", "since last week",
+              "in our lane", "very bad", "please help", "for days"]
+
+
+def load_csv(path=CSV_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+def _issue(row, pincode, rng, index):
+    address = PINCODE.sub(pincode, row["address"])
+    qualifier = rng.choice(QUALIFIERS)
+    title = f"{row['title']} {qualifier}".strip()
+    day = 1 + index % 28
+    descriptions = [{"text": row["description"], "date": f"2025-01-{day:02d}"}]
+    if rng.random() < 0.3:
+        descriptions.append({"text": f"Update: {rng.choice(QUALIFIERS) or 'no change'}.",
+                             "date": f"2025-02-{day:02d}"})
+
+    return {
+        "issueTitle": title,
+        "description": descriptions,
+        "category": row["category"],
+        "address": address,
+        "upvotes": rng.randint(0, 200),
+        "media": [f"https://media.example/{index}/{i}.jpg" for i in range(rng.randint(0, 3))],
+        "dateOfComplaint": f"2025-01-{day:02d}",
+        "status": rng.choice(STATUSES),
+        "feedback": [{"feedback": rng.choice(FEEDBACK)} for _ in range(rng.randint(0, 12))],
+    }
+
+
+# The CSV as issue documents, keeping each row's own pincode
+def seed_issues(seed=0):
+    rng = random.Random(seed)
+    issues = {}
+    for i, row in enumerate(load_csv()):
+        match = PINCODE.search(row["address"])
+        issues[f"seed{i:06d}"] = _issue(row, match.group(0) if match else "000000", rng, i)
+    return issues
+
+
+# n issues spread over roughly n / issues_per_pincode pincodes. Pincodes are
+# grouped under shared 3-digit prefixes like real postal districts.
+def synthetic_issues(n, issues_per_pincode=50, seed=0):
+    rng = random.Random(seed)
+    rows = load_csv()
+    pincode_count = max(1, n // issues_per_pincode)
+    districts = [f"{rng.randint(110, 859)}" for _ in range(max(1, pincode_count // 20))]
+    pincodes = [f"{rng.choice(districts)}{rng.randint(0, 999):03d}" for _ in range(pincode_count)]
+
+    return {
+        f"syn{i:07d}": _issue(rng.choice(rows), rng.choice(pincodes), rng, i)
+        for i in range(n)
+    }
+
+
+def build_issues(count, seed=0):
+    issues = seed_issues(seed)
+    if count > len(issues):
+        issues.update(synthetic_issues(count - len(issues), seed=seed))
+    return issues
+
+
+# A new-complaint payload for /find_similar based on an existing issue
+def similarity_query(issue):
+    return {
+        "issueTitle": issue["issueTitle"],
+        "description": issue["description"][0]["text"],
+        "category": issue["category"],
+        "address": issue["address"],
+    }
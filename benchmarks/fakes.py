@@ -0,0 +1,289 @@
+"""Local stand-ins for Firestore and Gemini used by the benchmark runner.
+
+install() registers fake `firebase_admin` and `google.generativeai` modules
+in sys.modules, so a service's app.py can be imported unchanged and served
+from in-memory data.
+"""
+import os
+import sys
+import threading
+import time
+import types
+
+# The Gemini stand-in is shared with the services (CHAT_BACKEND=fake)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.fake_gemini import FakeGenerativeModel
+
+
+# ---------------------------------------------------------------- Firestore
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference, data, field_paths=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        if data is not None and field_paths:
+            data = {k: data[k] for k in field_paths if k in data}
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, collection, doc_id):
+        self._collection = collection
+        self.id = doc_id
+        self.path = f"{collection.id}/{doc_id}"
+
+    def get(self, field_paths=None):
+        self._collection._store.read_latency()
+        return FakeDocumentSnapshot(self, self._collection._docs.get(self.id), field_paths)
+
+    def set(self, data, merge=False):
+        current = self._collection._docs.get(self.id) if merge else None
+        self._collection._write(self.id, {**(current or {}), **data})
+
+    def update(self, data):
+        current = self._collection._docs.get(self.id)
+        if current is None:
+            raise KeyError(f"No document to update: {self.path}")
+        self._collection._write(self.id, {**current, **data})
+
+    def delete(self):
+        self._collection._delete(self.id)
+
+
+class FakeQuery:
+    def __init__(self, collection, filters=(), fields=None, order=None, limit=None, after=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._order = order
+        self._limit = limit
+        self._after = after
+
+    def _copy(self, **changes):
+        state = dict(filters=self._filters, fields=self._fields, order=self._order,
+                     limit=self._limit, after=self._after)
+        state.update(changes)
+        return FakeQuery(self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def order_by(self, field_path, direction=None):
+        return self._copy(order=field_path)
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot_or_fields):
+        return self._copy(after=getattr(snapshot_or_fields, "id", snapshot_or_fields))
+
+    def stream(self):
+        store = self._collection._store
+        ids = list(self._collection._docs)
+        if self._order == "__name__":
+            ids.sort()
+        if self._after is not None:
+            ids = ids[ids.index(self._after) + 1:] if self._after in ids else []
+
+        produced = 0
+        for doc_id in ids:
+            data = self._collection._docs.get(doc_id)
+            if data is None or not all(_matches(data, f) for f in self._filters):
+                continue
+            if self._limit is not None and produced >= self._limit:
+                return
+            store.stream_latency()
+            produced += 1
+            yield FakeDocumentSnapshot(
+                FakeDocumentReference(self._collection, doc_id), data, self._fields
+            )
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        return self._collection.on_snapshot(callback)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, store, name):
+        self._store = store
+        self.id = name
+        self._docs = store.data.setdefault(name, {})
+        self._listeners = []
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        if doc_id is None:
+            doc_id = f"auto{len(self._docs) + 1:08d}"
+        return FakeDocumentReference(self, doc_id)
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+    def on_snapshot(self, callback):
+        self._listeners.append(callback)
+        changes = [_FakeChange("ADDED", FakeDocumentSnapshot(self.document(i), d))
+                   for i, d in self._docs.items()]
+        callback([c.document for c in changes], changes, None)
+        return _FakeWatch(self._listeners, callback)
+
+    def _write(self, doc_id, data):
+        change_type = "MODIFIED" if doc_id in self._docs else "ADDED"
+        self._docs[doc_id] = data
+        self._emit(change_type, doc_id, data)
+
+    def _delete(self, doc_id):
+        data = self._docs.pop(doc_id, None)
+        if data is not None:
+            self._emit("REMOVED", doc_id, data)
+
+    def _emit(self, change_type, doc_id, data):
+        change = _FakeChange(change_type, FakeDocumentSnapshot(self.document(doc_id), data))
+        for callback in list(self._listeners):
+            callback([change.document], [change], None)
+
+
+class FakeFirestoreClient:
+    def __init__(self, data=None, read_latency_ms=0.0, stream_latency_ms=0.0):
+        self.data = data if data is not None else {}
+        self.read_latency_ms = read_latency_ms
+        self.stream_latency_ms = stream_latency_ms
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = FakeCollection(self, name)
+            return self._collections[name]
+
+    def get_all(self, references, field_paths=None):
+        self.read_latency()
+        for ref in references:
+            yield FakeDocumentSnapshot(ref, ref._collection._docs.get(ref.id), field_paths)
+
+    def batch(self):
+        return FakeWriteBatch()
+
+    def read_latency(self):
+        if self.read_latency_ms:
+            time.sleep(self.read_latency_ms / 1000.0)
+
+    def stream_latency(self):
+        if self.stream_latency_ms:
+            time.sleep(self.stream_latency_ms / 1000.0)
+
+
+# Queues writes and applies them on commit(), like firestore.WriteBatch
+class FakeWriteBatch:
+    def __init__(self):
+        self._writes = []
+
+    def set(self, reference, data, merge=False):
+        self._writes.append(lambda: reference.set(data, merge=merge))
+
+    def update(self, reference, data):
+        self._writes.append(lambda: reference.update(data))
+
+    def delete(self, reference):
+        self._writes.append(reference.delete)
+
+    def commit(self):
+        for write in self._writes:
+            write()
+        self._writes = []
+
+
+class FakeFieldFilter:
+    def __init__(self, field_path, op_string, value):
+        self.field_path = field_path
+        self.op_string = op_string
+        self.value = value
+
+
+class _FakeChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeChange:
+    def __init__(self, change_type, document):
+        self.type = _FakeChangeType(change_type)
+        self.document = document
+
+
+class _FakeWatch:
+    def __init__(self, listeners, callback):
+        self._listeners = listeners
+        self._callback = callback
+
+    def unsubscribe(self):
+        if self._callback in self._listeners:
+            self._listeners.remove(self._callback)
+
+
+def _matches(data, condition):
+    field, op, value = condition
+    actual = data.get(field)
+    if op == "==":
+        return actual == value
+    if op == "!=":
+        return actual != value
+    if op == "in":
+        return actual in value
+    if op == "not-in":
+        return actual not in value
+    if op == "<":
+        return actual is not None and actual < value
+    if op == ">":
+        return actual is not None and actual > value
+    raise ValueError(f"Unsupported operator in fake Firestore: {op}")
+
+
+# ------------------------------------------------------------------ install
+
+def install(data=None, gemini_latency_ms=0.0, gemini_chunk_latency_ms=0.0,
+            firestore_read_latency_ms=0.0, firestore_stream_latency_ms=0.0):
+    client = FakeFirestoreClient(data, firestore_read_latency_ms, firestore_stream_latency_ms)
+
+    firebase_admin = types.ModuleType("firebase_admin")
+    credentials = types.ModuleType("firebase_admin.credentials")
+    firestore = types.ModuleType("firebase_admin.firestore")
+    credentials.Certificate = lambda info: info
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: client
+    firestore.FieldFilter = FakeFieldFilter
+    firebase_admin.credentials = credentials
+    firebase_admin.firestore = firestore
+
+    google = sys.modules.get("google") or types.ModuleType("google")
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = FakeGenerativeModel
+    google.generativeai = genai
+    FakeGenerativeModel.latency_ms = gemini_latency_ms
+    FakeGenerativeModel.chunk_latency_ms = gemini_chunk_latency_ms
+
+    sys.modules.update({
+        "firebase_admin": firebase_admin,
+        "firebase_admin.credentials": credentials,
+        "firebase_admin.firestore": firestore,
+        "google": google,
+        "google.generativeai": genai,
+    })
+    return client
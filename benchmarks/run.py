@@ -0,0 +1,294 @@
+"""Benchmark and load-test runner for the FixMyCity Python services.
+
+Each service is started in its own child process on top of the local
+Firestore/Gemini stand-ins in fakes.py, seeded from
+similarity_model/data/issues.csv (scaled synthetically with --issues), and
+driven through Flask's WSGI test client so numbers exclude network time.
+The report is JSON so runs can be diffed with --compare.
+
+    python benchmarks/run.py --issues 100000 --requests 2000 --concurrency 16 \\
+        --gemini-latency-ms 800 --output before.json
+    python benchmarks/run.py --compare before.json after.json
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import datasets
+import fakes
+
+ROOT = datasets.ROOT
+
+SERVICES = {
+    "similarity": "similarity_model",
+    "sentiment": "sentiment_analysis",
+    "summary": "comment_summary",
+}
+
+CHAT_MESSAGES = [
+    "how can I report an issue",
+    "how can I change my password",
+    "how can I view an issue",
+    "what do you do",
+]
+
+
+# ------------------------------------------------------------ measurements
+
+def rss_mb():
+    current = peak = None
+    try:
+        with open("/proc/self/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+                elif line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) / 1024
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return round(current or peak or 0, 1), round(peak or current or 0, 1)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+# Fire `count` requests from `concurrency` threads; make_request(i) returns a
+# Flask test response
+def drive(make_request, count, concurrency):
+    def one(i):
+        start = time.perf_counter()
+        response = make_request(i)
+        if response.is_streamed:
+            for _ in response.response:
+                pass
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(one, range(count)))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(ms * 1000 for ms, _ in outcomes)
+    errors = sum(1 for _, status in outcomes if status >= 500)
+    return {
+        "requests": count,
+        "errors": errors,
+        "concurrency": concurrency,
+        "throughput_rps": round(count / wall, 2) if wall else None,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(latencies[-1], 2),
+    }
+
+
+# ---------------------------------------------------------------- scenarios
+
+def similarity_scenario(app, issues, rng, config):
+    pool = list(issues.values())
+    queries = [datasets.similarity_query(rng.choice(pool)) for _ in range(config["requests"])]
+    return {
+        "find_similar": lambda i: app.test_client().post("/find_similar", json=queries[i]),
+    }
+
+
+def sentiment_scenario(app, issues, rng, config):
+    ids = list(issues)
+    picks = [rng.choice(ids) for _ in range(config["requests"])]
+    chats = [rng.choice(CHAT_MESSAGES) for _ in range(config["requests"])]
+    pages = [rng.sample(ids, min(config["bulk_size"], len(ids))) for _ in range(config["requests"])]
+    pincodes = sorted({datasets.PINCODE.search(issue["address"]).group(0) for issue in issues.values()})
+    areas = [rng.choice(["group_by=pincode&min_comments=5",
+                         "group_by=category,window&pincode=" + rng.choice(pincodes)])
+             for _ in range(config["requests"])]
+    return {
+        "analyze_sentiment": lambda i: app.test_client().get(f"/analyze-sentiment/{picks[i]}"),
+        "analyze_sentiment_bulk": lambda i: app.test_client().post(
+            "/analyze-sentiment/bulk", json={"issueIds": pages[i]}
+        ),
+        "area_sentiment": lambda i: app.test_client().get(f"/area-sentiment?{areas[i]}"),
+        "chat": lambda i: app.test_client().post("/chat", json={"chat": chats[i], "history": []}),
+    }
+
+
+def summary_scenario(app, issues, rng, config):
+    pool = [issue for issue in issues.values() if issue["feedback"]]
+    comments = [[f["feedback"] for f in rng.choice(pool)["feedback"]] for _ in range(config["requests"])]
+    return {
+        "summarize": lambda i: app.test_client().post("/summarize", json={"comments": comments[i]}),
+    }
+
+
+SCENARIOS = {
+    "similarity": similarity_scenario,
+    "sentiment": sentiment_scenario,
+    "summary": summary_scenario,
+}
+
+# Endpoints bounded by the (fake) Gemini latency get fewer requests
+GEMINI_ENDPOINTS = {"chat", "summarize"}
+# Endpoints that handle a whole page of issues per request get
+# requests / bulk_size of them
+BULK_ENDPOINTS = {"analyze_sentiment_bulk"}
+
+
+# ------------------------------------------------------------------- runner
+
+def run_service(service, config):
+    rng = random.Random(config["seed"])
+    issues = datasets.build_issues(config["issues"], config["seed"])
+    fakes.install(
+        {"issues": issues},
+        gemini_latency_ms=config["gemini_latency_ms"],
+        gemini_chunk_latency_ms=config["gemini_chunk_latency_ms"],
+        firestore_read_latency_ms=config["firestore_latency_ms"],
+    )
+
+    os.environ.setdefault("FIREBASE_PRIVATE_KEY", "benchmark")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    # The scenario queries /area-sentiment, which is opt-in
+    os.environ.setdefault("AREA_SENTIMENT", "1")
+    os.environ.update(config["env"])
+
+    service_dir = os.path.join(ROOT, SERVICES[service])
+    os.chdir(service_dir)
+    sys.path.insert(0, service_dir)
+
+    rss_before, _ = rss_mb()
+    start = time.perf_counter()
+    module = importlib.import_module("app")
+    startup_s = time.perf_counter() - start
+    rss_after_startup, _ = rss_mb()
+
+    endpoints = {}
+    for name, make_request in SCENARIOS[service](module.app, issues, rng, config).items():
+        count = config["requests"]
+        if name in GEMINI_ENDPOINTS:
+            count = min(count, config["gemini_requests"])
+        if name in BULK_ENDPOINTS:
+            count = max(1, count // config["bulk_size"])
+        endpoints[name] = drive(make_request, count, config["concurrency"])
+
+    rss_end, rss_peak = rss_mb()
+    return {
+        "service": service,
+        "issues": len(issues),
+        "startup_s": round(startup_s, 3),
+        "rss_mb_baseline": rss_before,
+        "rss_mb_after_startup": rss_after_startup,
+        "rss_mb_end": rss_end,
+        "rss_mb_peak": rss_peak,
+        "endpoints": endpoints,
+        # Per-stage and external call timings from the service's /metrics
+        "stages": module.metrics.summary() if hasattr(module, "metrics") else None,
+    }
+
+
+def spawn(service, config):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", service, "--config", json.dumps(config)],
+        capture_output=True, text=True,
+    )
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if result.returncode != 0 or not lines:
+        return {"service": service, "error": result.stderr.strip().splitlines()[-20:]}
+    return json.loads(lines[-1])
+
+
+def compare(old_path, new_path):
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)["services"]
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)["services"]
+
+    def delta(a, b):
+        if a in (None, 0) or b is None:
+            return "n/a"
+        return f"{(b - a) / a * 100:+.1f}%"
+
+    for service in sorted(set(old) & set(new)):
+        before, after = old[service], new[service]
+        print(f"{service}")
+        for key in ("startup_s", "rss_mb_after_startup", "rss_mb_peak"):
+            print(f"  {key:24} {before.get(key)} -> {after.get(key)} ({delta(before.get(key), after.get(key))})")
+        for endpoint in sorted(set(before.get("endpoints", {})) & set(after.get("endpoints", {}))):
+            a, b = before["endpoints"][endpoint], after["endpoints"][endpoint]
+            print(f"  {endpoint}")
+            for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms"):
+                print(f"    {key:22} {a[key]} -> {b[key]} ({delta(a[key], b[key])})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--services", default=",".join(SERVICES),
+                        help="comma-separated subset of: " + ", ".join(SERVICES))
+    parser.add_argument("--issues", type=int, default=750,
+                        help="issues to seed; above 750 the CSV is scaled synthetically")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--gemini-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--bulk-size", type=int, default=100,
+                        help="issues per request for bulk endpoints")
+    parser.add_argument("--gemini-latency-ms", type=float, default=500.0)
+    parser.add_argument("--gemini-chunk-latency-ms", type=float, default=20.0)
+    parser.add_argument("--firestore-latency-ms", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the services, e.g. SIMILARITY_STORAGE=int8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.child:
+        print(json.dumps(run_service(args.child, json.loads(args.config))))
+        return
+
+    env = dict(item.split("=", 1) for item in args.env)
+    # Every run starts with a cold embedding cache unless told otherwise
+    env.setdefault("EMBEDDING_CACHE_DIR", tempfile.mkdtemp(prefix="fixmycity-bench-"))
+    config = {
+        "issues": args.issues,
+        "requests": args.requests,
+        "gemini_requests": args.gemini_requests,
+        "concurrency": args.concurrency,
+        "bulk_size": args.bulk_size,
+        "gemini_latency_ms": args.gemini_latency_ms,
+        "gemini_chunk_latency_ms": args.gemini_chunk_latency_ms,
+        "firestore_latency_ms": args.firestore_latency_ms,
+        "env": env,
+        "seed": args.seed,
+    }
+
+    report = {"config": config, "services": {}}
+    for service in args.services.split(","):
+        print(f"[BENCH] {service} ...", file=sys.stderr)
+        report["services"][service] = spawn(service, config)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Load test for the sentiment service's chat streams.
+
+Starts the service in a child process on the fakes.py stand-ins with the
+fake streaming chat model (CHAT_BACKEND=fake), either on the asyncio SSE
+server (stream_server.py under uvicorn) or the Flask app under gunicorn
+with a fixed thread pool, and opens N concurrent POST /stream connections
+at each concurrency level. It reports time to first chunk and to the end
+of the stream, errors, and the server's RSS and thread count at peak.
+With --abandon, that share of clients disconnects after the first chunk;
+on the asyncio server the run also reports how many streams were cancelled.
+
+    python benchmarks/stream_load.py --server async --concurrency 100,1000,5000
+    python benchmarks/stream_load.py --server flask --flask-threads 32 --concurrency 10,100,500
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+import datasets
+
+ROOT = datasets.ROOT
+SERVICE_DIR = os.path.join(ROOT, "sentiment_analysis")
+
+MESSAGES = [
+    "how can I report an issue",
+    "how can I change my password",
+    "how can I view an issue",
+    "what is the status of my complaint",
+]
+
+
+# ------------------------------------------------------------------ server
+
+def serve(kind, port, flask_threads):
+    import fakes
+
+    fakes.install({"issues": datasets.build_issues(0)})
+    os.environ.setdefault("FIREBASE_PRIVATE_KEY", "benchmark")
+    os.environ.setdefault("SENTIMENT_WORKERS", "1")
+    os.environ["CHAT_BACKEND"] = "fake"
+    os.chdir(SERVICE_DIR)
+    sys.path.insert(0, SERVICE_DIR)
+
+    if kind == "async":
+        import uvicorn
+
+        import stream_server
+
+        uvicorn.run(stream_server.app, host="127.0.0.1", port=port, log_level="warning",
+                    backlog=8192, timeout_keep_alive=60)
+        return
+
+    from gunicorn.app.base import BaseApplication
+
+    import app as service
+
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"127.0.0.1:{port}")
+            self.cfg.set("workers", 1)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", flask_threads)
+            self.cfg.set("backlog", 8192)
+            self.cfg.set("timeout", 600)
+            self.cfg.set("loglevel", "warning")
+
+        def load(self):
+            return service.app
+
+    Server().run()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_status(pid):
+    status = {}
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                status[key] = value.split()[0] if value.split() else ""
+    except OSError:
+        return {}
+    return {"rss_mb": round(int(status.get("VmRSS", 0)) / 1024, 1), "threads": int(status.get("Threads", 0))}
+
+
+# User + system CPU seconds of a process
+def cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat", "r", encoding="utf-8") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+# Server process and its children (gunicorn forks its worker)
+def server_status(pid):
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children", "r", encoding="utf-8") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+    total = {"rss_mb": 0.0, "threads": 0, "cpu_s": 0.0}
+    for p in pids:
+        for key, value in process_status(p).items():
+            total[key] += value
+        total["cpu_s"] += cpu_seconds(p)
+    total["rss_mb"] = round(total["rss_mb"], 1)
+    return total
+
+
+# ------------------------------------------------------------------ client
+
+async def read_head(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    return status, headers
+
+
+# Body pieces as they arrive, decoding chunked transfer encoding
+async def body_pieces(reader, headers):
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                return
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield data
+    elif "content-length" in headers:
+        yield await reader.readexactly(int(headers["content-length"]))
+    else:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return
+            yield data
+
+
+async def one_stream(port, message, abandon, timeout):
+    body = json.dumps({"chat": message, "history": []}).encode()
+    request = (
+        f"POST /stream HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    ).encode() + body
+
+    start = time.perf_counter()
+    first = None
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(request)
+        await writer.drain()
+        status, headers = await asyncio.wait_for(read_head(reader), timeout)
+        if status != 200:
+            return {"error": f"HTTP {status}"}
+
+        received = b""
+        async for piece in body_pieces(reader, headers):
+            received += piece
+            # Both servers send the answer as SSE text events
+            if first is None and b'data: {"text"' in received:
+                first = time.perf_counter() - start
+                if abandon:
+                    return {"first": first, "abandoned": True}
+            if time.perf_counter() - start > timeout:
+                return {"error": "timeout"}
+        if b"event: error" in received:
+            return {"error": "stream error"}
+        return {"first": first, "total": time.perf_counter() - start}
+    except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError) as e:
+        return {"error": type(e).__name__}
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def percentile_ms(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * p / 100))] * 1000, 1)
+
+
+async def run_level(port, pid, concurrency, abandon, timeout):
+    abandon_every = int(1 / abandon) if abandon else 0
+    tasks = [
+        asyncio.create_task(one_stream(port, MESSAGES[i % len(MESSAGES)],
+                                       bool(abandon_every) and i % abandon_every == 0, timeout))
+        for i in range(concurrency)
+    ]
+
+    peak = {"rss_mb": 0, "threads": 0}
+    server_cpu = server_status(pid)["cpu_s"]
+    client_cpu = sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+    start = time.perf_counter()
+    while not all(task.done() for task in tasks):
+        status = server_status(pid)
+        peak = {key: max(peak[key], status.get(key, 0)) for key in peak}
+        await asyncio.sleep(0.05)
+    wall = time.perf_counter() - start
+    server_cpu = server_status(pid)["cpu_s"] - server_cpu
+    client_cpu = sum(resource.getrusage(resource.RUSAGE_SELF)[:2]) - client_cpu
+
+    results = [task.result() for task in tasks]
+    errors = {}
+    for result in results:
+        if "error" in result:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+    firsts = [r["first"] for r in results if r.get("first") is not None]
+    totals = [r["total"] for r in results if "total" in r]
+    return {
+        "concurrency": concurrency,
+        "completed": len(totals),
+        "abandoned": sum(1 for r in results if r.get("abandoned")),
+        "errors": errors,
+        "wall_s": round(wall, 2),
+        "first_chunk_p50_ms": percentile_ms(firsts, 50),
+        "first_chunk_p95_ms": percentile_ms(firsts, 95),
+        "first_chunk_max_ms": percentile_ms(firsts, 100),
+        "total_p50_ms": percentile_ms(totals, 50),
+        "total_p95_ms": percentile_ms(totals, 95),
+        "server_peak": peak,
+        "server_cpu_s": round(server_cpu, 2),
+        "client_cpu_s": round(client_cpu, 2),
+    }
+
+
+def stream_counters(port):
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=5) as s:
+            s.sendall(f"GET /metrics HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nConnection: close\r\n\r\n".encode())
+            data = b""
+            while True:
+                piece = s.recv(65536)
+                if not piece:
+                    break
+                data += piece
+    except OSError:
+        return {}
+    counters = {}
+    for line in data.decode("utf-8", "replace").splitlines():
+        if line.startswith("fixmycity_chat_streams_total{"):
+            outcome = line.split('outcome="', 1)[1].split('"', 1)[0]
+            counters[outcome] = float(line.rsplit(" ", 1)[1])
+    return counters
+
+
+def wait_for_port(port, process, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=("async", "flask"), default="async")
+    parser.add_argument("--concurrency", default="10,100,1000",
+                        help="comma-separated numbers of simultaneous streams")
+    parser.add_argument("--latency-ms", type=float, default=800.0, help="fake model time to first chunk")
+    parser.add_argument("--chunk-latency-ms", type=float, default=50.0, help="fake model time between chunks")
+    parser.add_argument("--flask-threads", type=int, default=32, help="gunicorn threads for --server flask")
+    parser.add_argument("--abandon", type=float, default=0.0,
+                        help="share of clients that disconnect after the first chunk")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-stream timeout in seconds")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="environment for the service, e.g. SSE_BUFFER_CHUNKS=8")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Thousands of sockets on each side
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if args.child:
+        serve(args.child, args.port, args.flask_threads)
+        return
+
+    port = free_port()
+    env = dict(os.environ, FAKE_CHAT_LATENCY_MS=str(args.latency_ms),
+               FAKE_CHAT_CHUNK_LATENCY_MS=str(args.chunk_latency_ms),
+               CHAT_CACHE_SIZE="0", CHAT_SESSIONS="0")
+    env.update(item.split("=", 1) for item in args.env)
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), "--child", args.server, "--port", str(port),
+         "--flask-threads", str(args.flask_threads)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port, process)
+        report = {"server": args.server, "latency_ms": args.latency_ms,
+                  "chunk_latency_ms": args.chunk_latency_ms, "levels": []}
+        if args.server == "flask":
+            report["flask_threads"] = args.flask_threads
+        for level in (int(n) for n in args.concurrency.split(",")):
+            print(f"[BENCH] {args.server} x{level} ...", file=sys.stderr)
+            result = asyncio.run(run_level(port, process.pid, level, args.abandon, args.timeout))
+            report["levels"].append(result)
+            time.sleep(0.5)
+        if args.server == "async":
+            report["streams"] = stream_counters(port)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
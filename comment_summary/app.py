@@ -2,13 +2,22 @@ from flask import Flask, request, jsonify
 from flask_cors import CORS
 import google.generativeai as genai
 import os
+import sys
 from dotenv import load_dotenv
 
+# Shared instrumentation lives in ../common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import Metrics
+
 load_dotenv()  # Load from .env file
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS to allow frontend requests
 
+# Request and Gemini call timings on /metrics
+metrics = Metrics("summary")
+metrics.init_app(app)
+
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 genai.configure(api_key=GEMINI_API_KEY)
@@ -32,7 +41,8 @@ def summarize_comments():
 
         # Call Gemini API for summarization
         model = genai.GenerativeModel()  # Use "gemini-pro" for better summarization
-        response = model.generate_content(f"Summarize the following comments: {text_to_summarize}")
+        with metrics.external("gemini", "generate_content"):
+            response = model.generate_content(f"Summarize the following comments: {text_to_summarize}")
 
         # Extract generated summary
         summary = response.text.strip() if response.text else "Summarization failed."
@@ -0,0 +1,244 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+from common.lru_cache import LRUCache
+
+# Rough token estimate for Gemini text; budgets only need to be close
+CHARS_PER_TOKEN = 4
+
+SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+SUMMARY_PREFIX = "Summary of our conversation so far: "
+SUMMARY_ACK = "Understood, I'll keep that in mind."
+
+
+def estimate_tokens(text):
+    return -(-len(str(text)) // CHARS_PER_TOKEN)
+
+
+def message_tokens(message):
+    return sum(estimate_tokens(part) for part in message["parts"])
+
+
+# Extractive summary used when no summarizer is given or it fails: the
+# previous summary followed by one line per folded message, cut from the
+# front to max_tokens
+def condense(summary, turns, max_tokens):
+    lines = [summary] if summary else []
+    for message in turns:
+        text = " ".join(str(part) for part in message["parts"]).split()
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        lines.append(f"{speaker}: {' '.join(text[:40])}{' ...' if len(text) > 40 else ''}")
+    return clip_summary("\n".join(lines), max_tokens)
+
+
+# Prompt asking a chat model to fold messages into the summary, for
+# summarizers built on one
+def summary_prompt(summary, messages, max_tokens):
+    transcript = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Assistant'}: {' '.join(str(p) for p in m['parts'])}"
+        for m in messages
+    )
+    return (
+        "Update the summary of this FixMyCity support chat with the new messages. Keep what the "
+        "user told you (names, addresses, issue details) and any open questions. Reply with the "
+        f"summary only, in at most {max_tokens * 3 // 4} words.\n\n"
+        f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+    )
+
+
+# The last max_tokens worth of a summary, starting at a line or word boundary
+def clip_summary(text, max_tokens):
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    text = text[-limit:]
+    cut = text.find("\n")
+    if cut == -1:
+        cut = text.find(" ")
+    return text[cut + 1:] if cut != -1 else text
+
+
+# Chat history kept on the server, keyed by session ID, so a client sends
+# only its new message each turn.
+#
+# Each session holds its recent turns (Gemini {"role", "parts"} messages)
+# and a rolling summary of older ones. When a session's estimated tokens
+# exceed token_budget, the oldest turns beyond the last keep_turns
+# exchanges are folded into the summary by `summarize(summary, messages,
+# max_tokens) -> str` (condense() when None), on a background thread so a
+# slow summarizer never holds up the request that crossed the budget; until
+# it finishes the session is briefly over budget. Sessions live in an LRU
+# cache; with `directory`, each is also written to <directory>/<id>.json
+# so it survives restarts and eviction.
+class ChatSessions:
+    def __init__(self, token_budget=2000, keep_turns=2, summary_tokens=300, max_sessions=10000,
+                 ttl_seconds=None, directory=None, summarize=None):
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary_tokens = summary_tokens
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.directory = directory
+        self.summarize = summarize
+        self.compactions = 0
+        self._compacting = set()  # IDs of sessions being compacted
+        self._sessions = LRUCache(max_sessions, self.ttl_seconds)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # request and compaction threads both save
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self):
+        session = {"id": uuid.uuid4().hex, "summary": "", "turns": [], "updated": time.time()}
+        self._sessions.put(session["id"], session)
+        return session["id"]
+
+    # The session dict, or None for an unknown, expired or malformed ID
+    def get(self, session_id):
+        if not session_id or not SESSION_ID.match(str(session_id)):
+            return None
+        session = self._sessions.get(session_id)
+        if session is None and self.directory:
+            session = self._load(session_id)
+            if session is not None:
+                self._sessions.put(session_id, session)
+        return session
+
+    # History to start the model's chat with: the summary as an opening
+    # exchange, then the recent turns
+    def history(self, session_id):
+        session = self.get(session_id)
+        if session is None:
+            return []
+        with self._lock:
+            history = list(session["turns"])
+            if session["summary"]:
+                history[:0] = [
+                    {"role": "user", "parts": [SUMMARY_PREFIX + session["summary"]]},
+                    {"role": "model", "parts": [SUMMARY_ACK]},
+                ]
+        return history
+
+    # Record one exchange, starting a compaction if the session is now over
+    # budget and none is running for it
+    def append(self, session_id, message, answer):
+        session = self.get(session_id)
+        if session is None:
+            return None
+        with self._lock:
+            session["turns"] += [
+                {"role": "user", "parts": [message]},
+                {"role": "model", "parts": [answer]},
+            ]
+            session["updated"] = time.time()
+            compact = session["id"] not in self._compacting and self._fold_count(session) > 0
+            if compact:
+                self._compacting.add(session["id"])
+        if compact:
+            threading.Thread(target=self._compact_in_background, args=(session,),
+                             name="chat-compact", daemon=True).start()
+        if self.directory:
+            self._save(session)
+        return session
+
+    def delete(self, session_id):
+        if not session_id or not SESSION_ID.match(str(session_id)):
+            return
+        self._sessions.pop(session_id)
+        if self.directory:
+            try:
+                os.remove(self._path(session_id))
+            except OSError:
+                pass
+
+    def tokens(self, session):
+        return estimate_tokens(session["summary"]) + sum(message_tokens(m) for m in session["turns"])
+
+    def stats(self):
+        return dict(self._sessions.stats(), token_budget=self.token_budget, keep_turns=self.keep_turns,
+                    compactions=self.compactions, compacting=len(self._compacting), directory=self.directory)
+
+    # Number of oldest messages to fold for the session to fit the budget,
+    # leaving at least keep_turns exchanges. Called with the lock held.
+    def _fold_count(self, session):
+        over = self.tokens(session) - self.token_budget
+        foldable = len(session["turns"]) - 2 * self.keep_turns
+        count = 0
+        while count < foldable and over > 0:
+            over -= message_tokens(session["turns"][count]) + message_tokens(session["turns"][count + 1])
+            count += 2
+        return count
+
+    # Compact until turns appended meanwhile fit as well, then save
+    def _compact_in_background(self, session):
+        try:
+            while self._compact(session):
+                with self._lock:
+                    if self._fold_count(session) == 0:
+                        self._compacting.discard(session["id"])
+                        break
+        except Exception as e:
+            print(f"[ERROR] Failed to compact chat session {session['id']}: {e}")
+        finally:
+            with self._lock:
+                self._compacting.discard(session["id"])
+        if self.directory:
+            self._save(session)
+
+    # Fold the oldest turns into the summary until the session fits the
+    # budget or only keep_turns exchanges are left; True if it did. The
+    # summarizer runs outside the lock; turns appended meanwhile are kept.
+    def _compact(self, session):
+        with self._lock:
+            count = self._fold_count(session)
+            if count == 0:
+                return False
+            folded = session["turns"][:count]
+            previous = session["summary"]
+
+        summary = None
+        if self.summarize is not None:
+            try:
+                summary = clip_summary(self.summarize(previous, folded, self.summary_tokens), self.summary_tokens)
+            except Exception as e:
+                print(f"[ERROR] Chat summary failed, condensing instead: {e}")
+        if not summary:
+            summary = condense(previous, folded, self.summary_tokens)
+
+        with self._lock:
+            if session["turns"][:count] != folded:
+                return False
+            session["turns"] = session["turns"][count:]
+            session["summary"] = summary
+            self.compactions += 1
+        return True
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.json")
+
+    # Saves are serialized, so the last one written holds the latest state
+    def _save(self, session):
+        path = self._path(session["id"])
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(session)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+
+    def _load(self, session_id):
+        try:
+            with open(self._path(session_id), "r", encoding="utf-8") as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl_seconds and session.get("updated", 0) + self.ttl_seconds < time.time():
+            return None
+        return session
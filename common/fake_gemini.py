@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+# Canned answers by keyword; anything else gets DEFAULT_ANSWER
+ANSWERS = [
+    ("report", "To report an issue, open the Report page, add a title, description, "
+               "category, address and photos, then submit. You can track it under My Issues."),
+    ("password", "To change your password, open Profile, choose Change Password, enter your "
+                 "current and new password, and save."),
+    ("view", "To view an issue, open My Issues or the map, then select the issue to see its "
+             "status, updates and feedback."),
+    ("status", "An issue is Pending until an authority picks it up, In Progress while it is "
+               "being worked on, and Resolved once it is fixed."),
+]
+DEFAULT_ANSWER = ("I'm the FixMyCity assistant. I can help you report civic issues, track "
+                  "their status and find the right authority.")
+
+
+# Stand-in for google.generativeai.GenerativeModel, used by the sentiment
+# service (CHAT_BACKEND=fake) and by the benchmark fakes. Supports
+# generate_content() and start_chat() / send_message(stream=...) /
+# send_message_async(stream=...), with canned, deterministic answers.
+# latency_ms delays the first chunk and chunk_latency_ms each streamed chunk
+# after it; both default to the class attributes, so benchmarks/fakes.py can
+# set them for every instance a service creates. `calls` counts model round
+# trips, so tests can tell cached answers from fresh ones.
+class FakeGenerativeModel:
+    latency_ms = 0.0
+    chunk_latency_ms = 0.0
+    chunks = 8
+
+    def __init__(self, model_name="gemini-fake", generation_config=None,
+                 latency_ms=None, chunk_latency_ms=None, chunks=None, **kwargs):
+        self.model_name = model_name
+        if latency_ms is not None:
+            self.latency_ms = latency_ms
+        if chunk_latency_ms is not None:
+            self.chunk_latency_ms = chunk_latency_ms
+        if chunks is not None:
+            self.chunks = chunks
+        self.calls = 0
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return self.reply(contents, stream)
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history)
+
+    def answer(self, message):
+        lowered = str(message).lower()
+        for keyword, text in ANSWERS:
+            if keyword in lowered:
+                return text
+        return DEFAULT_ANSWER
+
+    def reply(self, message, stream=False):
+        self.calls += 1
+        time.sleep(self.latency_ms / 1000.0)
+        text = self.answer(message)
+        if not stream:
+            return FakeResponse(text)
+
+        def generate():
+            for i, part in enumerate(self.parts(text)):
+                if i:
+                    time.sleep(self.chunk_latency_ms / 1000.0)
+                yield FakeResponse(part)
+
+        return FakeResponse(text, generate())
+
+    # reply() for the asyncio server; waits without holding a thread
+    async def reply_async(self, message, stream=False):
+        self.calls += 1
+        await asyncio.sleep(self.latency_ms / 1000.0)
+        text = self.answer(message)
+        if not stream:
+            return FakeResponse(text)
+
+        async def generate():
+            for i, part in enumerate(self.parts(text)):
+                if i:
+                    await asyncio.sleep(self.chunk_latency_ms / 1000.0)
+                yield FakeResponse(part)
+
+        return FakeResponse(text, async_chunks=generate())
+
+    def parts(self, text):
+        size = max(1, -(-len(text) // self.chunks))
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class FakeChatSession:
+    def __init__(self, model, history=None):
+        self.model = model
+        self.history = list(history or [])
+
+    def send_message(self, content, stream=False, **kwargs):
+        self.history.append({"role": "user", "parts": [content]})
+        return self.model.reply(content, stream)
+
+    async def send_message_async(self, content, stream=False, **kwargs):
+        self.history.append({"role": "user", "parts": [content]})
+        return await self.model.reply_async(content, stream)
+
+
+class FakeResponse:
+    def __init__(self, text, chunks=None, async_chunks=None):
+        self.text = text
+        self._chunks = chunks
+        self._async_chunks = async_chunks
+
+    def __iter__(self):
+        return iter(self._chunks if self._chunks is not None else [self])
+
+    async def __aiter__(self):
+        if self._async_chunks is None:
+            yield self
+            return
+        async for chunk in self._async_chunks:
+            yield chunk
@@ -0,0 +1,344 @@
+"""Shared instrumentation for the FixMyCity Flask services.
+
+One Metrics object per service records:
+
+- per-endpoint request counts, latency histograms and in-flight gauges
+  (recorded automatically once init_app() is called)
+- per-stage timings inside a request, via `with metrics.stage("encode"):`
+- external call durations (Firestore, Gemini) with their outcome, via
+  `with metrics.external("gemini", "generate_content"):`
+- ad-hoc counters and callback gauges
+
+GET /metrics serves everything in the Prometheus text format. Setting
+PROFILER_ENABLED=1 also adds /debug/profiler endpoints that start and stop
+a sampling profiler at runtime and return collapsed stacks, which
+flamegraph.pl and speedscope can read.
+
+Metrics are kept per process; with several gunicorn workers, scrape each
+worker or treat the numbers as a sample.
+"""
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import Response, g, jsonify, request
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+PREFIX = "fixmycity_"
+
+
+class Metrics:
+    def __init__(self, service, buckets=DEFAULT_BUCKETS):
+        self.service = service
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = {}    # name -> {labels: value}
+        self._gauges = {}      # name -> {labels: value}
+        self._histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+        self._callbacks = {}   # name -> (label, fn)
+        self._help = {}        # name -> description
+        self._request_threads = set()  # threads currently handling a request, under _lock
+        self.profiler = SamplingProfiler(self._active_request_threads)
+
+    # ----------------------------------------------------------- recording
+
+    def inc(self, name, labels=None, amount=1, help=""):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series(self._counters, name, help)
+            series[key] = series.get(key, 0) + amount
+
+    def gauge_add(self, name, labels=None, amount=1, help=""):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series(self._gauges, name, help)
+            series[key] = series.get(key, 0) + amount
+
+    # Gauge read at scrape time, e.g. lambda: len(issue_index). If `label`
+    # is given, fn returns {label value: number} instead of a number.
+    def gauge_callback(self, name, fn, help="", label=None):
+        if help:
+            self._help[name] = help
+        self._callbacks[name] = (label, fn)
+
+    def observe(self, name, value, labels=None, help=""):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series(self._histograms, name, help)
+            entry = series.get(key)
+            if entry is None:
+                entry = series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[i] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    # Time one stage of request handling
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_duration_seconds", time.perf_counter() - start, {"stage": name},
+                         help="Time spent in each stage of request handling")
+
+    # Time a call to another service; failures are labelled outcome="error"
+    @contextmanager
+    def external(self, target, operation):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            self.observe("external_call_duration_seconds", time.perf_counter() - start,
+                         {"target": target, "operation": operation, "outcome": outcome},
+                         help="Duration of calls to Firestore, Gemini and other services")
+
+    # ------------------------------------------------------------- reading
+
+    # Count, sum and mean of every histogram series, for benchmarks and logs
+    def summary(self):
+        with self._lock:
+            return {
+                name: {
+                    ",".join(f"{k}={v}" for k, v in key) or "all": {
+                        "count": entry[-1],
+                        "sum_s": round(entry[-2], 6),
+                        "mean_ms": round(entry[-2] / entry[-1] * 1000, 3) if entry[-1] else None,
+                    }
+                    for key, entry in series.items()
+                }
+                for name, series in self._histograms.items()
+            }
+
+    # Everything in the Prometheus text exposition format
+    def render(self):
+        service = (("service", self.service),)
+        lines = []
+
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    _header(lines, name, self._help.get(name), kind)
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{PREFIX}{name}{_labels(service + key)} {_number(value)}")
+
+            for name, series in sorted(self._histograms.items()):
+                _header(lines, name, self._help.get(name), "histogram")
+                for key, entry in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, entry):
+                        cumulative += count
+                        labels = _labels(service + key + (("le", _number(bound)),))
+                        lines.append(f"{PREFIX}{name}_bucket{labels} {cumulative}")
+                    labels = _labels(service + key + (("le", "+Inf"),))
+                    lines.append(f"{PREFIX}{name}_bucket{labels} {entry[-1]}")
+                    lines.append(f"{PREFIX}{name}_sum{_labels(service + key)} {_number(entry[-2])}")
+                    lines.append(f"{PREFIX}{name}_count{_labels(service + key)} {entry[-1]}")
+
+        for name, (label, fn) in sorted(self._callbacks.items()):
+            try:
+                value = fn()
+            except Exception:
+                continue
+            _header(lines, name, self._help.get(name), "gauge")
+            if label is None:
+                lines.append(f"{PREFIX}{name}{_labels(service)} {_number(value)}")
+                continue
+            for label_value, v in sorted(value.items()):
+                lines.append(f"{PREFIX}{name}{_labels(service + ((label, label_value),))} {_number(v)}")
+
+        return "\n".join(lines) + "\n"
+
+    def _series(self, metrics, name, help):
+        if help:
+            self._help[name] = help
+        return metrics.setdefault(name, {})
+
+    # ---------------------------------------------------------------- flask
+
+    # Record every request and add /metrics (and /debug/profiler when
+    # PROFILER_ENABLED=1) to a Flask app
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+        app.add_url_rule("/metrics", "metrics", lambda: Response(
+            self.render(), mimetype="text/plain; version=0.0.4"
+        ))
+        if os.getenv("PROFILER_ENABLED", "").lower() in ("1", "true", "yes"):
+            app.add_url_rule("/debug/profiler", "profiler_report", self._profiler_report)
+            app.add_url_rule("/debug/profiler/start", "profiler_start", self._profiler_start, methods=["POST"])
+            app.add_url_rule("/debug/profiler/stop", "profiler_stop", self._profiler_stop, methods=["POST"])
+
+    def _before_request(self):
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        if endpoint == "/metrics":
+            return
+        g.metrics_request = (endpoint, request.method, time.perf_counter())
+        with self._lock:
+            self._request_threads.add(threading.get_ident())
+        self.gauge_add("http_requests_in_flight", {"endpoint": endpoint},
+                       help="Requests currently being handled")
+
+    # Streamed bodies are timed until the server closes the response;
+    # everything else when the request context is torn down
+    def _after_request(self, response):
+        started = g.get("metrics_request")
+        if started is not None and response.is_streamed:
+            g.pop("metrics_request")
+            thread = threading.get_ident()
+            response.call_on_close(lambda: self._finish(started, response.status_code, thread))
+        elif started is not None:
+            g.metrics_status = response.status_code
+        return response
+
+    def _teardown_request(self, error):
+        started = g.pop("metrics_request", None)
+        if started is not None:
+            self._finish(started, g.pop("metrics_status", 500), threading.get_ident())
+
+    def _finish(self, started, status, thread):
+        endpoint, method, start = started
+        with self._lock:
+            self._request_threads.discard(thread)
+        self.gauge_add("http_requests_in_flight", {"endpoint": endpoint}, -1)
+        self.inc("http_requests_total", {"endpoint": endpoint, "method": method, "status": status},
+                 help="Requests handled, by endpoint and status code")
+        self.observe("http_request_duration_seconds", time.perf_counter() - start,
+                     {"endpoint": endpoint, "method": method},
+                     help="Request latency including streamed bodies")
+
+    # Copy taken under the lock, so the profiler thread never iterates the
+    # set while requests add and remove themselves
+    def _active_request_threads(self):
+        with self._lock:
+            return set(self._request_threads)
+
+    def _profiler_start(self):
+        interval_ms = float(request.args.get("interval_ms", 5))
+        all_threads = request.args.get("all_threads", "").lower() in ("1", "true", "yes")
+        self.profiler.start(interval_ms / 1000, all_threads)
+        return jsonify(self.profiler.status()), 200
+
+    def _profiler_stop(self):
+        self.profiler.stop()
+        return jsonify(self.profiler.status()), 200
+
+    def _profiler_report(self):
+        limit = int(request.args.get("limit", 200))
+        return Response(self.profiler.collapsed(limit), mimetype="text/plain")
+
+
+# Samples thread stacks at a fixed interval. By default only threads that
+# are handling a request are sampled, so idle background threads do not
+# drown out the request path. request_threads() returns those threads' ids
+# as a set the profiler owns. Only runs between start() and stop(), so it
+# costs nothing while off.
+class SamplingProfiler:
+    def __init__(self, request_threads=None):
+        self._request_threads = request_threads
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._samples = 0
+        self._stop = None
+        self._thread = None
+        self.interval = None
+        self.all_threads = False
+        self.started_at = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=0.005, all_threads=False):
+        with self._lock:
+            if self.running:
+                return
+            self.all_threads = all_threads or self._request_threads is None
+            self._stacks = Counter()
+            self._samples = 0
+            self.interval = max(0.001, interval)
+            self.started_at = time.time()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self.running:
+            self._stop.set()
+            self._thread.join()
+
+    def status(self):
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000 if self.interval else None,
+            "all_threads": self.all_threads,
+            "started_at": self.started_at,
+            "samples": self._samples,
+        }
+
+    # "frame;frame;frame count" lines, most frequent first
+    def collapsed(self, limit=200):
+        with self._lock:
+            top = self._stacks.most_common(limit)
+        return "".join(f"{stack} {count}\n" for stack, count in top)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            wanted = None if self.all_threads else self._request_threads()
+            sampled = []
+            for thread_id, frame in frames.items():
+                if thread_id == own or (wanted is not None and thread_id not in wanted):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                sampled.append(";".join(reversed(stack)))
+            with self._lock:
+                self._stacks.update(sampled)
+                self._samples += 1
+
+
+def _label_key(labels):
+    if not labels:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _labels(key):
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in key) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _header(lines, name, help, kind):
+    if help:
+        lines.append(f"# HELP {PREFIX}{name} {help}")
+    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
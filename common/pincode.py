@@ -0,0 +1,9 @@
+import re
+
+
+PINCODE_PATTERN = re.compile(r"\b\d{6}\b")
+
+# Extract pincode from address
+def extract_pincode(address):
+    match = PINCODE_PATTERN.search(str(address))
+    return match.group(0) if match else None
@@ -0,0 +1,136 @@
+"""Compare full-file and indexed knowledge base prompts for the chatbot.
+
+For a set of user questions, builds the prompt handle_gemini_reponse sends
+both ways: the whole knowledge.txt re-read from disk (KNOWLEDGE_RETRIEVAL=full,
+the default) and the top-k entries from KnowledgeIndex (KNOWLEDGE_RETRIEVAL=
+index, which falls back to the whole file when no entry matches). Reports
+prompt size, the time to build the prompt, and how often the entry that
+answers a question is in the indexed prompt.
+
+    python benchmark_knowledge.py
+    python benchmark_knowledge.py --top-k 2 --repeat 500
+"""
+import argparse
+import os
+import statistics
+import time
+
+from knowledge_index import KnowledgeIndex
+
+KB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base", "knowledge.txt")
+
+# Questions as users phrase them, with the knowledge base entries that
+# answer them
+QUESTIONS = [
+    ("how do i file a complaint about a pothole on my street", {1, 84}),
+    ("what kinds of problems can be reported here", {2}),
+    ("can i add photos to my complaint", {3, 78}),
+    ("i want to change the details of an issue i posted", {4}),
+    ("will i get notified when my issue status changes", {6, 54}),
+    ("where are the issues i reported", {7}),
+    ("who handles the issues", {10, 94}),
+    ("how can i reach the authority assigned to my complaint", {11, 94}),
+    ("how do i create an account", {16}),
+    ("i can't remember my password", {18, 36}),
+    ("how do i remove my account", {20, 63}),
+    ("can i post without revealing my name", {22, 67}),
+    ("who are you", {28}),
+    ("what is this app", {29}),
+    ("someone is dumping garbage illegally near my house", {30}),
+    ("the streetlight outside is not working", {32}),
+    ("how do i sign out", {35}),
+    ("how long until my issue gets fixed", {47}),
+    ("can i change my phone number", {49}),
+    ("is the app free", {64}),
+    ("which languages are supported", {66}),
+    ("is my personal data safe", {68}),
+    ("can i change my profile photo", {72}),
+    ("my neighbours play loud music every night", {76}),
+    ("the app crashes when i open the map", {81}),
+    ("can i get text message alerts", {83}),
+    ("how do i sort issues by newest first", {91}),
+    ("is there an android app", {87, 93}),
+    ("the traffic light at the junction is broken", {97}),
+    ("how do i confirm my email address", {58, 100}),
+]
+
+PROMPT = "Use the following context to answer the question accurately:\n\n{knowledge}\n\nUser question: {query}"
+
+
+def full_prompt(query):
+    with open(KB_PATH, "r", encoding="utf-8") as f:
+        knowledge = f.read()
+    return PROMPT.format(knowledge=knowledge, query=query)
+
+
+def indexed_prompt(index, query, k):
+    chunks = index.search(query, k)
+    if not chunks:
+        return full_prompt(query)
+    return PROMPT.format(knowledge="\n\n".join(chunks), query=query)
+
+
+def entry_number(chunk):
+    head = chunk.split(".", 1)[0]
+    return int(head) if head.isdigit() else None
+
+
+def measure(build, repeat):
+    sizes = []
+    timings = []
+    for _ in range(repeat):
+        for query, _ in QUESTIONS:
+            start = time.perf_counter()
+            prompt = build(query)
+            timings.append((time.perf_counter() - start) * 1000)
+            sizes.append(len(prompt))
+    return sizes, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top-k", type=int, default=4, help="Entries retrieved per question")
+    parser.add_argument("--repeat", type=int, default=200, help="Passes over the question set")
+    parser.add_argument("--chars-per-token", type=float, default=4.0,
+                        help="Characters per token when estimating prompt tokens")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = KnowledgeIndex(KB_PATH)
+    index.refresh()
+    build_ms = (time.perf_counter() - start) * 1000
+    stats = index.stats()
+    print(f"[INFO] Indexed {stats['chunks']} chunks, {stats['terms']} terms in {build_ms:.1f} ms")
+
+    modes = [
+        ("full", full_prompt),
+        (f"index top-{args.top_k}", lambda query: indexed_prompt(index, query, args.top_k)),
+    ]
+    print(f"\n{'mode':<12} {'chars':>7} {'tokens':>7} {'build p50 ms':>13} {'build p95 ms':>13}")
+    for name, build in modes:
+        sizes, timings = measure(build, args.repeat)
+        timings.sort()
+        chars = statistics.mean(sizes)
+        tokens = chars / args.chars_per_token
+        print(f"{name:<12} {chars:>7.0f} {tokens:>7.0f} "
+              f"{timings[len(timings) // 2]:>13.3f} {timings[int(len(timings) * 0.95)]:>13.3f}")
+
+    found = 0
+    fallbacks = 0
+    for query, expected in QUESTIONS:
+        retrieved = [entry_number(chunk) for chunk in index.search(query, args.top_k)]
+        if not retrieved:
+            # The whole file goes in the prompt, answering entry included
+            fallbacks += 1
+            found += 1
+        elif expected & set(retrieved):
+            found += 1
+        else:
+            print(f"[MISS] {query!r}: expected {sorted(expected)}, got {retrieved}")
+    print(f"\nAnswering entry retrieved for {found}/{len(QUESTIONS)} questions "
+          f"({found / len(QUESTIONS):.0%}) at top-{args.top_k}, {fallbacks} from the full-file fallback")
+    print(f"Index loads over the run: {index.stats()['loads']} (re-indexed only when the file changes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
 import os
+import sys
 import gradio as gr
 import google.generativeai as genai
 from dotenv import load_dotenv, find_dotenv
 
+# Shared code (chat sessions) lives in ../common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.chat_sessions import ChatSessions, summary_prompt
+
+from knowledge_index import KnowledgeIndex
+
 # Load environment variables
 load_dotenv()
 
@@ -10,32 +17,74 @@ load_dotenv()
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
 model = genai.GenerativeModel()
 
+KB_PATH = os.path.join(os.path.dirname(__file__), 'knowledge_base', 'knowledge.txt')
+
+# "full" pastes the whole knowledge base into each prompt; "index" puts only
+# the top KNOWLEDGE_TOP_K matching entries in it, which is smaller but misses
+# the answering entry for some questions (see benchmark_knowledge.py)
+KNOWLEDGE_RETRIEVAL = os.getenv('KNOWLEDGE_RETRIEVAL', 'full')
+KNOWLEDGE_TOP_K = int(os.getenv('KNOWLEDGE_TOP_K', '4'))
+KNOWLEDGE_CHUNK_CHARS = int(os.getenv('KNOWLEDGE_CHUNK_CHARS', '800'))
+
+# Chunked once and re-indexed only when knowledge.txt changes on disk
+knowledge_index = KnowledgeIndex(KB_PATH, max_chars=KNOWLEDGE_CHUNK_CHARS)
+
 # Load knowledge base from file
 def load_knowledge_base():
-    kb_path = os.path.join(os.path.dirname(__file__), 'knowledge_base', 'knowledge.txt')
-    with open(kb_path, 'r', encoding='utf-8') as f:
+    with open(KB_PATH, 'r', encoding='utf-8') as f:
         return f.read()
 
+# Knowledge base context for one question
+def knowledge_context(query):
+    if KNOWLEDGE_RETRIEVAL == 'full':
+        return load_knowledge_base()
+    chunks = knowledge_index.search(query, KNOWLEDGE_TOP_K)
+    if not chunks:
+        # Nothing matched the question's words; let the model see everything
+        return load_knowledge_base()
+    return "\n\n".join(chunks)
+
+# Fold older chat turns into a summary with the model
+def summarize_chat(summary, messages, max_tokens):
+    return model.generate_content(summary_prompt(summary, messages, max_tokens)).text
+
+# Conversation history sent to Gemini, kept server side per browser session
+# and compacted into a rolling summary past CHAT_SESSION_TOKEN_BUDGET tokens
+# instead of re-sending the whole transcript every turn. CHAT_SESSION_DIR
+# also keeps sessions on disk.
+chat_sessions = ChatSessions(
+    token_budget=int(os.getenv('CHAT_SESSION_TOKEN_BUDGET', '2000')),
+    keep_turns=int(os.getenv('CHAT_SESSION_KEEP_TURNS', '2')),
+    summary_tokens=int(os.getenv('CHAT_SESSION_SUMMARY_TOKENS', '300')),
+    ttl_seconds=float(os.getenv('CHAT_SESSION_TTL', '86400')),
+    directory=os.getenv('CHAT_SESSION_DIR') or None,
+    summarize=summarize_chat,
+)
+
 # Handle user message input
 def handle_user_query(msg, chatbot):
     chatbot.append([msg, None])
     return '', chatbot
 
-# Convert chat history to Gemini-compatible format
-def generate_chatbot(chatbot: list[list[str, str]]) -> list[dict]:
-    formatted_chatbot = []
-    for ch in chatbot:
-        formatted_chatbot.append({"role": "user", "parts": [ch[0]]})
-        formatted_chatbot.append({"role": "model", "parts": [ch[1]]})
-    return formatted_chatbot
+# Chat session for the conversation on screen. A new conversation (or one
+# whose session expired) gets a new session, seeded with any earlier turns.
+def get_chat_session(session_id, chatbot: list[list[str, str]]) -> str:
+    if len(chatbot) > 1 and chat_sessions.get(session_id) is not None:
+        return session_id
+    # Cleared conversations end their old session
+    chat_sessions.delete(session_id)
+    session_id = chat_sessions.create()
+    for user_msg, answer in chatbot[:-1]:
+        chat_sessions.append(session_id, user_msg, answer)
+    return session_id
 
 # Generate response using Gemini model
-def handle_gemini_reponse(chatbot):
+def handle_gemini_reponse(chatbot, session_id):
     query = chatbot[-1][0]
-    formatted_chatbot = generate_chatbot(chatbot[:-1])
-    chat = model.start_chat(history=formatted_chatbot)
+    session_id = get_chat_session(session_id, chatbot)
+    chat = model.start_chat(history=chat_sessions.history(session_id))
 
-    knowledge = load_knowledge_base()
+    knowledge = knowledge_context(query)
     prompt = (
         "Use the following context to answer the question accurately:\n\n"
         f"{knowledge}\n\n"
@@ -44,12 +93,15 @@ def handle_gemini_reponse(chatbot):
 
     response = chat.send_message(prompt)
     chatbot[-1][1] = response.text
-    return chatbot
+    # The session keeps the question without the knowledge base context
+    chat_sessions.append(session_id, query, response.text)
+    return chatbot, session_id
 
 # Define Gradio interface
 with gr.Blocks() as demo:
     chatbot = gr.Chatbot(label='Chat with Gemini', bubble_full_width=False)
     msg = gr.Textbox(placeholder="Ask me something...", show_label=False)
+    session_id = gr.State(None)
     clear = gr.ClearButton([msg, chatbot])
 
     # Submit user message
@@ -58,8 +110,8 @@ with gr.Blocks() as demo:
         [msg, chatbot],       # inputs
         [msg, chatbot]        # outputs
     ).then(
-        handle_gemini_reponse, # function(chatbot)
-        [chatbot],             # input
-        [chatbot]              # output
+        handle_gemini_reponse, # function(chatbot, session_id)
+        [chatbot, session_id], # inputs
+        [chatbot, session_id]  # outputs
     )
 
@@ -0,0 +1,123 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+
+# Words too common to say anything about which chunk is relevant
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for",
+    "from", "how", "i", "if", "in", "is", "it", "me", "my", "of", "on", "or",
+    "the", "there", "this", "to", "what", "when", "where", "will", "with", "you", "your",
+}
+
+TOKEN = re.compile(r"[a-z0-9]+")
+
+
+# Lowercase word tokens without stopwords, with plural "s" removed so
+# "issues" matches "issue"
+def tokenize(text):
+    tokens = []
+    for word in TOKEN.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+# Split text into chunks at blank lines (one Q&A pair each in
+# knowledge.txt). Paragraphs longer than max_chars are split at line breaks.
+def chunk_text(text, max_chars=800):
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            chunks.append(paragraph)
+            continue
+
+        current = ""
+        for line in paragraph.splitlines():
+            if current and len(current) + len(line) + 1 > max_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{line}" if current else line
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+# BM25 keyword index over the chunks of a knowledge base file. The file is
+# chunked and indexed once, and again only when its modification time or
+# size changes, checked at most once per query.
+class KnowledgeIndex:
+    def __init__(self, path, max_chars=800, k1=1.5, b=0.75):
+        self.path = path
+        self.max_chars = max_chars
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self.loads = 0
+        self._version = None
+        self._postings = {}  # term -> [(chunk id, term frequency)]
+        self._lengths = []
+        self._average_length = 0.0
+        self._lock = threading.Lock()
+
+    # Re-index if the file changed; True if it was (re)loaded
+    def refresh(self):
+        stat = os.stat(self.path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        if version == self._version:
+            return False
+
+        with self._lock:
+            if version == self._version:
+                return False
+            with open(self.path, "r", encoding="utf-8") as f:
+                chunks = chunk_text(f.read(), self.max_chars)
+
+            postings = {}
+            lengths = []
+            for chunk_id, chunk in enumerate(chunks):
+                terms = Counter(tokenize(chunk))
+                lengths.append(sum(terms.values()))
+                for term, count in terms.items():
+                    postings.setdefault(term, []).append((chunk_id, count))
+
+            self.chunks = chunks
+            self._postings = postings
+            self._lengths = lengths
+            self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+            self._version = version
+            self.loads += 1
+        return True
+
+    # The k chunks most relevant to the query, best first. Empty when no
+    # query term occurs in the knowledge base.
+    def search(self, query, k=4):
+        self.refresh()
+        chunks, postings, lengths = self.chunks, self._postings, self._lengths
+        scores = {}
+        for term in set(tokenize(query)):
+            matches = postings.get(term)
+            if not matches:
+                continue
+            idf = math.log(1 + (len(chunks) - len(matches) + 0.5) / (len(matches) + 0.5))
+            for chunk_id, count in matches:
+                norm = self.k1 * (1 - self.b + self.b * lengths[chunk_id] / self._average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+
+        best = sorted(scores, key=lambda chunk_id: (-scores[chunk_id], chunk_id))[:k]
+        return [chunks[chunk_id] for chunk_id in best]
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "chunks": len(self.chunks),
+            "terms": len(self._postings),
+            "loads": self.loads,
+        }
@@ -1,11 +1,32 @@
 from flask import Flask, request, jsonify, Response, stream_with_context
-from textblob import TextBlob
 from dotenv import load_dotenv
 from flask_cors import CORS
 import google.generativeai as genai
+import json
+import multiprocessing
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from firebase_admin import credentials, firestore, initialize_app
 
+# Shared code (instrumentation, caches, pincodes) lives in ../common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.chat_sessions import ChatSessions, message_tokens, summary_prompt
+from common.fake_gemini import FakeGenerativeModel
+from common.instrumentation import Metrics
+from common.lru_cache import LRUCache
+
+from area_sentiment import DIMENSIONS, SORT_KEYS, AreaSentiment
+from chat_cache import ChatCache, load_question_encoder, replay_chunks
+from feedback_sentiment import (
+    BUCKETS, SCORER_ID, feedback_comments, feedback_fingerprint, page_result, polarities,
+    score_comments, stream_records,
+)
+from sentiment_aggregates import SentimentAggregates, aggregate_summary, extend
+from sse_events import SSE_HEADERS, sse
+
 load_dotenv()
 
 # Get the Firebase credentials path from the environment
@@ -25,14 +46,56 @@ firebase_credentials = {
 
 app = Flask(__name__)
 
-# Enable CORS
-CORS(app)
+# Enable CORS; /stream returns the chat session ID in a header
+CORS(app, expose_headers=["X-Chat-Session"])
+
+# Request, stage and Gemini/Firestore call timings on /metrics
+metrics = Metrics("sentiment")
+metrics.init_app(app)
+
+# Both scorers are pure Python and hold the GIL, so with SENTIMENT_WORKERS > 1
+# bulk requests and area rollups score their feedback in a process pool. The
+# workers are forked here, before Firebase starts its gRPC threads, in every
+# process that imports this module, so the pool is opt-in; the default of 1
+# scores in-process.
+SENTIMENT_WORKERS = int(os.getenv("SENTIMENT_WORKERS", "1"))
+# Below this many uncached comments a bulk request is scored in-process,
+# where the pool's pickling overhead would cost more than it saves
+BULK_POOL_MIN_COMMENTS = int(os.getenv("BULK_POOL_MIN_COMMENTS", "200"))
+MAX_BULK_ISSUES = int(os.getenv("MAX_BULK_ISSUES", "500"))
+
+scoring_pool = None
+if SENTIMENT_WORKERS > 1 and "fork" in multiprocessing.get_all_start_methods():
+    scoring_pool = ProcessPoolExecutor(SENTIMENT_WORKERS, mp_context=multiprocessing.get_context("fork"))
+    scoring_pool.submit(int).result()  # start the workers now
 
 # Init Firebase Admin SDK
 cred = credentials.Certificate(firebase_credentials)  # Add your Firestore service account key
 initialize_app(cred)
 db = firestore.client()
 
+# Sentiment results per issue, stored with the fingerprint of the feedback
+# they were computed from. SENTIMENT_CACHE_SIZE=0 disables the cache.
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "10000"))
+SENTIMENT_CACHE_TTL = float(os.getenv("SENTIMENT_CACHE_TTL", "3600"))
+sentiment_cache = LRUCache(SENTIMENT_CACHE_SIZE, SENTIMENT_CACHE_TTL) if SENTIMENT_CACHE_SIZE > 0 else None
+if sentiment_cache is not None:
+    metrics.gauge_callback("sentiment_cache_entries", lambda: len(sentiment_cache),
+                           help="Issues with a cached sentiment result")
+
+# SENTIMENT_MODE=incremental keeps running per-issue totals in Firestore
+# (SENTIMENT_AGGREGATE_COLLECTION) and answers summary-only requests (bulk
+# without "detail", or ?detail=false) from them, scoring only feedback
+# appended since the last request. The per-comment lists always come from
+# scoring every comment, through the sentiment cache, as in "full" mode.
+# After a scorer change, run rebuild_aggregates.py (stale aggregates are
+# also rebuilt lazily on their next read).
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "full")
+SENTIMENT_AGGREGATE_COLLECTION = os.getenv("SENTIMENT_AGGREGATE_COLLECTION", "issueSentiment")
+aggregates = SentimentAggregates(db.collection(SENTIMENT_AGGREGATE_COLLECTION), SCORER_ID)
+
+# ?format=ndjson streams per-comment scores this many comments at a time
+SENTIMENT_STREAM_CHUNK = int(os.getenv("SENTIMENT_STREAM_CHUNK", "100"))
 
 
 @app.route("/")
@@ -40,12 +103,89 @@ def home():
     return "Backend is running!"
 
 
+# Cached result for an issue whose comments have this fingerprint, or None
+def cached_sentiment(issue_id, fingerprint):
+    cached = sentiment_cache.get(issue_id) if sentiment_cache is not None else None
+    if cached is not None and cached[0] == fingerprint:
+        outcome, result = "hit", cached[1]
+    else:
+        outcome, result = "miss" if cached is None else "stale", None
+
+    metrics.inc("sentiment_cache_lookups_total", {"outcome": outcome},
+                help="Sentiment cache lookups: hit, miss, or stale after a feedback change")
+    return result
+
+
+def store_sentiment(issue_id, fingerprint, result):
+    if sentiment_cache is not None:
+        sentiment_cache.put(issue_id, (fingerprint, result))
+
+
+# Run fn over each comment list, in the scoring pool when there is enough
+# work to pay for the pickling. A worker that dies breaks the pool for good;
+# scoring then carries on in-process, since forking a new pool now would
+# copy Firebase's running gRPC threads' locks.
+def map_scoring(fn, comment_lists):
+    global scoring_pool
+    total = sum(len(c) for c in comment_lists)
+    metrics.inc("feedback_comments_scored_total", amount=total,
+                help="Feedback comments scored by the sentiment scorer")
+    with metrics.stage("score"):
+        pool = scoring_pool
+        if pool is not None and total >= BULK_POOL_MIN_COMMENTS:
+            chunksize = max(1, len(comment_lists) // (SENTIMENT_WORKERS * 4))
+            try:
+                return list(pool.map(fn, comment_lists, chunksize=chunksize))
+            except BrokenProcessPool as e:
+                print(f"[ERROR] Scoring pool broke, scoring in-process from now on: {e}")
+                metrics.inc("scoring_pool_failures_total",
+                            help="Times a scoring worker died and scoring fell back to in-process")
+                scoring_pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+        return [fn(c) for c in comment_lists]
+
+
+# Sentiment results for (issue_id, fingerprint, comments) entries that missed
+# the cache, stored back into it
+def score_pending(pending):
+    results = map_scoring(score_comments, [comments for _, _, comments in pending])
+
+    for (issue_id, fingerprint, _), result in zip(pending, results):
+        store_sentiment(issue_id, fingerprint, result)
+    return results
+
+
+# Summary fields for (issue_id, comments) entries from their stored
+# aggregates, extended with new comments only: one batched read of the
+# aggregates, one batched write of those that changed
+def score_incremental(entries):
+    issue_ids = [issue_id for issue_id, _ in entries]
+    with metrics.external("firestore", "get_aggregates"):
+        stored = aggregates.load_many(db, issue_ids)
+
+    plans = [aggregates.plan(stored[issue_id], comments) for issue_id, comments in entries]
+    scored = map_scoring(polarities, [new_comments for _, new_comments in plans])
+
+    results = []
+    changed = {}
+    for issue_id, (base, new_comments), scores in zip(issue_ids, plans, scored):
+        aggregate = extend(base, new_comments, scores)
+        if aggregate != stored[issue_id]:
+            changed[issue_id] = aggregate
+        results.append(aggregate_summary(aggregate))
+
+    with metrics.external("firestore", "save_aggregates"):
+        aggregates.save_many(db, changed)
+    return results
+
+
 @app.route('/analyze-sentiment/<issue_id>', methods=['GET'])
 def analyze_sentiment(issue_id):
     try:
         # Fetch feedback comments for the specific issue
         issue_ref = db.collection('issues').document(issue_id)
-        issue_doc = issue_ref.get()
+        with metrics.external("firestore", "get_issue"):
+            issue_doc = issue_ref.get()
 
         if not issue_doc.exists:
             return jsonify({"message": "Issue not found"}), 404
@@ -61,59 +201,208 @@ def analyze_sentiment(issue_id):
                 "sentiment": "Neutral"
             }), 200
 
-        # Analyze sentiment
-        total_polarity = 0
-        individual_scores = []
-        positive_feedback = []
-        negative_feedback = []
-        neutral_feedback = []
-
-        for feedback in feedback_data:
-            comment = feedback.get('feedback', '')
-            
-            # Ensure it's a string
-            if not isinstance(comment, str):
-                continue
+        comments = feedback_comments(feedback_data)
+        if wants_ndjson():
+            return stream_sentiment(issue_id, comments)
+
+        try:
+            page = parse_page(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-            blob = TextBlob(comment)
-            score = blob.sentiment.polarity
-            individual_scores.append({"comment": comment, "score": score})
-            
-            # Categorize feedback
-            if score > 0:
-                positive_feedback.append({"comment": comment, "score": score})
-            elif score < 0:
-                negative_feedback.append({"comment": comment, "score": score})
+        # ?detail=false leaves out the per-comment lists
+        if page is None and request.args.get("detail", "").lower() in ("0", "false", "no"):
+            if SENTIMENT_MODE == "incremental":
+                result = score_incremental([(issue_id, comments)])[0]
             else:
-                neutral_feedback.append({"comment": comment, "score": score})
-            
-            total_polarity += score
+                result = summary_fields(sentiment_result(issue_id, comments))
+            with metrics.stage("serialize"):
+                return jsonify(result), 200
+
+        result = sentiment_result(issue_id, comments)
+        with metrics.stage("serialize"):
+            if page is not None:
+                return jsonify(page_result(result, *page)), 200
+            return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({"message": "Error analyzing sentiment", "error": str(e)}), 500
 
-        # Calculate overall score
-        overall_score = total_polarity / len(individual_scores) if individual_scores else 0
 
-        # Determine overall sentiment
-        overall_sentiment = "Neutral"
-        if overall_score > 0:
-            overall_sentiment = "Positive"
-        elif overall_score < 0:
-            overall_sentiment = "Negative"
+# Full /analyze-sentiment body for one issue, from the cache while its
+# feedback is unchanged
+def sentiment_result(issue_id, comments):
+    fingerprint = feedback_fingerprint(comments)
+    result = cached_sentiment(issue_id, fingerprint)
+    if result is None:
+        result = score_pending([(issue_id, fingerprint, comments)])[0]
+    return result
 
-        return jsonify({
-            "overall_sentiment": overall_sentiment,
-            "overall_score": overall_score,
-            "positive_count": len(positive_feedback),
-            "negative_count": len(negative_feedback),
-            "neutral_count": len(neutral_feedback),
-            "positive_feedback": positive_feedback,
-            "negative_feedback": negative_feedback,
-            "neutral_feedback": neutral_feedback
-        }), 200
+
+def summary_fields(result):
+    return {k: v for k, v in result.items() if not k.endswith("_feedback")}
+
+
+def wants_ndjson():
+    return (request.args.get("format") == "ndjson"
+            or request.accept_mimetypes.best == "application/x-ndjson")
+
+
+# (bucket, offset, limit) from ?bucket=&offset=&limit=, or None when the
+# request does not ask for a page
+def parse_page(args):
+    if not any(key in args for key in ("bucket", "offset", "limit")):
+        return None
+
+    bucket = args.get("bucket") or None
+    if bucket is not None and bucket not in BUCKETS:
+        raise ValueError(f"'bucket' must be one of {', '.join(BUCKETS)}.")
+    try:
+        offset = int(args.get("offset", 0))
+        limit = int(args["limit"]) if args.get("limit") else None
+    except ValueError:
+        raise ValueError("'offset' and 'limit' must be integers.")
+    if offset < 0 or (limit is not None and limit < 1):
+        raise ValueError("'offset' must be >= 0 and 'limit' >= 1.")
+    return bucket, offset, limit
+
+
+# NDJSON body for /analyze-sentiment/<issue_id>?format=ndjson: per-comment
+# records as they are scored, then the summary (see stream_records).
+# Results are not cached, so memory stays bounded for very long feedback.
+def stream_sentiment(issue_id, comments):
+    def score(chunk):
+        return map_scoring(polarities, [chunk])[0]
+
+    def generate():
+        for record in stream_records(comments, SENTIMENT_STREAM_CHUNK, score):
+            yield json.dumps(record, separators=(",", ":")) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+# Sentiment for many issues at once. Takes {"issueIds": [...], "detail": false}
+# and returns {"results": [...]} in request order. Each result has the issue
+# id and the summary fields of /analyze-sentiment/<issue_id>; "detail": true
+# adds the per-comment lists. Without detail, SENTIMENT_MODE=incremental
+# answers from the stored aggregates.
+@app.route('/analyze-sentiment/bulk', methods=['POST'])
+def analyze_sentiment_bulk():
+    data = request.get_json(silent=True) or {}
+    issue_ids = data.get("issueIds")
+    detail = bool(data.get("detail", False))
+
+    if not isinstance(issue_ids, list) or not issue_ids or not all(isinstance(i, str) and i for i in issue_ids):
+        return jsonify({"error": "Expected a non-empty 'issueIds' list of strings."}), 400
+    issue_ids = list(dict.fromkeys(issue_ids))
+    if len(issue_ids) > MAX_BULK_ISSUES:
+        return jsonify({"error": f"At most {MAX_BULK_ISSUES} issues per request."}), 400
+
+    try:
+        # One batched read for every document, fetching only the feedback
+        refs = [db.collection('issues').document(issue_id) for issue_id in issue_ids]
+        with metrics.external("firestore", "get_all_issues"):
+            docs = {doc.id: doc for doc in db.get_all(refs, field_paths=["feedback"])}
+
+        from_aggregates = SENTIMENT_MODE == "incremental" and not detail
+        results = {}
+        pending = []  # (issue_id, fingerprint, comments) still to be scored
+        for issue_id in issue_ids:
+            doc = docs.get(issue_id)
+            if doc is None or not doc.exists:
+                results[issue_id] = {"message": "Issue not found"}
+                continue
+
+            comments = feedback_comments((doc.to_dict() or {}).get('feedback', []) or [])
+            if not comments:
+                results[issue_id] = dict(score_comments([]), message="No feedback found for this issue")
+                continue
+
+            if from_aggregates:
+                pending.append((issue_id, None, comments))
+                continue
+
+            fingerprint = feedback_fingerprint(comments)
+            cached = cached_sentiment(issue_id, fingerprint)
+            if cached is not None:
+                results[issue_id] = cached
+            else:
+                pending.append((issue_id, fingerprint, comments))
+
+        if from_aggregates and pending:
+            summaries = score_incremental([(issue_id, comments) for issue_id, _, comments in pending])
+            for (issue_id, _, _), result in zip(pending, summaries):
+                results[issue_id] = result
+        elif pending:
+            for (issue_id, _, _), result in zip(pending, score_pending(pending)):
+                results[issue_id] = result
+
+        with metrics.stage("serialize"):
+            return jsonify({"results": [
+                dict(results[issue_id] if detail else summary_fields(results[issue_id]), issueId=issue_id)
+                for issue_id in issue_ids
+            ]}), 200
 
     except Exception as e:
         return jsonify({"message": "Error analyzing sentiment", "error": str(e)}), 500
 
 
+# Feedback sentiment rolled up by pincode, category and complaint date
+# window (AREA_SENTIMENT_WINDOW=day|week|month), kept up to date from the
+# issues change feed and saved to AREA_SENTIMENT_FILE. Off by default: the
+# listener streams the whole issues collection and scores its feedback at
+# startup. AREA_SENTIMENT=1 turns it on; run it in one process only.
+AREA_SENTIMENT_ENABLED = os.getenv("AREA_SENTIMENT", "0").lower() in ("1", "true", "yes")
+AREA_SENTIMENT_SAVE_INTERVAL = float(os.getenv("AREA_SENTIMENT_SAVE_INTERVAL", "60"))
+MAX_AREA_ROWS = int(os.getenv("MAX_AREA_ROWS", "1000"))
+area_sentiment = AreaSentiment(
+    os.getenv("AREA_SENTIMENT_FILE", os.path.join("cache", "area_sentiment.json")),
+    SCORER_ID,
+    lambda comment_lists: map_scoring(polarities, comment_lists),
+    os.getenv("AREA_SENTIMENT_WINDOW", "month"),
+)
+if AREA_SENTIMENT_ENABLED:
+    area_sentiment.start(db.collection('issues'), AREA_SENTIMENT_SAVE_INTERVAL)
+    metrics.gauge_callback("area_sentiment_issues", lambda: len(area_sentiment),
+                           help="Issues included in the area sentiment rollups")
+
+
+# Area-level sentiment, e.g. the angriest pincodes:
+#   /area-sentiment?group_by=pincode&min_comments=20
+#   /area-sentiment?group_by=category,window&pincode=560001&sort=-score
+# group_by is a comma-separated subset of pincode, category and window;
+# pincode=, category= and window= filter; sort is score (most negative
+# first), -score, comments or issues; limit caps the rows.
+@app.route('/area-sentiment', methods=['GET'])
+def area_sentiment_rows():
+    if not AREA_SENTIMENT_ENABLED:
+        return jsonify({"error": "Area sentiment is disabled."}), 404
+
+    group_by = [d for d in request.args.get("group_by", "pincode").split(",") if d]
+    filters = {d: request.args[d] for d in DIMENSIONS if d in request.args}
+    sort = request.args.get("sort", "score")
+    if any(d not in DIMENSIONS for d in group_by):
+        return jsonify({"error": f"'group_by' must be a subset of {', '.join(DIMENSIONS)}."}), 400
+    if sort not in SORT_KEYS:
+        return jsonify({"error": f"'sort' must be one of {', '.join(SORT_KEYS)}."}), 400
+    try:
+        limit = min(int(request.args.get("limit", 50)), MAX_AREA_ROWS)
+        min_comments = int(request.args.get("min_comments", 0))
+    except ValueError:
+        return jsonify({"error": "'limit' and 'min_comments' must be integers."}), 400
+
+    with metrics.stage("area_rollup"):
+        rows = area_sentiment.rows(group_by, filters, sort, max(limit, 0), min_comments)
+
+    with metrics.stage("serialize"):
+        return jsonify({
+            "group_by": [d for d in DIMENSIONS if d in group_by],
+            "window_size": area_sentiment.window,
+            "last_change": area_sentiment.last_change,
+            "rows": rows,
+        }), 200
+
+
 genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
 
 # Initialize the generative model with the specified model name.
@@ -128,37 +417,166 @@ generation_config = {
   "response_mime_type": "text/plain",
 }
 
-model = genai.GenerativeModel(
-  model_name="gemini-2.0-flash",
-  generation_config=generation_config,
-)
+# CHAT_BACKEND=fake answers from canned text without calling Gemini, for
+# tests and load tests (FAKE_CHAT_LATENCY_MS, FAKE_CHAT_CHUNK_LATENCY_MS)
+CHAT_BACKEND = os.getenv("CHAT_BACKEND", "gemini")
+if CHAT_BACKEND == "fake":
+    model = FakeGenerativeModel(
+        latency_ms=float(os.getenv("FAKE_CHAT_LATENCY_MS", "0")),
+        chunk_latency_ms=float(os.getenv("FAKE_CHAT_CHUNK_LATENCY_MS", "0")),
+    )
+else:
+    model = genai.GenerativeModel(
+      model_name="gemini-2.0-flash",
+      generation_config=generation_config,
+    )
+
+# Answers to repeated questions (how to report an issue, change a password,
+# ...) are served from a cache instead of a Gemini round trip. Only turns
+# with at most CHAT_CACHE_MAX_HISTORY earlier messages are cached.
+# CHAT_CACHE_EMBEDDING_MODEL (a sentence-transformers model) also lets a
+# history-free question reuse the answer to one that means the same, at
+# CHAT_CACHE_SIMILARITY or above. CHAT_CACHE_SIZE=0 disables the cache.
+CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", "1000"))
+chat_cache = None
+if CHAT_CACHE_SIZE > 0:
+    embedding_model = os.getenv("CHAT_CACHE_EMBEDDING_MODEL")
+    chat_cache = ChatCache(
+        CHAT_CACHE_SIZE,
+        float(os.getenv("CHAT_CACHE_TTL", "86400")),
+        int(os.getenv("CHAT_CACHE_MAX_HISTORY", "2")),
+        load_question_encoder(embedding_model) if embedding_model else None,
+        float(os.getenv("CHAT_CACHE_SIMILARITY", "0.92")),
+    )
+    metrics.gauge_callback("chat_cache_entries", lambda: len(chat_cache),
+                           help="Chatbot answers in the response cache")
+
+
+# Cached answer for a chat turn, or None
+def cached_answer(msg, chat_history):
+    if chat_cache is None:
+        return None
+    answer, outcome = chat_cache.get(msg, chat_history)
+    metrics.inc("chat_cache_lookups_total", {"outcome": outcome},
+                help="Chat cache lookups: hit, similar, miss, or skipped for long histories")
+    return answer
+
+
+def store_answer(msg, chat_history, answer):
+    if chat_cache is not None:
+        chat_cache.put(msg, chat_history, answer)
+
+
+# Fold older chat turns into a summary with the chat model
+def summarize_chat(summary, messages, max_tokens):
+    with metrics.external("gemini", "summarize_chat"):
+        return model.start_chat().send_message(summary_prompt(summary, messages, max_tokens)).text
+
+
+# Chat history kept server side for clients that ask for it: a request with
+# "session": true starts a session, and later ones send only the new message
+# with its session_id. Once a session passes CHAT_SESSION_TOKEN_BUDGET
+# (estimated) tokens, turns older than the last CHAT_SESSION_KEEP_TURNS
+# exchanges are folded into a rolling summary of at most
+# CHAT_SESSION_SUMMARY_TOKENS, by the chat model (CHAT_SESSION_SUMMARIZER=
+# model) or by keeping the start of each message (extractive), in the
+# background after the turn is answered.
+# CHAT_SESSION_DIR also keeps sessions on disk. Other clients send their
+# own `history` (or none) as before.
+# CHAT_SESSIONS=0 disables the store.
+chat_sessions = None
+if os.getenv("CHAT_SESSIONS", "1") == "1":
+    chat_sessions = ChatSessions(
+        token_budget=int(os.getenv("CHAT_SESSION_TOKEN_BUDGET", "2000")),
+        keep_turns=int(os.getenv("CHAT_SESSION_KEEP_TURNS", "2")),
+        summary_tokens=int(os.getenv("CHAT_SESSION_SUMMARY_TOKENS", "300")),
+        max_sessions=int(os.getenv("CHAT_SESSION_MAX", "10000")),
+        ttl_seconds=float(os.getenv("CHAT_SESSION_TTL", "86400")),
+        directory=os.getenv("CHAT_SESSION_DIR") or None,
+        summarize=summarize_chat if os.getenv("CHAT_SESSION_SUMMARIZER", "model") == "model" else None,
+    )
+    metrics.gauge_callback("chat_sessions", lambda: len(chat_sessions),
+                           help="Chat sessions held in memory")
+    metrics.gauge_callback("chat_session_compactions", lambda: chat_sessions.compactions,
+                           help="Times older chat turns were folded into a session summary")
+
+
+# (session_id, history) for a chat request: the history of `session_id`, or
+# of a new session when the request has "session": true, else the client's
+# own `history` without a session. History is None for an unknown or
+# expired session.
+def chat_context(data):
+    session_id = data.get('session_id')
+    if chat_sessions is None or 'history' in data or not (session_id or data.get('session') is True):
+        return None, data.get('history', [])
+
+    if not session_id:
+        session_id = chat_sessions.create()
+    elif chat_sessions.get(session_id) is None:
+        return session_id, None
+
+    chat_history = chat_sessions.history(session_id)
+    metrics.inc("chat_history_tokens_total",
+                amount=sum(message_tokens(m) for m in chat_history),
+                help="Estimated tokens of history sent to the model with session chats")
+    return session_id, chat_history
+
+
+def remember_turn(session_id, msg, answer):
+    if session_id is not None:
+        chat_sessions.append(session_id, msg, answer)
+
+
+def unknown_session(session_id):
+    return jsonify({"error": f"Unknown or expired chat session: {session_id}"}), 404
+
+
+@app.route('/chat/session/<session_id>', methods=['DELETE'])
+def end_chat_session(session_id):
+    if chat_sessions is not None:
+        chat_sessions.delete(session_id)
+    return "", 204
 
 @app.route('/chat', methods=['POST'])
 def chat():
     """Processes user input and returns AI-generated responses.
 
     This function handles POST requests to the '/chat' endpoint. It expects a JSON payload
-    containing a user message and an optional conversation history. It returns the AI's
-    response as a JSON object.
+    containing a user message and either the conversation history, a session_id, or
+    "session": true to start a server-side session. It returns the AI's response as a
+    JSON object.
 
     Args:
         None (uses Flask `request` object to access POST data)
 
     Returns:
-        A JSON object with a key "text" that contains the AI-generated response.
+        A JSON object with a key "text" that contains the AI-generated response, and
+        "session_id" to send with the next message when the request uses a session.
     """
     # Parse the incoming JSON data into variables.
     data = request.json
     msg = data.get('chat', '')
-    chat_history = data.get('history', [])
+    session_id, chat_history = chat_context(data)
+    if chat_history is None:
+        return unknown_session(session_id)
+    reply = {"session_id": session_id} if session_id is not None else {}
+
+    # Repeated questions are answered from the cache
+    answer = cached_answer(msg, chat_history)
+    if answer is not None:
+        remember_turn(session_id, msg, answer)
+        return dict(reply, text=answer)
 
     # Start a chat session with the model using the provided history.
     chat_session = model.start_chat(history=chat_history)
 
     # Send the latest user input to the model and get the response.
-    response = chat_session.send_message(msg)
+    with metrics.external("gemini", "send_message"):
+        response = chat_session.send_message(msg)
 
-    return {"text": response.text}
+    store_answer(msg, chat_history, response.text)
+    remember_turn(session_id, msg, response.text)
+    return dict(reply, text=response.text)
 
 @app.route("/stream", methods=["POST"])
 def stream():
@@ -173,20 +591,59 @@ def stream():
         None (uses Flask `request` object to access POST data)
 
     Returns:
-        A Flask `Response` object that streams the AI-generated responses.
+        A Flask `Response` object that streams the AI-generated responses as Server-Sent
+        Events, the same events as stream_server.py sends (session, text, done, error),
+        with the chat session ID also in the X-Chat-Session header.
     """
+    data = request.json
+    msg = data.get('chat', '')
+    session_id, chat_history = chat_context(data)
+    if chat_history is None:
+        return unknown_session(session_id)
+
     def generate():
-        data = request.json
-        msg = data.get('chat', '')
-        chat_history = data.get('history', [])
+        if session_id is not None:
+            yield sse({"session_id": session_id}, "session")
+
+        # A cached answer is replayed in chunks, like a streamed one
+        answer = cached_answer(msg, chat_history)
+        if answer is not None:
+            for event_id, text in enumerate(replay_chunks(answer)):
+                yield sse({"text": text}, event_id=event_id)
+            remember_turn(session_id, msg, answer)
+            yield sse({"cached": True}, "done")
+            return
 
         chat_session = model.start_chat(history=chat_history)
-        response = chat_session.send_message(msg, stream=True)
+        start = time.perf_counter()
+        parts = []
+        try:
+            with metrics.external("gemini", "send_message_stream"):
+                response = chat_session.send_message(msg, stream=True)
+
+                first = True
+                for chunk in response:
+                    if first:
+                        metrics.observe("gemini_first_chunk_seconds", time.perf_counter() - start,
+                                        help="Time until Gemini streams its first chunk")
+                        first = False
+                    parts.append(chunk.text)
+                    yield sse({"text": chunk.text}, event_id=len(parts) - 1)
+        except Exception as e:
+            print(f"[ERROR] Chat stream failed: {e}")
+            yield sse({"error": str(e)}, "error")
+            return
 
-        for chunk in response:
-            yield f"{chunk.text}"
+        # Only complete answers are cached and remembered; a disconnect
+        # never gets here
+        store_answer(msg, chat_history, "".join(parts))
+        remember_turn(session_id, msg, "".join(parts))
+        yield sse({"cached": False}, "done")
 
-    return Response(stream_with_context(generate()), mimetype="text/event-stream")
+    headers = dict(SSE_HEADERS)
+    if session_id is not None:
+        headers["X-Chat-Session"] = session_id
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
 
 
 
@@ -504,4 +961,7 @@ If you ever have a question, feel free to ask me—I’m here to help you make y
 
 
 if __name__ == '__main__':
-    app.run(host="0.0.0.0", port=8080, debug=True)
+    # No reloader: it would import this module a second time, with its own
+    # scoring pool, Firestore listeners and session threads. FLASK_DEBUG=1
+    # turns debug mode on.
+    app.run(host="0.0.0.0", port=8080, debug=os.getenv("FLASK_DEBUG") == "1", use_reloader=False)
@@ -0,0 +1,272 @@
+import json
+import os
+import threading
+import time
+from datetime import date, datetime
+from itertools import combinations
+
+from common.pincode import extract_pincode
+from feedback_sentiment import feedback_comments, feedback_fingerprint, summary
+
+DIMENSIONS = ("pincode", "category", "window")
+WINDOW_SIZES = ("day", "week", "month")
+
+# Every subset of DIMENSIONS, in DIMENSIONS order; one rollup table each
+GROUPINGS = [dims for n in range(len(DIMENSIONS) + 1) for dims in combinations(DIMENSIONS, n)]
+
+SUM, COMMENTS, POSITIVE, NEGATIVE, NEUTRAL, ISSUES = range(6)
+
+
+# Feedback polarity rolled up by pincode, category and time window of the
+# complaint, kept as materialized tables for every combination of those
+# dimensions so a dashboard read only filters and sorts one small table.
+#
+# Fed from the issues collection's change feed like IssueSync: each issue's
+# contribution (its key, feedback fingerprint and polarity totals) is
+# remembered, so a change only subtracts the old contribution and adds the
+# new one, and feedback is rescored only when its fingerprint changes.
+# Contributions are saved to `path` so a restart rescores nothing that did
+# not change; a file from another scorer or window size is ignored.
+class AreaSentiment:
+    def __init__(self, path, scorer_id, score_many, window="month"):
+        if window not in WINDOW_SIZES:
+            raise ValueError(f"window must be one of {', '.join(WINDOW_SIZES)}")
+        self.path = path
+        self.scorer_id = scorer_id
+        self.score_many = score_many  # callable(list of comment lists) -> list of score lists
+        self.window = window
+        self.last_change = None
+        self._issues = {}  # issue_id -> contribution
+        self._tables = {dims: {} for dims in GROUPINGS}
+        self._lock = threading.Lock()        # guards the tables for readers
+        self._apply_lock = threading.Lock()  # one writer at a time
+        self._dirty = False
+        self._watch = None
+        self._first_snapshot = True
+
+    def __len__(self):
+        return len(self._issues)
+
+    # changes: iterable of (change_type, doc_id, data) where change_type is
+    # "ADDED", "MODIFIED" or "REMOVED". Scoring happens outside the table
+    # lock, so reads are never blocked by it. Only the last change to each
+    # issue in a batch counts.
+    def apply_changes(self, changes):
+        latest = {}
+        for change_type, doc_id, data in changes:
+            latest[doc_id] = (change_type, data)
+
+        with self._apply_lock:
+            updates = {}   # issue_id -> contribution, or None to remove
+            to_score = []  # (issue_id, key, fingerprint, comments)
+            for doc_id, (change_type, data) in latest.items():
+                old = self._issues.get(doc_id)
+                if change_type == "REMOVED" or data is None:
+                    if old is not None:
+                        updates[doc_id] = None
+                    continue
+
+                key = issue_key(data, self.window)
+                comments = feedback_comments(data.get("feedback") or [])
+                fingerprint = feedback_fingerprint(comments)
+                if old is not None and old["fingerprint"] == fingerprint:
+                    if old["key"] != key:
+                        updates[doc_id] = dict(old, key=key)
+                    continue
+                to_score.append((doc_id, key, fingerprint, comments))
+
+            scored = self.score_many([comments for *_, comments in to_score]) if to_score else []
+            for (doc_id, key, fingerprint, comments), scores in zip(to_score, scored):
+                updates[doc_id] = contribution(key, fingerprint, scores)
+
+            if updates:
+                with self._lock:
+                    for doc_id, new in updates.items():
+                        self._set(doc_id, new)
+                self._dirty = True
+                self.last_change = time.time()
+            return {"rescored": len(to_score), "changed": len(updates)}
+
+    # Firestore on_snapshot callback. The first snapshot lists every issue,
+    # so issues saved before a restart but deleted since are dropped then.
+    def on_snapshot(self, col_snapshot, changes, read_time):
+        try:
+            changes = [(change.type.name, change.document.id, change.document.to_dict())
+                       for change in changes]
+            if self._first_snapshot:
+                self._first_snapshot = False
+                present = {doc_id for _, doc_id, _ in changes}
+                changes += [("REMOVED", doc_id, None) for doc_id in list(self._issues)
+                            if doc_id not in present]
+            self.apply_changes(changes)
+        except Exception as e:
+            # Never let a bad document kill the watch thread
+            print(f"[ERROR] Failed to apply area sentiment changes: {e}")
+
+    # Load saved contributions, listen to the collection and save every
+    # save_interval seconds while there are changes
+    def start(self, collection_ref, save_interval=60.0):
+        self.load()
+        self._first_snapshot = True
+        self._watch = collection_ref.on_snapshot(self.on_snapshot)
+        threading.Thread(target=self._save_loop, args=(save_interval,),
+                         name="area-sentiment-save", daemon=True).start()
+        return self._watch
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    # Rows of the rollup over `group_by` (a subset of DIMENSIONS) for the
+    # issues matching `filters` ({dimension: value}), each with the
+    # dimension values, issue and comment counts and the summary fields of
+    # /analyze-sentiment. Sorted by `sort`: "score" (most negative first),
+    # "-score", "comments" or "issues" (largest first).
+    def rows(self, group_by=(), filters=None, sort="score", limit=50, min_comments=0):
+        filters = filters or {}
+        dims = tuple(d for d in DIMENSIONS if d in group_by or d in filters)
+        positions = [(dims.index(d), value) for d, value in filters.items()]
+        out = [d for d in DIMENSIONS if d in group_by]
+
+        found = []
+        with self._lock:
+            for key, entry in self._tables[dims].items():
+                if entry[COMMENTS] < min_comments:
+                    continue
+                if all(key[i] == value for i, value in positions):
+                    found.append((key, list(entry)))
+
+        found.sort(key=SORT_KEYS[sort])
+        if limit is not None:
+            found = found[:limit]
+
+        rows = []
+        for key, entry in found:
+            row = {d: key[dims.index(d)] for d in out}
+            row["issues"] = entry[ISSUES]
+            row["comments"] = entry[COMMENTS]
+            row.update(summary(entry[SUM], entry[COMMENTS], entry[POSITIVE], entry[NEGATIVE], entry[NEUTRAL]))
+            rows.append(row)
+        return rows
+
+    def save(self):
+        with self._lock:
+            data = {
+                "scorer": self.scorer_id,
+                "window": self.window,
+                "issues": dict(self._issues),
+            }
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, TypeError, ValueError):
+            return False
+        if data.get("scorer") != self.scorer_id or data.get("window") != self.window:
+            print(f"[AREA] Ignoring {self.path}: built with {data.get('scorer')} by {data.get('window')}")
+            return False
+
+        with self._lock:
+            self._issues = {}
+            self._tables = {dims: {} for dims in GROUPINGS}
+            for doc_id, saved in data["issues"].items():
+                self._set(doc_id, dict(saved, key=tuple(saved["key"])))
+        print(f"[AREA] Loaded {len(self._issues)} issues from {self.path}")
+        return True
+
+    def stats(self):
+        return {
+            "issues": len(self._issues),
+            "window": self.window,
+            "rows": len(self._tables[DIMENSIONS]),
+            "last_change": self.last_change,
+        }
+
+    def _save_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            if self._dirty:
+                try:
+                    self.save()
+                except Exception as e:
+                    print(f"[ERROR] Failed to save area sentiment: {e}")
+
+    # Replace an issue's contribution in every table (caller holds _lock)
+    def _set(self, doc_id, new):
+        old = self._issues.pop(doc_id, None)
+        if old is not None:
+            self._add(old, -1)
+        if new is not None:
+            self._issues[doc_id] = new
+            self._add(new, 1)
+
+    def _add(self, item, sign):
+        values = dict(zip(DIMENSIONS, item["key"]))
+        deltas = (item["sum"], item["comments"], item["positive"], item["negative"], item["neutral"], 1)
+        for dims, table in self._tables.items():
+            key = tuple(values[d] for d in dims)
+            entry = table.get(key)
+            if entry is None:
+                entry = table[key] = [0.0, 0, 0, 0, 0, 0]
+            for i, delta in enumerate(deltas):
+                entry[i] += sign * delta
+            if entry[ISSUES] == 0:
+                del table[key]
+
+
+SORT_KEYS = {
+    "score": lambda row: row[1][SUM] / row[1][COMMENTS] if row[1][COMMENTS] else 0,
+    "-score": lambda row: -(row[1][SUM] / row[1][COMMENTS] if row[1][COMMENTS] else 0),
+    "comments": lambda row: -row[1][COMMENTS],
+    "issues": lambda row: -row[1][ISSUES],
+}
+
+
+# (pincode, category, window) of an issue document; None where unknown
+def issue_key(data, window):
+    return (
+        extract_pincode(data.get("address", "")),
+        data.get("category") or None,
+        window_of(data.get("dateOfComplaint"), window),
+    )
+
+
+# "2025-01-07" by day, "2025-W02" by ISO week, "2025-01" by month
+def window_of(value, window):
+    if isinstance(value, datetime):
+        day = value.date()
+    elif isinstance(value, date):
+        day = value
+    elif isinstance(value, str):
+        try:
+            day = date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+    else:
+        return None
+
+    if window == "day":
+        return day.isoformat()
+    if window == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    return f"{day.year}-{day.month:02d}"
+
+
+def contribution(key, fingerprint, scores):
+    return {
+        "key": key,
+        "fingerprint": fingerprint,
+        "sum": sum(scores),
+        "comments": len(scores),
+        "positive": sum(1 for s in scores if s > 0),
+        "negative": sum(1 for s in scores if s < 0),
+        "neutral": sum(1 for s in scores if s == 0),
+    }
@@ -0,0 +1,119 @@
+import json
+import re
+import threading
+
+from common.lru_cache import LRUCache
+
+
+# Question text without case, punctuation or extra spaces, so "How can I
+# report an issue?" and "how can i report an issue" share an entry
+def normalize_question(text):
+    return " ".join(re.sub(r"[^\w\s]", " ", str(text).lower()).split())
+
+
+# Chatbot answers for repeated questions, in front of the chat model.
+#
+# Only turns with at most max_history earlier messages are cached, and the
+# history is part of the key. History-free questions can also match a
+# cached question by meaning when an `embed` function is given
+# (text -> normalized 1-D torch tensor): the closest cached question at or
+# above `threshold` cosine similarity answers. Entries expire after
+# ttl_seconds and the least recently used are evicted beyond max_size.
+class ChatCache:
+    def __init__(self, max_size, ttl_seconds, max_history=2, embed=None, threshold=0.92):
+        self.answers = LRUCache(max_size, ttl_seconds)
+        self.max_history = max_history
+        self.embed = embed
+        self.threshold = threshold
+        self._vectors = {}  # key -> embedding, history-free questions only
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.answers)
+
+    def cacheable(self, history):
+        return len(history or []) <= self.max_history
+
+    # (answer, outcome) where outcome is "hit", "similar", "miss" or
+    # "skipped" for turns with too much history
+    def get(self, message, history=None):
+        if not self.cacheable(history):
+            return None, "skipped"
+
+        key = cache_key(message, history)
+        answer = self.answers.get(key)
+        if answer is not None:
+            return answer, "hit"
+
+        if self.embed is not None and not history and self._vectors:
+            answer = self._similar(message)
+            if answer is not None:
+                return answer, "similar"
+        return None, "miss"
+
+    def put(self, message, history, answer):
+        if not answer or not self.cacheable(history):
+            return
+        key = cache_key(message, history)
+        self.answers.put(key, answer)
+
+        if self.embed is not None and not history:
+            vector = self.embed(normalize_question(message))
+            with self._lock:
+                self._vectors[key] = vector
+                # Forget the vectors of evicted and expired answers
+                if len(self._vectors) > self.answers.max_size:
+                    for stale in [k for k in self._vectors if k not in self.answers]:
+                        del self._vectors[stale]
+
+    def stats(self):
+        return dict(self.answers.stats(), max_history=self.max_history,
+                    similarity_threshold=self.threshold if self.embed is not None else None)
+
+    def _similar(self, message):
+        import torch
+
+        query = self.embed(normalize_question(message))
+        with self._lock:
+            keys = list(self._vectors)
+            matrix = torch.stack([self._vectors[k] for k in keys])
+        scores = matrix @ query
+        best = int(torch.argmax(scores))
+        if float(scores[best]) < self.threshold:
+            return None
+
+        answer = self.answers.get(keys[best])
+        if answer is None:
+            with self._lock:
+                self._vectors.pop(keys[best], None)
+        return answer
+
+
+def cache_key(message, history):
+    if not history:
+        return normalize_question(message)
+    return normalize_question(message) + "\n" + json.dumps(history, sort_keys=True, default=str)
+
+
+# Question encoder for ChatCache(embed=...), or None when
+# sentence-transformers is not installed
+def load_question_encoder(model_name):
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("[SKIP] sentence-transformers is not installed; the chat cache matches exact questions only")
+        return None
+
+    encoder = SentenceTransformer(model_name)
+    return lambda text: encoder.encode(text, convert_to_tensor=True, normalize_embeddings=True)
+
+
+# A cached answer as stream chunks of about `size` characters, split after
+# spaces, for the /stream endpoint
+def replay_chunks(text, size=64):
+    start = 0
+    while start < len(text):
+        end = text.find(" ", start + size)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end]
+        start = end
@@ -0,0 +1,132 @@
+"""Parity and throughput check for sentiment scorers.
+
+Scores a corpus with TextBlob (the reference) and with the scorer under
+test, then reports how far the polarities drift, how often the
+Positive/Negative/Neutral class changes, and comments/second for each.
+Exits with status 1 if any comment differs by more than --tolerance.
+
+The default corpus is the complaint texts in
+../similarity_model/data/issues.csv plus a set of short feedback-style
+comments that exercise negation, intensifiers, exclamations and emoticons;
+--corpus adds a file with one comment per line.
+
+    python check_scorer.py --scorer lexicon
+    python check_scorer.py --scorer lexicon --corpus feedback.txt --repeat 20 --json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from sentiment_scorers import SCORERS, TextBlobScorer, get_scorer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ISSUES_CSV = os.path.join(HERE, "..", "similarity_model", "data", "issues.csv")
+
+# Polarity may differ from TextBlob by at most this much per comment
+TOLERANCE = 0.01
+
+FEEDBACK = [
+    "Thank you, the work was done quickly and properly.",
+    "Still not fixed after weeks, very disappointing.",
+    "Great response from the authorities, much appreciated!",
+    "Not good. Not bad either.",
+    "The road is not really good yet",
+    "Really not happy with the repair :(",
+    "Very very good job!!!",
+    "Excellent work :) the street looks clean now.",
+    "Terrible service, complaints are being ignored...",
+    "I don't think this is acceptable",
+    "Never seen such a poor response",
+    "Sure, a \"great\" fix (!)",
+    "Mr. Sharma's team was extremely helpful.",
+    "It's okay-ish, could be better",
+    "worst. service. ever.",
+    "NOT FIXED!!! Absolutely useless",
+    "",
+]
+
+
+def load_corpus(extra_path):
+    comments = list(FEEDBACK)
+    if os.path.exists(ISSUES_CSV):
+        with open(ISSUES_CSV, "r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                comments.append(row["title"])
+                comments.append(row["description"])
+    if extra_path:
+        with open(extra_path, "r", encoding="utf-8") as f:
+            comments.extend(line.rstrip("\n") for line in f)
+    return comments
+
+
+def throughput(scorer, comments, batch_size):
+    start = time.perf_counter()
+    scores = []
+    for i in range(0, len(comments), batch_size):
+        scores.extend(scorer.polarities(comments[i:i + batch_size]))
+    return scores, round(len(comments) / (time.perf_counter() - start), 1)
+
+
+def label(score):
+    return "Positive" if score > 0 else "Negative" if score < 0 else "Neutral"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scorer", choices=SCORERS, default="lexicon")
+    parser.add_argument("--corpus", help="extra comments, one per line")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="score the corpus this many times for the throughput numbers")
+    parser.add_argument("--batch-size", type=int, default=256,
+                        help="comments per polarities() call")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--json", action="store_true", help="print a machine-readable report")
+    args = parser.parse_args()
+
+    comments = load_corpus(args.corpus)
+    timed = comments * args.repeat
+
+    reference, ref_rate = throughput(TextBlobScorer(), timed, args.batch_size)
+    candidate, cand_rate = throughput(get_scorer(args.scorer), timed, args.batch_size)
+    reference, candidate = reference[:len(comments)], candidate[:len(comments)]
+
+    diffs = [abs(a - b) for a, b in zip(reference, candidate)]
+    worst = sorted(zip(diffs, comments, reference, candidate), key=lambda d: d[0], reverse=True)
+    report = {
+        "scorer": args.scorer,
+        "comments": len(comments),
+        "tolerance": args.tolerance,
+        "max_abs_diff": max(diffs, default=0.0),
+        "mean_abs_diff": sum(diffs) / len(diffs) if diffs else 0.0,
+        "over_tolerance": sum(d > args.tolerance for d in diffs),
+        "label_changes": sum(label(a) != label(b) for a, b in zip(reference, candidate)),
+        "textblob_comments_per_s": ref_rate,
+        f"{args.scorer}_comments_per_s": cand_rate,
+        "speedup": round(cand_rate / ref_rate, 2) if ref_rate else None,
+        "worst": [
+            {"comment": c[:200], "textblob": a, args.scorer: b}
+            for d, c, a, b in worst[:5] if d > 0
+        ],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"[INFO] {report['comments']} comments, scorer {args.scorer}")
+        print(f"[INFO] Max |diff| {report['max_abs_diff']:.6f}, mean {report['mean_abs_diff']:.6f}, "
+              f"{report['over_tolerance']} over {args.tolerance}, {report['label_changes']} label changes")
+        print(f"[INFO] textblob {ref_rate} comments/s, {args.scorer} {cand_rate} comments/s "
+              f"({report['speedup']}x)")
+        for entry in report["worst"]:
+            print(f"[INFO]   {entry['textblob']:+.4f} vs {entry[args.scorer]:+.4f}  {entry['comment'][:80]!r}")
+
+    if report["over_tolerance"]:
+        print(f"[ERROR] {report['over_tolerance']} comments differ by more than {args.tolerance}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import hashlib
+import os
+
+from sentiment_scorers import get_scorer
+
+# SENTIMENT_SCORER=textblob (default) or lexicon, see sentiment_scorers.py.
+# SCORER_ID identifies it; stored sentiment aggregates from another scorer
+# are rebuilt rather than extended.
+scorer = get_scorer(os.getenv("SENTIMENT_SCORER", "textblob"))
+SCORER_ID = scorer.scorer_id
+
+
+# The comment strings of an issue's feedback array, in order. Entries
+# without a string comment are skipped.
+def feedback_comments(feedback_data):
+    comments = []
+    for feedback in feedback_data:
+        comment = feedback.get('feedback', '') if isinstance(feedback, dict) else None
+
+        # Ensure it's a string
+        if isinstance(comment, str):
+            comments.append(comment)
+    return comments
+
+
+# Identifies the scored content of a feedback array; changes whenever a
+# comment is added, edited, removed or reordered
+def feedback_fingerprint(comments):
+    digest = hashlib.sha1()
+    for comment in comments:
+        digest.update(comment.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def polarities(comments):
+    return scorer.polarities(comments)
+
+
+# Score every comment and build the /analyze-sentiment body
+def score_comments(comments):
+    return build_result(comments, polarities(comments))
+
+
+# The /analyze-sentiment body for comments with known polarity scores
+def build_result(comments, scores):
+    total_polarity = 0
+    positive_feedback = []
+    negative_feedback = []
+    neutral_feedback = []
+
+    for comment, score in zip(comments, scores):
+        # Categorize feedback
+        if score > 0:
+            positive_feedback.append({"comment": comment, "score": score})
+        elif score < 0:
+            negative_feedback.append({"comment": comment, "score": score})
+        else:
+            neutral_feedback.append({"comment": comment, "score": score})
+
+        total_polarity += score
+
+    result = summary(total_polarity, len(comments), len(positive_feedback),
+                     len(negative_feedback), len(neutral_feedback))
+    result["positive_feedback"] = positive_feedback
+    result["negative_feedback"] = negative_feedback
+    result["neutral_feedback"] = neutral_feedback
+    return result
+
+
+# The summary fields of the /analyze-sentiment body
+def summary(total_polarity, count, positive, negative, neutral):
+    # Calculate overall score
+    overall_score = total_polarity / count if count else 0
+
+    # Determine overall sentiment
+    overall_sentiment = "Neutral"
+    if overall_score > 0:
+        overall_sentiment = "Positive"
+    elif overall_score < 0:
+        overall_sentiment = "Negative"
+
+    return {
+        "overall_sentiment": overall_sentiment,
+        "overall_score": overall_score,
+        "positive_count": positive,
+        "negative_count": negative,
+        "neutral_count": neutral,
+    }
+
+
+# The /analyze-sentiment body as a sequence of records: one
+# {"type": "comment", "index", "comment", "score", "sentiment"} per comment
+# in feedback order, then {"type": "summary", ...} with the summary fields.
+# Comments are passed to score() chunk_size at a time, so only one chunk of
+# results is held at once.
+def stream_records(comments, chunk_size, score=polarities):
+    counts = {"Positive": 0, "Negative": 0, "Neutral": 0}
+    total_polarity = 0
+
+    for start in range(0, len(comments), chunk_size):
+        chunk = comments[start:start + chunk_size]
+        for index, (comment, value) in enumerate(zip(chunk, score(chunk)), start):
+            label = "Positive" if value > 0 else "Negative" if value < 0 else "Neutral"
+            counts[label] += 1
+            total_polarity += value
+            yield {"type": "comment", "index": index, "comment": comment, "score": value, "sentiment": label}
+
+    yield dict(summary(total_polarity, len(comments), counts["Positive"], counts["Negative"], counts["Neutral"]),
+               type="summary")
+
+
+BUCKETS = ("positive", "negative", "neutral")
+
+
+# A page of an /analyze-sentiment body: the summary fields plus
+# [offset, offset + limit) of each per-comment list, or of one bucket's list
+def page_result(result, bucket=None, offset=0, limit=None):
+    page = {key: value for key, value in result.items() if not key.endswith("_feedback")}
+    end = offset + limit if limit is not None else None
+    for name in BUCKETS:
+        if bucket is None or bucket == name:
+            page[f"{name}_feedback"] = result[f"{name}_feedback"][offset:end]
+    page["offset"] = offset
+    page["limit"] = limit
+    return page
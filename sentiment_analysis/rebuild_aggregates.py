@@ -0,0 +1,125 @@
+"""Rebuild the stored per-issue sentiment aggregates.
+
+Run after changing the scorer (SCORER_ID in feedback_sentiment.py) or after
+bulk edits to feedback, so requests in SENTIMENT_MODE=incremental do not pay
+for the rescoring. Aggregates that are already current are left alone unless
+--force is given. Reads the same .env as the service, but does not start it.
+
+    python rebuild_aggregates.py
+    python rebuild_aggregates.py --issue abc123 --issue def456
+    python rebuild_aggregates.py --force --batch-size 500 --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+from firebase_admin import credentials, firestore, initialize_app
+
+from feedback_sentiment import SCORER_ID, feedback_comments, polarities
+from sentiment_aggregates import SentimentAggregates, extend, new_aggregate
+
+# Firestore commits at most this many writes per batch
+MAX_BATCH_WRITES = 500
+
+
+def firestore_client():
+    load_dotenv()
+    initialize_app(credentials.Certificate({
+        "type": os.getenv("FIREBASE_TYPE"),
+        "project_id": os.getenv("FIREBASE_PROJECT_ID"),
+        "private_key_id": os.getenv("FIREBASE_PRIVATE_KEY_ID"),
+        "private_key": os.getenv("FIREBASE_PRIVATE_KEY").replace('\\n', '\n'),
+        "client_email": os.getenv("FIREBASE_CLIENT_EMAIL"),
+        "client_id": os.getenv("FIREBASE_CLIENT_ID"),
+        "auth_uri": os.getenv("FIREBASE_AUTH_URI"),
+        "token_uri": os.getenv("FIREBASE_TOKEN_URI"),
+        "auth_provider_x509_cert_url": os.getenv("FIREBASE_AUTH_PROVIDER_X509_CERT_URL"),
+        "client_x509_cert_url": os.getenv("FIREBASE_CLIENT_X509_CERT_URL"),
+        "universe_domain": os.getenv("FIREBASE_UNIVERSE_DOMAIN"),
+    }))
+    return firestore.client()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--issue", action="append", dest="issues",
+                        help="only this issue id (repeatable); default is every issue")
+    parser.add_argument("--batch-size", type=int, default=200,
+                        help=f"issues read, scored and written per batch (at most {MAX_BATCH_WRITES})")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="scoring processes; 1 scores in this process")
+    parser.add_argument("--force", action="store_true",
+                        help="rescore aggregates that are already current")
+    args = parser.parse_args()
+    if not 1 <= args.batch_size <= MAX_BATCH_WRITES:
+        parser.error(f"--batch-size must be between 1 and {MAX_BATCH_WRITES}, Firestore's limit per write batch")
+
+    # Forked before Firebase starts its gRPC threads
+    pool = None
+    if args.workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        pool = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("fork"))
+        pool.submit(int).result()
+
+    db = firestore_client()
+    aggregates = SentimentAggregates(
+        db.collection(os.getenv("SENTIMENT_AGGREGATE_COLLECTION", "issueSentiment")), SCORER_ID
+    )
+
+    start = time.time()
+    issues = rebuilt = scored = 0
+    for batch in issue_batches(db, args.issues, args.batch_size):
+        stored = aggregates.load_many(db, [issue_id for issue_id, _ in batch])
+        stale = [
+            (issue_id, comments) for issue_id, comments in batch
+            if args.force or not aggregates.extends(stored[issue_id], comments)
+        ]
+        issues += len(batch)
+        if not stale:
+            continue
+
+        comment_lists = [comments for _, comments in stale]
+        if pool is not None:
+            scores = pool.map(polarities, comment_lists, chunksize=max(1, len(stale) // (args.workers * 4)))
+        else:
+            scores = map(polarities, comment_lists)
+        changed = {
+            issue_id: extend(new_aggregate(SCORER_ID), comments, issue_scores)
+            for (issue_id, comments), issue_scores in zip(stale, scores)
+        }
+        aggregates.save_many(db, changed)
+        rebuilt += len(changed)
+        scored += sum(len(c) for c in comment_lists)
+        print(f"[INFO] {issues} issues checked, {rebuilt} rebuilt")
+
+    if pool is not None:
+        pool.shutdown()
+    print(f"[INFO] Done: {issues} issues, {rebuilt} aggregates rebuilt, {scored} comments scored "
+          f"with {SCORER_ID} in {time.time() - start:.1f}s")
+
+
+# (issue_id, comments) for the requested issues, batch_size at a time
+def issue_batches(db, issue_ids, batch_size):
+    if issue_ids:
+        refs = [db.collection('issues').document(issue_id) for issue_id in issue_ids]
+        docs = db.get_all(refs, field_paths=["feedback"])
+    else:
+        docs = db.collection('issues').select(["feedback"]).stream()
+
+    batch = []
+    for doc in docs:
+        if not doc.exists:
+            print(f"[SKIP] Issue {doc.id} not found")
+            continue
+        batch.append((doc.id, feedback_comments((doc.to_dict() or {}).get('feedback', []) or [])))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import hashlib
+
+from feedback_sentiment import summary
+
+
+# Running sentiment totals per issue, stored in their own Firestore
+# collection (one document per issue id) so feedback that was already scored
+# is never scored again.
+#
+# Feedback is append-only, so an aggregate covers the first `processed`
+# comments. On each read only comments after that are scored and folded in.
+# The stored hash of the last processed comment catches edits and removals,
+# and `scorer` catches scorer changes; either makes the aggregate start over.
+# Each document has a fixed size however long the feedback grows: it holds
+# the totals behind the summary fields, not per-comment scores.
+#
+#   scorer     SCORER_ID the scores came from
+#   processed  number of comments covered
+#   tail       hash of comment processed - 1
+#   sum, positive, negative, neutral
+class SentimentAggregates:
+    def __init__(self, collection, scorer_id):
+        self.collection = collection
+        self.scorer_id = scorer_id
+
+    # Stored aggregates for many issues in one batched read
+    def load_many(self, db, issue_ids):
+        refs = [self.collection.document(issue_id) for issue_id in issue_ids]
+        found = {}
+        for doc in db.get_all(refs):
+            if doc.exists:
+                found[doc.id] = doc.to_dict()
+        return {issue_id: found.get(issue_id) for issue_id in issue_ids}
+
+    # Split an issue's comments into the aggregate to extend and the comments
+    # it does not cover yet. Returns (base aggregate, new comments).
+    def plan(self, aggregate, comments):
+        if not self.extends(aggregate, comments):
+            return new_aggregate(self.scorer_id), comments
+        return aggregate, comments[aggregate["processed"]:]
+
+    def extends(self, aggregate, comments):
+        if aggregate is None or aggregate.get("scorer") != self.scorer_id:
+            return False
+        processed = aggregate.get("processed", 0)
+        if processed > len(comments):
+            return False
+        return processed == 0 or aggregate.get("tail") == comment_hash(comments[processed - 1])
+
+    # Write the aggregates that changed, in one batch
+    def save_many(self, db, aggregates):
+        if not aggregates:
+            return
+        batch = db.batch()
+        for issue_id, aggregate in aggregates.items():
+            batch.set(self.collection.document(issue_id), aggregate)
+        batch.commit()
+
+
+def new_aggregate(scorer_id):
+    return {
+        "scorer": scorer_id,
+        "processed": 0,
+        "tail": None,
+        "sum": 0.0,
+        "positive": 0,
+        "negative": 0,
+        "neutral": 0,
+    }
+
+
+# Fold newly scored comments into an aggregate; returns a new aggregate
+def extend(aggregate, comments, scores):
+    aggregate = dict(aggregate)
+    for score in scores:
+        if score > 0:
+            aggregate["positive"] += 1
+        elif score < 0:
+            aggregate["negative"] += 1
+        else:
+            aggregate["neutral"] += 1
+        aggregate["sum"] += score
+
+    if comments:
+        aggregate["processed"] += len(comments)
+        aggregate["tail"] = comment_hash(comments[-1])
+    return aggregate
+
+
+# The summary fields of /analyze-sentiment from an aggregate's totals
+def aggregate_summary(aggregate):
+    return summary(aggregate["sum"], aggregate["processed"], aggregate["positive"],
+                   aggregate["negative"], aggregate["neutral"])
+
+
+def comment_hash(comment):
+    return hashlib.sha1(comment.encode("utf-8")).hexdigest()
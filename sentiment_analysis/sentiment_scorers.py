@@ -0,0 +1,202 @@
+import re
+from importlib.metadata import version
+
+from textblob import TextBlob
+from textblob import _text as pattern
+from textblob.en import sentiment as pattern_sentiment
+
+TEXTBLOB_VERSION = version('textblob')
+
+
+# Feedback scorers. Each has a scorer_id, stored with sentiment aggregates
+# so a change of scorer rebuilds them, and polarities(comments), returning
+# one polarity in [-1, 1] per comment. Pick one with SENTIMENT_SCORER.
+class TextBlobScorer:
+    scorer_id = f"textblob-{TEXTBLOB_VERSION}"
+
+    def polarities(self, comments):
+        return [TextBlob(comment).sentiment.polarity for comment in comments]
+
+
+# TextBlob's pattern lexicon, compiled once into a flat word -> (polarity,
+# intensity, is_modifier) dict, with the same negation, intensifier,
+# exclamation and emoticon rules. A batch of comments is lowercased and
+# tokenized by one regex pass instead of TextBlob's per-comment tokenizer
+# and blob objects.
+#
+# The tokenizer reproduces TextBlob's splitting for everything that affects
+# polarity, but not every corner of it (runs of four or more periods,
+# emoticons glued inside words), so rare inputs can score differently;
+# check_scorer.py measures the difference on a corpus.
+class LexiconScorer:
+    scorer_id = f"lexicon-{TEXTBLOB_VERSION}-1"
+
+    SEPARATOR = "\x00"
+
+    def __init__(self):
+        self.lexicon = {
+            word: (float(entry[None][0]), float(entry[None][2]), "RB" in entry)
+            for word, entry in pattern_sentiment.items()
+            if " " not in word
+        }
+        self.negations = frozenset(pattern_sentiment.negations)
+
+        # TextBlob only scores emoticons that are not alphabetic or plain
+        # punctuation ("xD" never counts). Like TextBlob, a face may be
+        # written with single spaces between its characters (": )").
+        faces = set()
+        self.emoticons = {}
+        for (_, polarity), group in pattern.EMOTICONS.items():
+            for face in group:
+                lowered = face.lower()
+                if lowered.isalpha() or len(lowered) > 5 or lowered in pattern.PUNCTUATION:
+                    continue
+                faces.add(face)
+                for spaced in spaced_variants(lowered):
+                    self.emoticons.setdefault(spaced, polarity)
+
+        self.token_pattern = build_token_pattern(faces, self.SEPARATOR)
+
+    def polarities(self, comments):
+        if not comments:
+            return []
+
+        # Same contraction split as TextBlob, so "don't" gives "do", "n", "'", "t".
+        # Tokens never contain a newline, so they are lowercased in one go.
+        text = self.SEPARATOR.join(c.replace(self.SEPARATOR, " ") for c in comments)
+        tokens = self.token_pattern.findall(text.replace("n't", " n't"))
+        tokens = "\n".join(tokens).lower().split("\n")
+
+        lexicon = self.lexicon
+        negations = self.negations
+        emoticons = self.emoticons
+        separator = self.SEPARATOR
+
+        scores = []
+        # Per assessed chunk: polarity, intensity, negated
+        chunk_p, chunk_i, chunk_neg = [], [], []
+        modifier = None  # preceding intensifier ("really good")
+        negation = None  # preceding negation ("not good")
+
+        for w in tokens:
+            if w == separator:
+                scores.append(average(chunk_p, chunk_neg))
+                chunk_p, chunk_i, chunk_neg = [], [], []
+                modifier = negation = None
+                continue
+
+            entry = lexicon.get(w)
+            if entry is not None:
+                p, i, is_modifier = entry
+                if modifier is None:
+                    chunk_p.append(p)
+                    chunk_i.append(i)
+                    chunk_neg.append(False)
+                else:
+                    chunk_p[-1] = max(-1.0, min(p * chunk_i[-1], 1.0))
+                    chunk_i[-1] = i
+                if negation is not None:
+                    chunk_i[-1] = 1.0 / chunk_i[-1]
+                    chunk_neg[-1] = True
+                modifier = w if is_modifier else None
+                negation = w if w in negations else None
+                continue
+
+            # Unknown words keep a negation across short words ("not a good")
+            # and a modifier across very short ones ("really is a good")
+            if w in negations:
+                negation = w
+            elif negation is not None and len(w.strip("'")) > 1:
+                negation = None
+            if negation is not None and modifier is not None and modifier.endswith("ly"):
+                chunk_neg[-1] = True
+                negation = None
+            elif modifier is not None and len(w) > 2:
+                modifier = None
+
+            if w == "!":
+                if chunk_p:
+                    chunk_p[-1] = max(-1.0, min(chunk_p[-1] * 1.25, 1.0))
+            elif w == "(!)":
+                chunk_p.append(0.0)
+                chunk_i.append(1.0)
+                chunk_neg.append(False)
+            else:
+                polarity = emoticons.get(w)
+                if polarity is not None:
+                    chunk_p.append(polarity)
+                    chunk_i.append(1.0)
+                    chunk_neg.append(False)
+
+        scores.append(average(chunk_p, chunk_neg))
+        return scores
+
+
+# "not good" is slightly bad, "not bad" slightly good
+def average(chunk_p, chunk_neg):
+    if not chunk_p:
+        return 0.0
+    total = 0
+    for p, negated in zip(chunk_p, chunk_neg):
+        total += p * -0.5 if negated else p
+    return total / float(len(chunk_p))
+
+
+# Tokens as TextBlob's tokenizer splits them: quotes on their own, leading
+# and trailing punctuation peeled off one mark at a time (a trailing "..."
+# as one token), punctuation inside a word and the period of an
+# abbreviation kept, plus emoticons, the "(!)" sarcasm mark and the comment
+# separator
+def build_token_pattern(faces, separator):
+    quotes = "'\"“”‘’"
+    trailing = re.escape(pattern.PUNCTUATION)
+    leading = re.escape(pattern.PUNCTUATION.replace(".", ""))
+    q = re.escape(quotes)
+    sep = re.escape(separator)
+    end = rf"(?=[{trailing}]*(?:[\s{sep}{q}]|$))"
+
+    # TextBlob splits a face made only of leading punctuation (":-)") into
+    # single marks and joins it again, whatever follows; other faces need
+    # to stand alone, and ":-D." reads as the abbreviation "D."
+    split_faces, standalone_faces = [], []
+    for face in sorted(faces, key=len, reverse=True):
+        spaced = " ?".join(re.escape(c) for c in face)
+        if all(c in pattern.PUNCTUATION.replace(".", "") for c in face):
+            split_faces.append(spaced)
+        else:
+            standalone_faces.append(spaced)
+
+    abbreviations = "|".join(
+        re.escape(a) for a in sorted(pattern.ABBREVIATIONS, key=len, reverse=True)
+    )
+    return re.compile(
+        rf"(?:{'|'.join(split_faces)})"
+        rf"|(?:{'|'.join(standalone_faces)})(?!(?<=[A-Za-z])\.(?!\.\.)){end}"
+        rf"|\( ?! ?\)"
+        rf"|{sep}"
+        rf"|[{q}]"
+        rf"|(?:{abbreviations}|(?:[A-Za-z]\.)+|[A-Z][bcdfghjklmnpqrstvwxz|]+\.){end}"
+        rf"|\.\.\.(?![^\s{sep}{q}]*[^\s{sep}{q}{trailing}])"
+        rf"|[^\s{sep}{q}{leading}](?:[^\s{sep}{q}]*[^\s{sep}{q}{trailing}])?"
+        rf"|[{trailing}]"
+    )
+
+
+# ":)" -> ":)", ": )"
+def spaced_variants(face):
+    variants = [face[0]]
+    for c in face[1:]:
+        variants = [v + c for v in variants] + [v + " " + c for v in variants]
+    return variants
+
+
+SCORERS = {
+    "textblob": TextBlobScorer,
+    "lexicon": LexiconScorer,
+}
+
+
+def get_scorer(name):
+    if name not in SCORERS:
+        raise ValueError(f"Unknown sentiment scorer {name!r}; choose one of {', '.join(SCORERS)}")
+    return SCORERS[name]()
@@ -0,0 +1,16 @@
+import json
+
+# Response headers for an SSE stream: never cached, and not buffered by
+# nginx-style proxies
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+# One Server-Sent Events event; data is JSON so it never spans lines
+def sse(data, event=None, event_id=None):
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
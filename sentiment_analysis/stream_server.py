@@ -0,0 +1,191 @@
+"""Asyncio server for the sentiment service's chat streams.
+
+Serves POST /stream as Server-Sent Events from an asyncio event loop, so an
+open stream costs a coroutine instead of a thread while it waits on Gemini,
+and mounts the Flask app (app.py) for every other route.
+
+    uvicorn stream_server:app --host 0.0.0.0 --port 8080
+    python stream_server.py
+
+Events, each `data:` line a JSON object:
+
+    event: session   {"session_id": "..."}    when the request uses a session
+    id: <n>          {"text": "..."}          one per model chunk
+    event: done      {"cached": false}
+    event: error     {"error": "..."}
+
+A `: keep-alive` comment goes out every SSE_HEARTBEAT_SECONDS without a
+chunk, so proxies keep the connection open while the model thinks. When
+the client disconnects, the upstream generation is cancelled. At most
+SSE_BUFFER_CHUNKS chunks are buffered per stream; past that, reading from
+the model pauses until the client catches up. Beyond SSE_MAX_STREAMS open
+streams, new ones get a 503.
+"""
+import asyncio
+import os
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.wsgi import WSGIMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+
+import app as service
+from chat_cache import replay_chunks
+from sse_events import SSE_HEADERS, sse
+
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_BUFFER_CHUNKS = int(os.getenv("SSE_BUFFER_CHUNKS", "32"))
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "10000"))
+
+metrics = service.metrics
+open_streams = 0
+metrics.gauge_callback("chat_streams_open", lambda: open_streams,
+                       help="SSE chat streams currently open on the asyncio server")
+
+app = FastAPI()
+
+
+HEARTBEAT = b": keep-alive\n\n"
+END = object()
+
+
+# Read the model's stream into `queue`, waiting while it is full. Ends with
+# END, or the exception that stopped it.
+async def relay(msg, chat_history, queue):
+    start = time.perf_counter()
+    try:
+        chat_session = service.model.start_chat(history=chat_history)
+        with metrics.external("gemini", "send_message_async"):
+            response = await chat_session.send_message_async(msg, stream=True)
+            first = True
+            async for chunk in response:
+                if first:
+                    metrics.observe("gemini_first_chunk_seconds", time.perf_counter() - start,
+                                    help="Time until Gemini streams its first chunk")
+                    first = False
+                await queue.put(chunk.text)
+        await queue.put(END)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        await queue.put(e)
+
+
+# Wake an idle stream to send a keep-alive comment
+def heartbeat(queue):
+    if queue.empty():
+        queue.put_nowait(HEARTBEAT)
+
+
+async def cached(msg, chat_history):
+    if service.chat_cache is not None and service.chat_cache.embed is not None:
+        # Matching by meaning runs the question encoder; keep it off the loop
+        return await asyncio.to_thread(service.cached_answer, msg, chat_history)
+    return service.cached_answer(msg, chat_history)
+
+
+# Cache the answer and add it to the chat session (which may summarize with
+# a blocking model call) on a worker thread
+async def finish_turn(msg, session_id, chat_history, answer):
+    def finish():
+        service.store_answer(msg, chat_history, answer)
+        service.remember_turn(session_id, msg, answer)
+    await asyncio.to_thread(finish)
+
+
+# Holds one of the SSE_MAX_STREAMS slots, claimed by stream(), until it ends
+async def events(msg, session_id, chat_history):
+    global open_streams
+    producer = None
+    outcome = "completed"
+    try:
+        if session_id is not None:
+            yield sse({"session_id": session_id}, "session")
+
+        # A cached answer is replayed in chunks, like a streamed one
+        answer = await cached(msg, chat_history)
+        if answer is not None:
+            for event_id, text in enumerate(replay_chunks(answer)):
+                yield sse({"text": text}, event_id=event_id)
+            if session_id is not None:
+                await asyncio.to_thread(service.remember_turn, session_id, msg, answer)
+            yield sse({"cached": True}, "done")
+            return
+
+        queue = asyncio.Queue(SSE_BUFFER_CHUNKS)
+        producer = asyncio.create_task(relay(msg, chat_history, queue))
+        loop = asyncio.get_running_loop()
+        parts = []
+        while True:
+            # A timer rather than wait_for(), which costs a task per chunk
+            timer = loop.call_later(SSE_HEARTBEAT_SECONDS, heartbeat, queue)
+            try:
+                item = await queue.get()
+            finally:
+                timer.cancel()
+            if item is HEARTBEAT:
+                yield HEARTBEAT
+                continue
+            if item is END:
+                break
+            if isinstance(item, Exception):
+                outcome = "error"
+                print(f"[ERROR] Chat stream failed: {item}")
+                yield sse({"error": str(item)}, "error")
+                return
+            parts.append(item)
+            yield sse({"text": item}, event_id=len(parts) - 1)
+
+        # Only complete answers are cached and remembered
+        await finish_turn(msg, session_id, chat_history, "".join(parts))
+        yield sse({"cached": False}, "done")
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client went away; stop generating for it
+        outcome = "cancelled"
+        raise
+    finally:
+        if producer is not None and not producer.done():
+            producer.cancel()
+        open_streams -= 1
+        metrics.inc("chat_streams_total", {"outcome": outcome},
+                    help="SSE chat streams by outcome: completed, cancelled by a disconnect, or error")
+
+
+@app.post("/stream")
+async def stream(request: Request):
+    global open_streams
+    if open_streams >= SSE_MAX_STREAMS:
+        metrics.inc("chat_streams_rejected_total", help="SSE chat streams refused at SSE_MAX_STREAMS")
+        return JSONResponse({"error": "Too many open streams"}, status_code=503, headers={"Retry-After": "1"})
+
+    # Claim the slot before the first await, so requests arriving together
+    # cannot all pass the check; events() gives it back when the stream ends
+    open_streams += 1
+    streaming = False
+    try:
+        data = await request.json()
+        msg = data.get('chat', '')
+        session_id, chat_history = service.chat_context(data)
+        if chat_history is None:
+            return JSONResponse({"error": f"Unknown or expired chat session: {session_id}"}, status_code=404)
+
+        headers = dict(SSE_HEADERS)
+        if session_id is not None:
+            headers["X-Chat-Session"] = session_id
+        response = StreamingResponse(events(msg, session_id, chat_history),
+                                     media_type="text/event-stream", headers=headers)
+        streaming = True
+        return response
+    finally:
+        if not streaming:
+            open_streams -= 1
+
+
+# Everything else is served by the Flask app, on a thread pool
+app.mount("/", WSGIMiddleware(service.app))
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8080")))
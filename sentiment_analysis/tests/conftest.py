@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+# Service modules import each other by name and shared code from ../common.
+# The app itself runs on the benchmark stand-ins for Firestore and Gemini.
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT = os.path.dirname(SERVICE_DIR)
+sys.path.insert(0, SERVICE_DIR)
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "benchmarks"))
+
+
+# The service module (app.py), imported once on fake backends with the fake
+# chat model and extractive session summaries
+@pytest.fixture(scope="session")
+def service(tmp_path_factory):
+    import fakes
+
+    fakes.install({"issues": {}})
+    os.environ.update(
+        FIREBASE_PRIVATE_KEY="test",
+        CHAT_BACKEND="fake",
+        CHAT_SESSION_DIR=str(tmp_path_factory.mktemp("chat_sessions")),
+        CHAT_SESSION_SUMMARIZER="extractive",
+        SENTIMENT_WORKERS="1",
+    )
+    import app
+    return app
+
+
+@pytest.fixture
+def client(service):
+    return service.app.test_client()
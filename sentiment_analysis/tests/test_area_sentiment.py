@@ -0,0 +1,152 @@
+import random
+
+import fakes
+from area_sentiment import DIMENSIONS, GROUPINGS, AreaSentiment
+
+# Scores that add up exactly in any order, so incremental and fresh tables
+# compare equal
+SCORES = {"great": 0.75, "good": 0.5, "okay": 0.0, "bad": -0.25, "awful": -0.5}
+CATEGORIES = ["Roads", "Water Supply", "Street Lighting"]
+PINCODES = ["560001", "560002", "560034"]
+DATES = ["2025-01-07", "2025-01-20", "2025-02-03", "2025-03-15", None]
+
+
+class Scorer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, comment_lists):
+        self.calls.append(comment_lists)
+        return [[SCORES[c] for c in comments] for comments in comment_lists]
+
+
+def issue(category="Roads", pincode="560001", date="2025-01-07", feedback=()):
+    return {
+        "issueTitle": "Pothole",
+        "category": category,
+        "address": f"12 Main Road, Bengaluru {pincode}",
+        "dateOfComplaint": date,
+        "feedback": [{"feedback": text} for text in feedback],
+    }
+
+
+def area(tmp_path, scorer=None, scorer_id="test-scorer", window="month"):
+    return AreaSentiment(str(tmp_path / "area.json"), scorer_id, scorer or Scorer(), window)
+
+
+def table(area_sentiment, group_by):
+    rows = area_sentiment.rows(group_by, limit=None)
+    return sorted(rows, key=lambda row: tuple(str(row[d]) for d in DIMENSIONS if d in row))
+
+
+def test_changes_subtract_the_old_contribution_and_add_the_new(tmp_path):
+    scorer = Scorer()
+    areas = area(tmp_path, scorer)
+    areas.apply_changes([
+        ("ADDED", "a", issue(feedback=["good", "bad"])),
+        ("ADDED", "b", issue(feedback=["awful"])),
+    ])
+    [row] = areas.rows(["pincode"])
+    assert (row["issues"], row["comments"], row["overall_score"]) == (2, 3, -0.25 / 3)
+
+    areas.apply_changes([("MODIFIED", "a", issue(feedback=["good", "great"]))])
+    [row] = areas.rows(["pincode"])
+    assert (row["issues"], row["comments"], row["positive_count"]) == (2, 3, 2)
+    assert scorer.calls[-1] == [["good", "great"]]
+
+    areas.apply_changes([("REMOVED", "b", None), ("REMOVED", "missing", None)])
+    [row] = areas.rows(["pincode"])
+    assert (row["issues"], row["comments"], row["overall_score"]) == (1, 2, 0.625)
+
+    areas.apply_changes([("REMOVED", "a", None)])
+    assert areas.rows() == [] and len(areas) == 0
+
+
+def test_moving_an_issue_does_not_rescore_it(tmp_path):
+    scorer = Scorer()
+    areas = area(tmp_path, scorer)
+    areas.apply_changes([("ADDED", "a", issue(feedback=["good"]))])
+
+    result = areas.apply_changes([("MODIFIED", "a", issue(category="Water Supply", date="2025-02-01",
+                                                          feedback=["good"]))])
+    assert result == {"rescored": 0, "changed": 1}
+    assert len(scorer.calls) == 1
+    assert [row["category"] for row in areas.rows(["category"])] == ["Water Supply"]
+    assert [row["window"] for row in areas.rows(["window"])] == ["2025-02"]
+
+    # Unchanged re-delivery changes nothing
+    assert areas.apply_changes([("MODIFIED", "a", issue(category="Water Supply", date="2025-02-01",
+                                                        feedback=["good"]))]) == {"rescored": 0, "changed": 0}
+
+
+def test_first_snapshot_after_a_restart_drops_deleted_issues(tmp_path):
+    areas = area(tmp_path)
+    areas.apply_changes([("ADDED", "a", issue(feedback=["good"])), ("ADDED", "b", issue(feedback=["bad"]))])
+    areas.save()
+
+    # "b" was deleted while the service was down
+    client = fakes.FakeFirestoreClient({"issues": {"a": issue(feedback=["good"])}})
+    scorer = Scorer()
+    restarted = area(tmp_path, scorer)
+    restarted.start(client.collection("issues"), save_interval=3600)
+
+    assert len(restarted) == 1 and scorer.calls == []
+    assert table(restarted, ["pincode"]) == table(fresh({"a": issue(feedback=["good"])}, tmp_path), ["pincode"])
+
+    # Later snapshots are plain changes
+    client.collection("issues").document("c").set(issue(feedback=["great"]))
+    assert len(restarted) == 2
+    restarted.stop()
+
+
+def test_saved_contributions_from_another_scorer_or_window_are_ignored(tmp_path):
+    areas = area(tmp_path)
+    areas.apply_changes([("ADDED", "a", issue(feedback=["good"]))])
+    areas.save()
+
+    assert area(tmp_path).load()
+    assert not area(tmp_path, scorer_id="other-scorer").load()
+    assert not area(tmp_path, window="week").load()
+    assert not area(tmp_path / "missing").load()
+
+
+def fresh(docs, tmp_path, window="month"):
+    areas = area(tmp_path / "fresh", window=window)
+    areas.apply_changes([("ADDED", doc_id, data) for doc_id, data in docs.items()])
+    return areas
+
+
+def random_issue(rng, feedback=None):
+    if feedback is None:
+        feedback = [rng.choice(list(SCORES)) for _ in range(rng.randint(0, 4))]
+    return issue(rng.choice(CATEGORIES), rng.choice(PINCODES), rng.choice(DATES), feedback)
+
+
+def test_random_changes_match_a_fresh_build(tmp_path):
+    rng = random.Random(7)
+    for window in ("day", "week", "month"):
+        areas = area(tmp_path, window=window)
+        docs = {}
+        for _ in range(60):
+            # Batches may touch the same issue more than once
+            batch = []
+            for _ in range(rng.randint(1, 6)):
+                doc_id = f"issue-{rng.randrange(15)}"
+                roll = rng.random()
+                if doc_id in docs and roll < 0.3:
+                    del docs[doc_id]
+                    batch.append(("REMOVED", doc_id, None))
+                    continue
+                if doc_id in docs and roll < 0.6:
+                    # Same feedback, possibly another pincode, category or window
+                    old = [item["feedback"] for item in docs[doc_id]["feedback"]]
+                    data = random_issue(rng, old)
+                else:
+                    data = random_issue(rng)
+                batch.append(("MODIFIED" if doc_id in docs else "ADDED", doc_id, data))
+                docs[doc_id] = data
+            areas.apply_changes(batch)
+
+            expected = fresh(docs, tmp_path, window)
+            for dims in GROUPINGS:
+                assert table(areas, dims) == table(expected, dims)
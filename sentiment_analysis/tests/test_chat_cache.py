@@ -0,0 +1,85 @@
+import torch
+
+from chat_cache import ChatCache, cache_key, normalize_question, replay_chunks
+
+HISTORY = [
+    {"role": "user", "parts": ["hi"]},
+    {"role": "model", "parts": ["Hello! How can I help?"]},
+]
+
+
+# Unit vectors at a chosen cosine similarity to "how do i report an issue"
+def fake_embed(similarity):
+    def embed(text):
+        if text == "how do i report an issue":
+            return torch.tensor([1.0, 0.0])
+        sine = (1 - similarity ** 2) ** 0.5
+        return torch.tensor([similarity, sine])
+    return embed
+
+
+def test_questions_differing_in_case_and_punctuation_share_an_entry():
+    assert normalize_question("  How do I REPORT an issue?! ") == "how do i report an issue"
+
+    cache = ChatCache(10, None)
+    cache.put("How do I report an issue?", [], "Open the Report page.")
+    assert cache.get("how do i report an issue") == ("Open the Report page.", "hit")
+    assert cache.get("How do I view an issue?") == (None, "miss")
+
+
+def test_history_is_part_of_the_key():
+    cache = ChatCache(10, None, max_history=2)
+    assert cache_key("Hi", HISTORY) != cache_key("Hi", [])
+
+    cache.put("What next?", HISTORY, "Tell me about the issue.")
+    assert cache.get("what next", HISTORY) == ("Tell me about the issue.", "hit")
+    assert cache.get("what next", []) == (None, "miss")
+    assert cache.get("what next", HISTORY[:1]) == (None, "miss")
+
+    # Longer conversations are neither cached nor looked up
+    long_history = HISTORY * 2
+    cache.put("What next?", long_history, "Anything")
+    assert cache.get("What next?", long_history) == (None, "skipped")
+    assert len(cache) == 1
+
+
+def test_similar_question_matches_at_or_above_the_threshold():
+    close = ChatCache(10, None, embed=fake_embed(0.95), threshold=0.92)
+    close.put("How do I report an issue?", [], "Open the Report page.")
+    assert close.get("Where can I file a complaint?") == ("Open the Report page.", "similar")
+    # Only history-free questions match by meaning
+    assert close.get("Where can I file a complaint?", HISTORY) == (None, "miss")
+
+    far = ChatCache(10, None, embed=fake_embed(0.80), threshold=0.92)
+    far.put("How do I report an issue?", [], "Open the Report page.")
+    assert far.get("Where can I file a complaint?") == (None, "miss")
+
+
+def test_evicted_answers_do_not_match_by_meaning():
+    cache = ChatCache(1, None, embed=fake_embed(0.99), threshold=0.92)
+    cache.put("How do I report an issue?", [], "Open the Report page.")
+    cache.put("Is the app free?", [], "Yes.")
+    assert cache.get("Where can I file a complaint?")[0] != "Open the Report page."
+
+
+def test_replay_chunks_split_after_spaces():
+    text = "To report an issue, open the Report page, add a title and a description, then submit it."
+    chunks = list(replay_chunks(text, size=20))
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+    assert all(chunk.endswith(" ") and len(chunk) > 20 for chunk in chunks[:-1])
+    assert list(replay_chunks("")) == []
+
+
+def test_repeated_chat_questions_skip_the_model(service, client):
+    calls = service.model.calls
+    first = client.post("/chat", json={"chat": "How do I change my password?", "history": []}).json
+    again = client.post("/chat", json={"chat": "how do i change my password", "history": []}).json
+    assert first["text"] == again["text"]
+    assert service.model.calls == calls + 1
+
+    # A stream of the same question replays the cached answer
+    response = client.post("/stream", json={"chat": "How do I change my password", "history": []})
+    body = response.get_data(as_text=True)
+    assert '"cached": true' in body
+    assert service.model.calls == calls + 1
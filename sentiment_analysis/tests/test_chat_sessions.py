@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+import time
+
+from common.chat_sessions import ChatSessions, clip_summary, condense, estimate_tokens
+
+
+def words(n, word="pothole"):
+    return " ".join([word] * n)
+
+
+# Wait for background compactions to finish
+def settle(sessions, timeout=5):
+    deadline = time.monotonic() + timeout
+    while sessions.stats()["compacting"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sessions.stats()["compacting"] == 0
+
+
+def messages(session):
+    return [part for turn in session["turns"] for part in turn["parts"]]
+
+
+def test_least_recently_used_sessions_are_evicted():
+    sessions = ChatSessions(max_sessions=2)
+    first, second = sessions.create(), sessions.create()
+    sessions.get(first)
+    third = sessions.create()
+
+    assert sessions.get(second) is None
+    assert sessions.get(first) is not None and sessions.get(third) is not None
+    assert sessions.get("not-a-session-id") is None
+
+
+def test_sessions_survive_eviction_and_restarts_on_disk(tmp_path):
+    sessions = ChatSessions(max_sessions=1, directory=str(tmp_path))
+    session_id = sessions.create()
+    sessions.append(session_id, "The drain on 4th main is blocked", "Thanks, noted.")
+    sessions.create()  # evicts the first from memory
+
+    assert messages(sessions.get(session_id)) == ["The drain on 4th main is blocked", "Thanks, noted."]
+    restarted = ChatSessions(directory=str(tmp_path))
+    assert restarted.history(session_id) == sessions.history(session_id)
+
+    # Expired sessions are not loaded back
+    path = os.path.join(str(tmp_path), f"{session_id}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        saved = json.load(f)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(saved, updated=time.time() - 120), f)
+    assert ChatSessions(directory=str(tmp_path), ttl_seconds=60).get(session_id) is None
+
+
+def test_old_turns_are_condensed_in_the_background(tmp_path):
+    sessions = ChatSessions(token_budget=120, keep_turns=1, summary_tokens=40, directory=str(tmp_path))
+    session_id = sessions.create()
+    for i in range(6):
+        sessions.append(session_id, f"Question {i}: {words(20)}", f"Answer {i}: {words(20, 'fixed')}")
+        settle(sessions)
+
+    session = sessions.get(session_id)
+    assert sessions.compactions > 0
+    assert messages(session)[-2:] == [f"Question 5: {words(20)}", f"Answer 5: {words(20, 'fixed')}"]
+    assert session["summary"].startswith("Assistant: ") or session["summary"].startswith("User: ")
+    assert estimate_tokens(session["summary"]) <= 40
+
+    # The summary opens the history sent to the model
+    history = sessions.history(session_id)
+    assert history[0]["parts"][0].endswith(session["summary"])
+    assert ChatSessions(directory=str(tmp_path)).get(session_id)["summary"] == session["summary"]
+
+
+def test_condense_and_clip_summary():
+    turns = [{"role": "user", "parts": [words(50)]}, {"role": "model", "parts": ["Noted."]}]
+    summary = condense("Earlier: a broken streetlight.", turns, max_tokens=1000)
+    assert summary.splitlines() == [
+        "Earlier: a broken streetlight.",
+        f"User: {words(40)} ...",
+        "Assistant: Noted.",
+    ]
+
+    # Clipping keeps the end and starts at a line boundary
+    clipped = clip_summary(summary, max_tokens=60)
+    assert summary.endswith(clipped) and len(clipped) <= 240
+    assert clipped.startswith("Assistant:") or clipped.startswith("User:")
+
+
+def test_turns_appended_during_compaction_are_kept():
+    started = threading.Event()
+    release = threading.Event()
+
+    # Counts the messages folded so far
+    def slow_summarize(summary, folded, max_tokens):
+        started.set()
+        release.wait(5)
+        previous = int(summary.split()[0]) if summary else 0
+        return f"{previous + len(folded)} messages folded"
+
+    sessions = ChatSessions(token_budget=60, keep_turns=1, summarize=slow_summarize)
+    session_id = sessions.create()
+    sessions.append(session_id, f"First {words(30)}", "Noted.")
+    sessions.append(session_id, f"Second {words(30)}", "Noted.")
+    assert started.wait(5)
+
+    # The request path does not wait for the summarizer
+    start = time.monotonic()
+    sessions.append(session_id, "Third", "Noted again.")
+    assert time.monotonic() - start < 1
+    release.set()
+    settle(sessions)
+
+    session = sessions.get(session_id)
+    assert "Third" in messages(session)
+    folded = int(session["summary"].split()[0])
+    assert folded + len(session["turns"]) == 6
+
+
+def test_delete_ends_a_session(service, client):
+    started = client.post("/chat", json={"chat": "Hello", "session": True}).json
+    session_id = started["session_id"]
+    path = os.path.join(service.chat_sessions.directory, f"{session_id}.json")
+    assert os.path.exists(path)
+
+    assert client.delete(f"/chat/session/{session_id}").status_code == 204
+    assert not os.path.exists(path)
+    assert client.post("/chat", json={"chat": "Hello again", "session_id": session_id}).status_code == 404
+
+
+def test_sessions_are_only_created_on_request(service, client):
+    count = len(service.chat_sessions)
+    assert "session_id" not in client.post("/chat", json={"chat": "Hi there"}).json
+    assert "session_id" not in client.post("/chat", json={"chat": "Hi there", "history": []}).json
+    assert len(service.chat_sessions) == count
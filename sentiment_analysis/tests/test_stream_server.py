@@ -0,0 +1,74 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+
+@pytest.fixture
+def server(service):
+    import stream_server
+    return stream_server
+
+
+# (event name, data) pairs and keep-alive comments of an SSE body
+def parse(body):
+    found = []
+    for block in body.split("\n\n"):
+        if block == ": keep-alive":
+            found.append(("keep-alive", None))
+        elif block:
+            lines = dict(line.split(": ", 1) for line in block.splitlines())
+            found.append((lines.get("event", "message"), json.loads(lines["data"])))
+    return found
+
+
+def post_streams(server, payloads):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(client.post("/stream", json=p) for p in payloads))
+    return asyncio.run(run())
+
+
+def test_model_chunks_are_relayed_as_events(service, server):
+    calls = service.model.calls
+    [response] = post_streams(server, [{"chat": "What does stream test one mean?", "history": []}])
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = parse(response.text)
+    assert events[-1] == ("done", {"cached": False})
+    texts = [data["text"] for name, data in events[:-1] if name == "message"]
+    assert len(texts) > 1
+    assert "".join(texts) == service.model.answer("stream test one")
+    assert service.model.calls == calls + 1
+    assert server.open_streams == 0
+
+
+def test_idle_streams_get_keep_alive_comments(service, server, monkeypatch):
+    monkeypatch.setattr(server, "SSE_HEARTBEAT_SECONDS", 0.02)
+    monkeypatch.setattr(service.model, "latency_ms", 150)
+    [response] = post_streams(server, [{"chat": "What does stream test two mean?", "history": []}])
+
+    events = parse(response.text)
+    assert events[0] == ("keep-alive", None)
+    assert events[-1] == ("done", {"cached": False})
+    assert server.open_streams == 0
+
+
+def test_streams_beyond_the_limit_are_refused(service, server, monkeypatch):
+    monkeypatch.setattr(server, "SSE_MAX_STREAMS", 2)
+    monkeypatch.setattr(service.model, "latency_ms", 100)
+    responses = post_streams(server, [{"chat": f"What does stream test {n} mean?", "history": []}
+                                      for n in range(3, 6)])
+
+    assert sorted(r.status_code for r in responses) == [200, 200, 503]
+    refused = next(r for r in responses if r.status_code == 503)
+    assert refused.headers["Retry-After"] == "1"
+    assert server.open_streams == 0
+
+    # Requests that fail before streaming give their slot back
+    [missing] = post_streams(server, [{"chat": "Hi", "session_id": "not-a-session"}])
+    assert missing.status_code == 404
+    assert server.open_streams == 0
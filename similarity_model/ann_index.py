@@ -0,0 +1,301 @@
+import math
+import random
+import threading
+import torch
+from issue_index import bucket_key, record_id
+
+
+# Inverted-file (IVF) approximate nearest-neighbour index over an IssueIndex,
+# one coarse quantizer per category. Each issue is assigned to its nearest
+# centroid; a search probes the nprobe closest lists, filters candidates by
+# pincode and returns their ids for exact re-ranking. Categories smaller than
+# min_train_size stay as a single flat list.
+#
+# The index subscribes to IssueIndex changes, so adds, edits and removals are
+# applied incrementally. A category is retrained in the background once it
+# has grown to retrain_factor times the size it was trained on. Training
+# (k-means) never runs under the IssueIndex lock: changes that arrive while
+# it runs are replayed onto the new lists before they are swapped in.
+#
+# A full IssueIndex reload ("build") does not retrain; the caller either
+# calls rebuild() or loads trained lists with load_state(), as workers do
+# from the state the publisher ships with each index snapshot.
+class IVFIndex:
+    def __init__(self, issue_index, nprobe=8, min_train_size=256, kmeans_iters=10,
+                 retrain_factor=4, train=True):
+        self.issue_index = issue_index
+        self.nprobe = max(1, int(nprobe))
+        self.min_train_size = min_train_size
+        self.kmeans_iters = kmeans_iters
+        self.retrain_factor = retrain_factor
+
+        self._lock = threading.Lock()
+        self._categories = {}  # category -> _InvertedLists
+        self._placement = {}   # issueId -> (category, pincode)
+        self._rebuild_lock = threading.Lock()
+        self._replay = None    # changes seen while a rebuild is training
+        self._retraining = set()
+
+        issue_index.subscribe(self._on_change)
+        if train:
+            self.rebuild()
+
+    # Retrain the given categories (all of them by default) from the current
+    # IssueIndex contents
+    def rebuild(self, categories=None):
+        with self._rebuild_lock:
+            with self._lock:
+                self._replay = []
+                if categories is not None:
+                    ids = [i for c in categories if c in self._categories
+                           for i in self._categories[c].assignment]
+
+            try:
+                if categories is None:
+                    records, embeddings = self.issue_index.snapshot()
+                else:
+                    records, embeddings = self.issue_index.subset(ids)
+
+                grouped = {}
+                for row, record in enumerate(records):
+                    category, pincode = bucket_key(record)
+                    grouped.setdefault(category, ([], [], []))
+                    group_ids, pincodes, rows = grouped[category]
+                    group_ids.append(record_id(record))
+                    pincodes.append(pincode)
+                    rows.append(row)
+
+                trained = {}
+                placement = {}
+                for category, (group_ids, pincodes, rows) in grouped.items():
+                    trained[category] = self._train(group_ids, embeddings[rows])
+                    for issue_id, pincode in zip(group_ids, pincodes):
+                        placement[issue_id] = (category, pincode)
+
+                # Same lock order as change notifications: IssueIndex, then ours
+                with self.issue_index.lock, self._lock:
+                    if categories is None:
+                        self._categories = trained
+                        self._placement = placement
+                    else:
+                        for category in categories:
+                            old = self._categories.pop(category, None)
+                            for issue_id in (old.assignment if old is not None else ()):
+                                self._placement.pop(issue_id, None)
+                        self._categories.update(trained)
+                        self._placement.update(placement)
+                    # Re-applying a change the snapshot already had is harmless
+                    for change in self._replay:
+                        self._apply(*change)
+            finally:
+                with self._lock:
+                    self._replay = None
+                    self._retraining.difference_update(categories or ())
+
+    # Candidate issue ids in `category` near `query`. allowed(pincode) filters
+    # candidates; more lists are probed until at least k candidates are found,
+    # up to max_probes lists (2 * nprobe by default). None when that budget
+    # runs out first: a filter this sparse is cheaper to answer with an exact
+    # search over the allowed pincode buckets than by walking every list.
+    def search(self, category, query, allowed=None, k=5, max_probes=None):
+        query = query.reshape(-1).float()
+        max_probes = max(self.nprobe, max_probes or 2 * self.nprobe)
+        with self._lock:
+            lists = self._categories.get(category)
+            if lists is None:
+                return []
+
+            candidates = []
+            order = lists.probe_order(query)
+            for probed, list_no in enumerate(order, start=1):
+                for issue_id in lists.members[list_no]:
+                    if allowed is None or allowed(self._placement[issue_id][1]):
+                        candidates.append(issue_id)
+                if probed >= self.nprobe and len(candidates) >= k:
+                    break
+                if probed >= max_probes and probed < len(order):
+                    return None
+            return candidates
+
+    # Fraction of brute-force top-k neighbours (whole category) that the ANN
+    # path also finds, over a sample of indexed issues used as queries.
+    # Compared by score so ties between duplicate issues are not misses.
+    # Run by check_ann.py, not by the service.
+    def measure_recall(self, sample_size=200, k=5, seed=0):
+        records, embeddings = self.issue_index.snapshot()
+        if not records:
+            return None
+
+        by_category = {}
+        for row, record in enumerate(records):
+            by_category.setdefault(bucket_key(record)[0], []).append(row)
+        sample = random.Random(seed).sample(range(len(records)), min(sample_size, len(records)))
+        sampled = {}
+        for row in sample:
+            sampled.setdefault(bucket_key(records[row])[0], []).append(row)
+
+        found = 0
+        expected = 0
+        for category, rows in sampled.items():
+            members = by_category[category]
+            top_k = min(k, len(members))
+            # Score of the k-th exact neighbour for every sampled query at once
+            thresholds = torch.topk(embeddings[rows] @ embeddings[members].T, k=top_k, dim=1).values[:, -1]
+
+            for row, threshold in zip(rows, thresholds.tolist()):
+                candidates = self.search(category, embeddings[row], k=k)
+                if candidates is None:
+                    # Over the probe budget; the service answers these exactly
+                    found += top_k
+                    expected += top_k
+                    continue
+                _, candidate_embeddings = self.issue_index.subset(candidates)
+                if candidate_embeddings is not None:
+                    scores = candidate_embeddings @ embeddings[row]
+                    approx = torch.topk(scores, k=min(k, len(scores))).values
+                    found += int((approx >= threshold - 1e-6).sum())
+                expected += top_k
+
+        return round(min(found, expected) / expected, 4) if expected else None
+
+    # Trained lists and placements, as shipped in an index snapshot. Read it
+    # under the IssueIndex lock to match an IssueIndex.export_state().
+    def export_state(self):
+        with self._lock:
+            return {
+                "categories": {
+                    category: (lists.centroids, lists.trained_size, dict(lists.assignment))
+                    for category, lists in self._categories.items()
+                },
+                "placement": dict(self._placement),
+            }
+
+    # Replace the lists with exported ones, without training
+    def load_state(self, state):
+        categories = {}
+        for category, (centroids, trained_size, assignment) in state["categories"].items():
+            lists = _InvertedLists(centroids, trained_size)
+            for issue_id, list_no in assignment.items():
+                lists.members[list_no].add(issue_id)
+            lists.assignment = dict(assignment)
+            categories[category] = lists
+
+        with self._lock:
+            self._categories = categories
+            self._placement = dict(state["placement"])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "nprobe": self.nprobe,
+                "issues": len(self._placement),
+                "categories": {
+                    category: {"lists": len(lists.members), "issues": len(lists.assignment)}
+                    for category, lists in self._categories.items()
+                },
+            }
+
+    def _train(self, ids, embeddings):
+        centroids = None
+        if len(ids) >= self.min_train_size:
+            n_lists = max(1, int(math.sqrt(len(ids))))
+            centroids = _spherical_kmeans(embeddings.float(), n_lists, self.kmeans_iters)
+
+        lists = _InvertedLists(centroids, trained_size=len(ids))
+        for issue_id, embedding in zip(ids, embeddings):
+            lists.add(issue_id, embedding)
+        return lists
+
+    # Called under the IssueIndex lock
+    def _on_change(self, event, issue_id, record, embedding):
+        if event == "build":
+            # Replaced wholesale by rebuild() or load_state()
+            return
+
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((event, issue_id, record, embedding))
+            self._apply(event, issue_id, record, embedding)
+
+    def _apply(self, event, issue_id, record, embedding):
+        previous = self._placement.get(issue_id)
+
+        if event == "remove":
+            if previous is not None:
+                self._categories[previous[0]].discard(issue_id)
+                del self._placement[issue_id]
+            return
+
+        category, pincode = bucket_key(record)
+        if embedding is None and previous is not None and previous[0] == category:
+            # Metadata-only change; the list assignment stays valid
+            self._placement[issue_id] = (category, pincode)
+            return
+
+        if embedding is None:
+            _, stored = self.issue_index.subset([issue_id])
+            if stored is None:
+                # Removed since; a replayed "remove" follows
+                return
+            embedding = stored[0]
+        if previous is not None:
+            self._categories[previous[0]].discard(issue_id)
+
+        lists = self._categories.get(category)
+        if lists is None:
+            lists = self._categories[category] = _InvertedLists(None, trained_size=0)
+        lists.add(issue_id, embedding.reshape(-1).float())
+        self._placement[issue_id] = (category, pincode)
+
+        if (category not in self._retraining
+                and len(lists.assignment) >= max(self.min_train_size, self.retrain_factor * lists.trained_size)):
+            self._retraining.add(category)
+            threading.Thread(target=self._retrain, args=(category,), name="ivf-retrain", daemon=True).start()
+
+    def _retrain(self, category):
+        try:
+            self.rebuild([category])
+        except Exception as e:
+            print(f"[ERROR] Failed to retrain ANN lists for {category}: {e}")
+
+
+class _InvertedLists:
+    def __init__(self, centroids, trained_size):
+        self.centroids = centroids
+        self.trained_size = trained_size
+        self.members = [set() for _ in range(len(centroids))] if centroids is not None else [set()]
+        self.assignment = {}  # issueId -> list number
+
+    def probe_order(self, query):
+        if self.centroids is None:
+            return [0]
+        return torch.argsort(self.centroids @ query, descending=True).tolist()
+
+    def add(self, issue_id, embedding):
+        self.discard(issue_id)
+        list_no = 0 if self.centroids is None else int(torch.argmax(self.centroids @ embedding.float()))
+        self.members[list_no].add(issue_id)
+        self.assignment[issue_id] = list_no
+
+    def discard(self, issue_id):
+        list_no = self.assignment.pop(issue_id, None)
+        if list_no is not None:
+            self.members[list_no].discard(issue_id)
+
+
+# k-means on the unit sphere (SBERT embeddings are normalized, so the inner
+# product is the cosine similarity)
+def _spherical_kmeans(x, k, iters, seed=0):
+    x = torch.nn.functional.normalize(x, dim=1)
+    generator = torch.Generator().manual_seed(seed)
+    centroids = x[torch.randperm(len(x), generator=generator)[:k]].clone()
+
+    for _ in range(iters):
+        assignment = torch.argmax(x @ centroids.T, dim=1)
+        sums = torch.zeros_like(centroids).index_add_(0, assignment, x)
+        counts = torch.bincount(assignment, minlength=k)
+        updated = torch.nn.functional.normalize(sums, dim=1)
+        # Keep the previous centroid for empty clusters
+        centroids = torch.where((counts > 0).unsqueeze(1), updated, centroids)
+
+    return centroids
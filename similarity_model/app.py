@@ -1,12 +1,31 @@
 from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import util
 import torch
-import re
 import os
+import sys
+
+# Shared code (instrumentation, caches) lives in ../common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.instrumentation import Metrics
 import firebase_admin
 from firebase_admin import credentials, firestore
 from flask_cors import CORS
 from dotenv import load_dotenv
+from issue_index import IssueIndex, hydrate
+from issue_records import extract_pincode, flatten_description, issue_text
+from issue_loader import load_issues, open_issues_query
+from issue_sync import IssueSync
+from embedding_cache import EmbeddingCache, model_fingerprint
+from encode_batcher import EncodeBatcher
+from query_cache import LRUCache, normalize_text
+from ann_index import IVFIndex
+from neighbourhood import RADIUS_MODES, load_adjacency, pincode_filter
+from inference import load_model, backend_id
+from index_snapshot import SnapshotPublisher, SnapshotFollower
+from duplicate_clusters import DuplicateClusters
+from serialization import ResponseStats, json_response
+import hashlib
+import threading
 
 
 # Load .env file
@@ -30,79 +49,140 @@ firebase_credentials = {
 app = Flask(__name__)
 CORS(app)  # Allow all origins (for development)
 
-# Load fine-tuned SBERT model
+metrics = Metrics("similarity")
+metrics.init_app(app)
+
+# standalone  load, sync and serve in this process (default)
+# publisher   load and sync issues, publish index snapshots for workers
+# worker      serve from the latest published snapshot (started by serve.py)
+SIMILARITY_ROLE = os.getenv("SIMILARITY_ROLE", "standalone").lower()
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("cache", "snapshots"))
+SNAPSHOT_PUBLISH_INTERVAL = float(os.getenv("SNAPSHOT_PUBLISH_INTERVAL", "5"))
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "2"))
+
+# Load fine-tuned SBERT model. SBERT_BACKEND selects torch, int8 (dynamic
+# quantization) or onnx; SBERT_NUM_THREADS and SBERT_MAX_SEQ_LENGTH tune CPU use.
 MODEL_PATH = os.path.join("model", "fine_tuned_sbert")
-model = SentenceTransformer(MODEL_PATH)
+SBERT_BACKEND = os.getenv("SBERT_BACKEND", "torch").lower()
+SBERT_NUM_THREADS = int(os.getenv("SBERT_NUM_THREADS", "0")) or None
+SBERT_MAX_SEQ_LENGTH = int(os.getenv("SBERT_MAX_SEQ_LENGTH", "0")) or None
+# Workers are forked from a preloaded master; keep torch single-threaded until
+# after the fork so no OpenMP pool is inherited
+model = load_model(
+    MODEL_PATH,
+    SBERT_BACKEND,
+    1 if SIMILARITY_ROLE == "worker" else SBERT_NUM_THREADS,
+    SBERT_MAX_SEQ_LENGTH,
+)
+
+# On-disk embedding store so restarts only encode new or edited issues.
+# Set EMBEDDING_CACHE_DIR to an empty string to disable it. Workers only
+# encode queries, so they never open it.
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("cache", "embeddings"))
+embedding_cache = (
+    EmbeddingCache(
+        EMBEDDING_CACHE_DIR,
+        model_fingerprint(MODEL_PATH) + ":" + backend_id(SBERT_BACKEND, SBERT_MAX_SEQ_LENGTH),
+    )
+    if EMBEDDING_CACHE_DIR and SIMILARITY_ROLE != "worker" else None
+)
+
+# Initialize Firebase Admin SDK. Workers never talk to Firestore; the
+# publisher does it for them.
+db = None
+if SIMILARITY_ROLE != "worker":
+    cred = credentials.Certificate(firebase_credentials)
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+# Encode issue texts into a 2D embedding tensor
+def encode_texts(texts):
+    if embedding_cache is None:
+        return model.encode(texts, convert_to_tensor=True)
+    return embedding_cache.encode(
+        texts, lambda missing: model.encode(missing, convert_to_tensor=True)
+    ).to(model.device)
+
+# Coalesce concurrent /find_similar query encodes into batched forward passes;
+# a query at idle is encoded at once, the window only applies under load.
+# ENCODE_BATCH_WINDOW_MS=0 disables batching.
+ENCODE_BATCH_WINDOW_MS = float(os.getenv("ENCODE_BATCH_WINDOW_MS", "5"))
+ENCODE_MAX_BATCH = int(os.getenv("ENCODE_MAX_BATCH", "32"))
+query_batcher = None
+
+def start_query_batcher():
+    global query_batcher
+    if ENCODE_BATCH_WINDOW_MS > 0:
+        query_batcher = EncodeBatcher(
+            lambda texts: model.encode(texts, convert_to_tensor=True),
+            max_batch_size=ENCODE_MAX_BATCH,
+            max_wait_ms=ENCODE_BATCH_WINDOW_MS,
+        )
+
+# Recently seen query embeddings, keyed by normalized text.
+# QUERY_CACHE_SIZE=0 disables the cache.
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+query_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL) if QUERY_CACHE_SIZE > 0 else None
+
+# Ranked results keyed by (query embedding hash, category, pincode, bucket
+# version); a bucket change makes its old entries unreachable.
+# RESULT_CACHE_SIZE=0 disables the cache.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "600"))
+result_cache = LRUCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL) if RESULT_CACHE_SIZE > 0 else None
+
+# Embed a single query text
+def encode_query(text):
+    key = normalize_text(text)
+    embedding = query_cache.get(key) if query_cache is not None else None
+    if embedding is not None:
+        return embedding
+
+    with metrics.stage("encode"):
+        if query_batcher is None:
+            embedding = model.encode(text, convert_to_tensor=True)
+        else:
+            embedding = query_batcher.encode(text)
 
-# Initialize Firebase Admin SDK
-cred = credentials.Certificate(firebase_credentials)
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+    if query_cache is not None:
+        query_cache.put(key, embedding)
+    return embedding
 
-# Extract pincode from address
-def extract_pincode(address):
-    match = re.search(r"\b\d{6}\b", str(address))
-    return match.group(0) if match else None
+# Embed many query texts, encoding cache misses in one batch
+def encode_queries(texts):
+    keys = [normalize_text(t) for t in texts]
+    embeddings = [query_cache.get(k) if query_cache is not None else None for k in keys]
 
-# Flatten description for similarity matching
-def flatten_description(desc):
-    if isinstance(desc, list):
-        return " ".join([d.get("text", "") for d in desc])
-    return desc if isinstance(desc, str) else ""
+    missing = [i for i, e in enumerate(embeddings) if e is None]
+    if missing:
+        with metrics.stage("encode"):
+            encoded = model.encode([texts[i] for i in missing], convert_to_tensor=True)
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = embedding
+            if query_cache is not None:
+                query_cache.put(keys[i], embedding)
 
-# Load issues from Firestore and prepare embeddings
-def load_issues_from_firestore():
-    issues_ref = db.collection("issues")
-    docs = issues_ref.stream()
+    return torch.stack(embeddings)
 
-    records = []
-    for doc in docs:
-        data = doc.to_dict()
+def result_cache_key(query_embedding, category, pincode, version):
+    digest = hashlib.sha1(query_embedding.detach().cpu().numpy().tobytes()).hexdigest()
+    return (digest, category, pincode, version)
 
-        # Skip resolved issues
-        if data.get("status", "").lower() == "resolved":
-            print(f"[SKIP] Resolved issue skipped: {doc.id}")
-            continue
+# Issues are streamed with a field projection and encoded in batches of
+# LOAD_BATCH_SIZE while later documents are still being fetched
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "256"))
+LOAD_MAX_PENDING_BATCHES = int(os.getenv("LOAD_MAX_PENDING_BATCHES", "4"))
 
-        required_fields = ["issueTitle", "description", "category", "address"]
-        missing_fields = [k for k in required_fields if not data.get(k)]
-
-        if not missing_fields:
-            pincode = extract_pincode(data["address"])
-            if pincode:
-                # 🔹 Ensure description is stored as a list of dictionaries
-                descriptions = data.get("description", [])
-                
-                # Convert all entries to dictionary format
-                extracted_descriptions = []
-                for d in descriptions:
-                    if isinstance(d, dict):
-                        extracted_descriptions.append({
-                            "text": d.get("text", ""),
-                            "date": d.get("date", None)
-                        })
-                    elif isinstance(d, str):
-                        extracted_descriptions.append({
-                            "text": d,
-                            "date": None  # No date available
-                        })
-
-                records.append({
-                    "issueId": doc.id,
-                    "issueTitle": data["issueTitle"],
-                    "description": extracted_descriptions,
-                    "category": data["category"],
-                    "address": data["address"],
-                    "pincode": pincode,
-                    "upvotes": data.get("upvotes", 0),
-                    "media": data.get("media", []),
-                    "dateOfComplaint": data.get("dateOfComplaint", None),
-                    "status": data.get("status", "Unknown")
-                })
-            else:
-                print(f"[SKIP] No pincode found for address: {data['address']}")
-        else:
-            print(f"[SKIP] Missing fields: {missing_fields} in document: {data}")
+# Load issues from Firestore and prepare embeddings
+def load_issues_from_firestore():
+    with metrics.external("firestore", "load_issues"):
+        records, embeddings = load_issues(
+            open_issues_query(db),
+            encode_texts,
+            batch_size=LOAD_BATCH_SIZE,
+            max_pending_batches=LOAD_MAX_PENDING_BATCHES,
+        )
 
     if not records:
         print("[ERROR] No valid issues loaded from Firestore.")
@@ -110,24 +190,109 @@ def load_issues_from_firestore():
 
     print(f"[INFO] Loaded {len(records)} issues from Firestore")
 
-    # Create embeddings using flattened descriptions
-    combined_texts = [
-        r["issueTitle"] + " " + flatten_description(r["description"]) for r in records
-    ]
-    embeddings = model.encode(combined_texts, convert_to_tensor=True)
+    if embedding_cache is not None:
+        print(f"[INFO] Embedding cache: {embedding_cache.hits} hits, {embedding_cache.misses} encoded")
+        # Drop embeddings of issues that were edited, resolved or deleted
+        embedding_cache.compact({embedding_cache.key(issue_text(r)) for r in records})
 
     return records, embeddings
 
-# Preload issues on startup
-issues_data, issue_embeddings = load_issues_from_firestore()
-
-@app.route("/")
-def home():
-    return "Similarity Model is running!"
-
-@app.route("/find_similar", methods=["POST"])
-def find_similar():
-    data = request.get_json()
+# Preload issues on startup and group them by (category, pincode).
+# SIMILARITY_STORAGE=fp16 or int8 keeps a compact copy of the embeddings and
+# issue records to fit more workers per node.
+SIMILARITY_STORAGE = os.getenv("SIMILARITY_STORAGE", "full").lower()
+issue_index = IssueIndex(storage=SIMILARITY_STORAGE)
+
+# "live" keeps the index in sync with the issues collection as documents are
+# added, edited or resolved; "startup" (default) only loads once
+SYNC_MODE = os.getenv("SIMILARITY_SYNC_MODE", "startup").lower()
+issue_sync = IssueSync(issue_index, encode_texts)
+
+# Approximate nearest-neighbour index for searches wider than one pincode
+# ("radius" in the request). Off by default; ANN_INDEX=ivf enables those
+# searches. The publisher trains it and ships it with each snapshot, so
+# workers never run k-means. check_ann.py measures its recall.
+ANN_INDEX = os.getenv("ANN_INDEX", "none").lower()
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+PINCODE_PREFIX_LEN = int(os.getenv("PINCODE_PREFIX_LEN", "5"))
+pincode_adjacency = load_adjacency(os.getenv("PINCODE_ADJACENCY_FILE", os.path.join("data", "pincode_adjacency.json")))
+ann_index = None
+
+# Near-duplicate clusters within each (category, pincode) bucket, recomputed
+# in the background for buckets that changed. Workers serve the clusters the
+# publisher writes to DUPLICATE_CLUSTERS_FILE. Off by default; set
+# DUPLICATE_CLUSTER_INTERVAL to the seconds between runs (e.g. 300) to turn
+# the background job on.
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.85"))
+DUPLICATE_CLUSTER_INTERVAL = float(os.getenv("DUPLICATE_CLUSTER_INTERVAL", "0"))
+duplicate_clusters = DuplicateClusters(
+    issue_index,
+    os.getenv("DUPLICATE_CLUSTERS_FILE", os.path.join("cache", "duplicate_clusters.json")),
+    threshold=DUPLICATE_THRESHOLD,
+)
+
+snapshot_publisher = None
+snapshot_follower = None
+
+# Start background threads and load the index. Runs at import time, except in
+# gunicorn workers where gunicorn.conf.py calls it after the fork, because
+# threads and Firestore channels do not survive a fork.
+def startup():
+    global ann_index, snapshot_publisher, snapshot_follower
+    start_query_batcher()
+
+    if SIMILARITY_ROLE == "worker":
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        torch.set_num_threads(SBERT_NUM_THREADS or max(1, (os.cpu_count() or 1) // workers))
+        if ANN_INDEX == "ivf":
+            ann_index = IVFIndex(issue_index, nprobe=ANN_NPROBE, train=False)
+        snapshot_follower = SnapshotFollower(issue_index, SNAPSHOT_DIR, SNAPSHOT_POLL_SECONDS, ann_index)
+        snapshot_follower.start()
+    else:
+        issue_index.build(*load_issues_from_firestore())
+
+        # Trained before live sync starts so it sees every later change
+        if ANN_INDEX == "ivf":
+            ann_index = IVFIndex(issue_index, nprobe=ANN_NPROBE)
+
+        if SYNC_MODE == "live":
+            # Same projected query as the initial load, so the listener
+            # only streams the fields the index keeps
+            issue_sync.start(open_issues_query(db))
+            print("[INFO] Live Firestore sync enabled for issues")
+
+        if SIMILARITY_ROLE == "publisher":
+            snapshot_publisher = SnapshotPublisher(
+                issue_index, SNAPSHOT_DIR, SNAPSHOT_PUBLISH_INTERVAL, ann_index=ann_index
+            )
+            snapshot_publisher.start()
+
+        if DUPLICATE_CLUSTER_INTERVAL > 0:
+            duplicate_clusters.start(DUPLICATE_CLUSTER_INTERVAL)
+
+# Number of similar issues returned per query
+TOP_N = 5
+# Upper bound on queries accepted by /find_similar_batch
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "64"))
+
+NO_MATCH_MESSAGE = "No similar issues found in same category and pincode."
+NO_NEIGHBOUR_MESSAGE = "No similar issues found in the selected area."
+
+# Fields a result can be projected to with "fields", and how much history
+# "compact" mode keeps
+RESULT_FIELDS = (
+    "issueId", "title", "description", "category", "address", "upvotes",
+    "media", "similarity_score", "dateOfComplaint", "status",
+)
+COMPACT_DESCRIPTION_ENTRIES = int(os.getenv("COMPACT_DESCRIPTION_ENTRIES", "1"))
+COMPACT_MEDIA_ITEMS = int(os.getenv("COMPACT_MEDIA_ITEMS", "1"))
+
+response_stats = ResponseStats()
+
+# Validate a /find_similar payload. Returns (query, error message)
+def parse_query(data):
+    if not isinstance(data, dict):
+        return None, "Missing one or more required fields."
 
     title = data.get("issueTitle")
     raw_description = data.get("description")  # Original structure
@@ -135,61 +300,325 @@ def find_similar():
     address = data.get("address")
 
     if not all([title, raw_description, category, address]):
-        return jsonify({"error": "Missing one or more required fields."}), 400
+        return None, "Missing one or more required fields."
 
     query_pincode = extract_pincode(address)
     if not query_pincode:
-        return jsonify({"error": "No valid pincode found in the address."}), 400
+        return None, "No valid pincode found in the address."
+
+    radius = data.get("radius", "exact")
+    if radius not in RADIUS_MODES:
+        return None, f"Unknown radius '{radius}', expected one of {', '.join(RADIUS_MODES)}."
+    if radius != "exact" and ann_index is None:
+        return None, "Neighbourhood search is disabled."
 
     # Flatten description for similarity search
     query_description_flat = flatten_description(raw_description)
 
-    # Filter issues by category and pincode
-    filtered = []
-    for i, issue in enumerate(issues_data):
-        issue_address = issue.get("address", "")
-        issue_pincode = extract_pincode(issue_address)
-        issue_category = issue.get("category")
-
-        print(f"[DEBUG] Issue {i}: Category = {issue_category}, Pincode = {issue_pincode}")
+    return {
+        "text": title + " " + query_description_flat,
+        "category": category,
+        "pincode": query_pincode,
+        "radius": radius,
+    }, None
+
+# Read the optional response shape from a request body or the query string:
+# "fields" (a list or comma-separated string of RESULT_FIELDS) and "compact".
+# Returns (fields or None, compact, error message)
+def parse_view(data):
+    data = data if isinstance(data, dict) else {}
+    fields = data.get("fields", request.args.get("fields"))
+    compact = data.get("compact", request.args.get("compact", False))
+
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if fields is not None:
+        if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+            return None, False, "'fields' must be a list of field names."
+        unknown = [f for f in fields if f not in RESULT_FIELDS]
+        if unknown:
+            return None, False, f"Unknown fields: {', '.join(unknown)}."
+
+    if isinstance(compact, str):
+        compact = compact.lower() in ("1", "true", "yes")
+    return fields or None, bool(compact), None
+
+# Apply a parsed view to formatted results. Returns new dicts, since the
+# results may be shared with the result cache.
+def shape_results(results, fields, compact):
+    if not fields and not compact:
+        return results
+
+    shaped = []
+    for issue in results:
+        if compact:
+            issue = dict(issue)
+            if isinstance(issue["description"], list):
+                issue["description"] = issue["description"][-COMPACT_DESCRIPTION_ENTRIES:]
+            issue["media"] = issue["media"][:COMPACT_MEDIA_ITEMS]
+        if fields:
+            issue = {f: issue[f] for f in fields}
+        shaped.append(issue)
+    return shaped
+
+def format_issue(issue, score):
+    return {
+        "issueId": issue["issueId"],
+        "title": issue["issueTitle"],
+        "description": issue["description"],
+        "category": issue["category"],
+        "address": issue["address"],
+        "upvotes": issue.get("upvotes", 0),
+        "media": issue.get("media", []),
+        "similarity_score": round(score, 4),
+        "dateOfComplaint": issue.get("dateOfComplaint", None),
+        "status": issue.get("status", "Unknown")
+    }
+
+# Top matches in one bucket for each row of query_embeddings, using a single
+# cos_sim matrix and one topk over it
+def rank_bucket(query_embeddings, bucket_issues, bucket_embeddings):
+    with metrics.stage("cos_sim"):
+        similarities = util.cos_sim(query_embeddings, bucket_embeddings)
+    with metrics.stage("topk"):
+        top_n = min(TOP_N, similarities.shape[1])
+        top = torch.topk(similarities, k=top_n, dim=1)
+
+    with metrics.stage("format"):
+        return [
+            [format_issue(hydrate(bucket_issues[i]), score) for i, score in zip(indices, scores)]
+            for indices, scores in zip(top.indices.tolist(), top.values.tolist())
+        ]
+
+# Issues and embeddings of every bucket in `category` whose pincode passes
+# allowed(pincode), for an exact neighbourhood search
+def neighbourhood_buckets(category, allowed):
+    parts = [
+        issue_index.bucket(*key) for key in issue_index.bucket_keys()
+        if key[0] == category and (allowed is None or allowed(key[1]))
+    ]
+    parts = [part for part in parts if part[0]]
+    if not parts:
+        return [], None
+    return [issue for part in parts for issue in part[0]], torch.cat([part[1] for part in parts])
+
+# Top matches among neighbouring pincodes (or the whole category) via the
+# ANN index, re-ranked exactly. Falls back to scoring every allowed bucket
+# when the pincode filter rejects too many of the probed candidates.
+def search_neighbourhood(query, query_embedding):
+    allowed = pincode_filter(query["pincode"], query["radius"], PINCODE_PREFIX_LEN, pincode_adjacency)
+    with metrics.stage("ann_search"):
+        candidates = ann_index.search(query["category"], query_embedding, allowed, k=TOP_N)
+    if candidates is None:
+        metrics.inc("ann_exact_fallbacks_total",
+                    help="Neighbourhood searches answered exactly after the ANN probe budget ran out")
+        with metrics.stage("bucket_lookup"):
+            candidate_issues, candidate_embeddings = neighbourhood_buckets(query["category"], allowed)
+    else:
+        candidate_issues, candidate_embeddings = issue_index.subset(candidates)
+    if not candidate_issues:
+        return None
+    return rank_bucket(query_embedding, candidate_issues, candidate_embeddings)[0]
 
-        if issue_category == category and issue_pincode == query_pincode:
-            filtered.append((i, issue))
+@app.route("/")
+def home():
+    return "Similarity Model is running!"
 
-    if not filtered:
-        return jsonify({"message": "No similar issues found in same category and pincode."}), 200
+@app.route("/find_similar", methods=["POST"])
+def find_similar():
+    data = request.get_json()
 
-    # Prepare filtered embeddings
-    filtered_indices = [i for i, _ in filtered]
-    filtered_issues = [issue for _, issue in filtered]
-    filtered_embeddings = issue_embeddings[filtered_indices]
+    with metrics.stage("parse"):
+        query, error = parse_query(data)
+        if not error:
+            fields, compact, error = parse_view(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if query["radius"] != "exact":
+        results = search_neighbourhood(query, encode_query(query["text"]))
+        if not results:
+            return jsonify({"message": NO_NEIGHBOUR_MESSAGE}), 200
+        with metrics.stage("serialize"):
+            return json_response(
+                {"similar_issues": shape_results(results, fields, compact)}, 200, "find_similar", response_stats
+            )
+
+    # Only score issues in the same category and pincode. Read the version
+    # first so a concurrent change can never be cached under a newer one.
+    with metrics.stage("bucket_lookup"):
+        version = issue_index.bucket_version(query["category"], query["pincode"])
+        filtered_issues, filtered_embeddings = issue_index.bucket(query["category"], query["pincode"])
+
+    if not filtered_issues:
+        return jsonify({"message": NO_MATCH_MESSAGE}), 200
 
     # Embed user input
-    query_text = title + " " + query_description_flat
-    query_embedding = model.encode(query_text, convert_to_tensor=True)
+    query_embedding = encode_query(query["text"])
 
     # Similarity calculation
-    similarities = util.cos_sim(query_embedding, filtered_embeddings)[0]
-    top_n = min(5, len(similarities))
-    top_indices = torch.topk(similarities, k=top_n).indices.tolist()
-
-    results = []
-    for i in top_indices:
-        issue = filtered_issues[i]
-        results.append({
-            "issueId": issue["issueId"],
-            "title": issue["issueTitle"],
-            "description": issue["description"],
-            "category": issue["category"],
-            "address": issue["address"],
-            "upvotes": issue.get("upvotes", 0),
-            "media": issue.get("media", []),
-            "similarity_score": round(similarities[i].item(), 4),
-            "dateOfComplaint": issue.get("dateOfComplaint", None),
-            "status": issue.get("status", "Unknown")
-        })
-
-    return jsonify({"similar_issues": results}), 200
+    cache_key = result_cache_key(query_embedding, query["category"], query["pincode"], version)
+    results = result_cache.get(cache_key) if result_cache is not None else None
+    metrics.inc("result_cache_lookups_total", {"outcome": "miss" if results is None else "hit"},
+                help="Result cache lookups by outcome")
+    if results is None:
+        results = rank_bucket(query_embedding, filtered_issues, filtered_embeddings)[0]
+        if result_cache is not None:
+            result_cache.put(cache_key, results)
+
+    with metrics.stage("serialize"):
+        return json_response(
+            {"similar_issues": shape_results(results, fields, compact)}, 200, "find_similar", response_stats
+        )
+
+# Score many draft issues at once. Takes {"queries": [<find_similar payload>, ...]}
+# and returns {"results": [...]} where each entry has the same shape as a
+# /find_similar response body. Top-level "fields" and "compact" apply to
+# every query.
+@app.route("/find_similar_batch", methods=["POST"])
+def find_similar_batch():
+    data = request.get_json(silent=True) or {}
+    queries = data.get("queries")
+
+    if not isinstance(queries, list) or not queries:
+        return jsonify({"error": "Expected a non-empty 'queries' list."}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch."}), 400
+    fields, compact, error = parse_view(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    results = [None] * len(queries)
+
+    # Group queries by (category, pincode) bucket; wider searches go
+    # through the ANN index one by one
+    buckets = {}
+    neighbourhood = []
+    for pos, item in enumerate(queries):
+        query, error = parse_query(item)
+        if error:
+            results[pos] = {"error": error}
+            continue
+        if query["radius"] != "exact":
+            neighbourhood.append((pos, query))
+            continue
+
+        key = (query["category"], query["pincode"])
+        if key not in buckets:
+            with metrics.stage("bucket_lookup"):
+                version = issue_index.bucket_version(*key)
+                bucket_issues, bucket_embeddings = issue_index.bucket(*key)
+            buckets[key] = (bucket_issues, bucket_embeddings, [], version)
+        if not buckets[key][0]:
+            results[pos] = {"message": NO_MATCH_MESSAGE}
+            continue
+        buckets[key][2].append((pos, query["text"]))
+
+    # One batched encode for every query that has candidates, then one
+    # similarity matrix per bucket
+    pending = [member for bucket in buckets.values() for member in bucket[2]]
+    pending += [(pos, query["text"]) for pos, query in neighbourhood]
+    if pending:
+        query_embeddings = encode_queries([text for _, text in pending])
+
+        offset = 0
+        for (category, pincode), (bucket_issues, bucket_embeddings, members, version) in buckets.items():
+            if not members:
+                continue
+            member_embeddings = query_embeddings[offset:offset + len(members)]
+            offset += len(members)
+
+            # Serve cached rankings, score the rest in one matrix
+            to_rank = []
+            for row, (pos, _) in enumerate(members):
+                cache_key = result_cache_key(member_embeddings[row], category, pincode, version)
+                cached = result_cache.get(cache_key) if result_cache is not None else None
+                metrics.inc("result_cache_lookups_total", {"outcome": "miss" if cached is None else "hit"})
+                if cached is not None:
+                    results[pos] = {"similar_issues": cached}
+                else:
+                    to_rank.append((row, pos, cache_key))
+
+            if not to_rank:
+                continue
+            ranked = rank_bucket(
+                member_embeddings[[row for row, _, _ in to_rank]], bucket_issues, bucket_embeddings
+            )
+            for (_, pos, cache_key), similar in zip(to_rank, ranked):
+                results[pos] = {"similar_issues": similar}
+                if result_cache is not None:
+                    result_cache.put(cache_key, similar)
+
+        for row, (pos, query) in enumerate(neighbourhood, start=offset):
+            similar = search_neighbourhood(query, query_embeddings[row])
+            results[pos] = {"similar_issues": similar} if similar else {"message": NO_NEIGHBOUR_MESSAGE}
+
+    for result in results:
+        if "similar_issues" in result:
+            result["similar_issues"] = shape_results(result["similar_issues"], fields, compact)
+    with metrics.stage("serialize"):
+        return json_response({"results": results}, 200, "find_similar_batch", response_stats)
+
+# Near-duplicate clusters, largest first. Optional filters: category,
+# pincode, min_size (default 2) and limit (default 100).
+@app.route("/duplicate_clusters", methods=["GET"])
+def list_duplicate_clusters():
+    if SIMILARITY_ROLE == "worker":
+        duplicate_clusters.load()
+
+    try:
+        min_size = max(2, int(request.args.get("min_size", 2)))
+        limit = max(0, int(request.args.get("limit", 100)))
+    except ValueError:
+        return jsonify({"error": "min_size and limit must be integers."}), 400
+
+    clusters = duplicate_clusters.clusters(
+        request.args.get("category"), request.args.get("pincode"), min_size
+    )
+    return jsonify({
+        "clusters": clusters[:limit],
+        "total": len(clusters),
+        "last_run": duplicate_clusters.last_run,
+    }), 200
+
+# The near-duplicate cluster one issue belongs to
+@app.route("/duplicate_clusters/<issue_id>", methods=["GET"])
+def issue_duplicate_cluster(issue_id):
+    if SIMILARITY_ROLE == "worker":
+        duplicate_clusters.load()
+
+    cluster = duplicate_clusters.cluster_for(issue_id)
+    if cluster is None:
+        return jsonify({"message": "No near-duplicates found for this issue."}), 404
+    return jsonify({"cluster": cluster}), 200
+
+# Runtime statistics for sizing the encoder and caches
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "issues_indexed": len(issue_index),
+        "role": SIMILARITY_ROLE,
+        "snapshot": snapshot_follower.version if snapshot_follower else None,
+        "storage": issue_index.storage,
+        "sbert_backend": SBERT_BACKEND,
+        "query_batcher": query_batcher.stats() if query_batcher else None,
+        "query_cache": query_cache.stats() if query_cache is not None else None,
+        "result_cache": result_cache.stats() if result_cache is not None else None,
+        "ann_index": ann_index.stats() if ann_index is not None else None,
+        "duplicate_clusters": duplicate_clusters.stats(),
+        "responses": response_stats.stats(),
+    }), 200
+
+metrics.gauge_callback("issues_indexed", lambda: len(issue_index), help="Open issues in the similarity index")
+
+if SIMILARITY_ROLE != "worker":
+    startup()
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    if SIMILARITY_ROLE == "publisher":
+        # Nothing to serve; keep syncing and publishing snapshots
+        threading.Event().wait()
+    else:
+        # No reloader by default: it would start a second process that loads
+        # the model and index again. FLASK_DEBUG=1 turns debug mode on.
+        app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
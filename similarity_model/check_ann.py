@@ -0,0 +1,69 @@
+"""Recall check for the IVF approximate nearest-neighbour index.
+
+Loads the latest index snapshot written by the publisher (SIMILARITY_ROLE=
+publisher with ANN_INDEX=ivf), then measures how many of the brute-force
+top-k neighbours within each category the IVF search also returns, at each
+nprobe. Uses the IVF lists shipped with the snapshot, or trains new ones
+with --retrain (always when the snapshot has none).
+
+    python check_ann.py --snapshot-dir cache/snapshots --nprobe 1,4,8,16
+"""
+import argparse
+import json
+import os
+import time
+from ann_index import IVFIndex
+from index_snapshot import current_version, load_snapshot
+from issue_index import IssueIndex
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("cache", "snapshots"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot-dir", default=SNAPSHOT_DIR)
+    parser.add_argument("--nprobe", default="1,4,8,16", help="comma-separated nprobe values")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--sample", type=int, default=200, help="indexed issues used as queries")
+    parser.add_argument("--retrain", action="store_true", help="train new lists instead of the shipped ones")
+    parser.add_argument("--json", action="store_true", help="print a machine-readable report")
+    args = parser.parse_args()
+
+    version = current_version(args.snapshot_dir)
+    if version is None:
+        parser.error(f"No index snapshot in {args.snapshot_dir}")
+    with open(os.path.join(args.snapshot_dir, version, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    index = IssueIndex(storage=meta["storage"])
+    ann_index = IVFIndex(index, train=False)
+    load_snapshot(index, args.snapshot_dir, version, ann_index)
+
+    trained = args.retrain or not meta.get("ann")
+    train_s = None
+    if args.retrain:
+        start = time.perf_counter()
+        ann_index.rebuild()
+        train_s = round(time.perf_counter() - start, 2)
+
+    report = {
+        "snapshot": version,
+        "issues": len(index),
+        "lists": "trained here" if trained else "from snapshot",
+        "train_s": train_s,
+        "k": args.k,
+        "recall": {},
+    }
+    for nprobe in (int(n) for n in args.nprobe.split(",")):
+        ann_index.nprobe = nprobe
+        report["recall"][nprobe] = ann_index.measure_recall(sample_size=args.sample, k=args.k)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:12} {value}")
+
+
+if __name__ == "__main__":
+    main()
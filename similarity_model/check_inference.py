@@ -0,0 +1,117 @@
+"""Parity and throughput check for SBERT inference backends.
+
+Encodes the complaints in data/issues.csv with the float32 torch reference
+and with the backend under test, then reports how far the embeddings drift,
+whether per-bucket top-5 rankings still agree, and texts/second for a bulk
+encode and for single-query encodes.
+
+    python check_inference.py --backend int8 --threads 4 --max-seq-length 128
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+import torch
+from sentence_transformers import util
+from inference import BACKENDS, load_model
+
+# Shared code lives in ../common
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from issue_records import extract_pincode
+
+MODEL_PATH = os.path.join("model", "fine_tuned_sbert")
+DATA_PATH = os.path.join("data", "issues.csv")
+
+
+def load_texts(path, limit):
+    with open(path, "r", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))[:limit]
+    texts = [r["title"] + " " + r["description"] for r in rows]
+    buckets = [(r["category"], extract_pincode(r["address"])) for r in rows]
+    return texts, buckets
+
+
+def throughput(model, texts, batch_size, single_queries):
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size, convert_to_tensor=True)
+    bulk = len(texts) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for text in texts[:single_queries]:
+        model.encode(text, convert_to_tensor=True)
+    single = single_queries / (time.perf_counter() - start)
+
+    return embeddings.float().cpu(), round(bulk, 1), round(single, 1)
+
+
+# Fraction of per-bucket top-k neighbour sets that match the reference
+def ranking_agreement(reference, candidate, buckets, k=5):
+    groups = {}
+    for row, key in enumerate(buckets):
+        groups.setdefault(key, []).append(row)
+
+    matched = 0
+    total = 0
+    for rows in groups.values():
+        if len(rows) < 2:
+            continue
+        top_k = min(k, len(rows))
+        ref = torch.topk(util.cos_sim(reference[rows], reference[rows]), k=top_k, dim=1).indices
+        cand = torch.topk(util.cos_sim(candidate[rows], candidate[rows]), k=top_k, dim=1).indices
+        for a, b in zip(ref.tolist(), cand.tolist()):
+            matched += len(set(a) & set(b))
+            total += top_k
+    return round(matched / total, 4) if total else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=BACKENDS, default="int8")
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--max-seq-length", type=int, default=None)
+    parser.add_argument("--limit", type=int, default=750)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--single-queries", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print a machine-readable report")
+    args = parser.parse_args()
+
+    texts, buckets = load_texts(DATA_PATH, args.limit)
+
+    reference_model = load_model(MODEL_PATH, "torch", args.threads)
+    reference, ref_bulk, ref_single = throughput(
+        reference_model, texts, args.batch_size, args.single_queries
+    )
+
+    candidate_model = load_model(MODEL_PATH, args.backend, args.threads, args.max_seq_length)
+    candidate, bulk, single = throughput(
+        candidate_model, texts, args.batch_size, args.single_queries
+    )
+
+    drift = torch.nn.functional.cosine_similarity(reference, candidate, dim=1)
+    report = {
+        "backend": args.backend,
+        "texts": len(texts),
+        "threads": torch.get_num_threads(),
+        "max_seq_length": candidate_model.max_seq_length,
+        "embedding_cosine_min": round(drift.min().item(), 6),
+        "embedding_cosine_mean": round(drift.mean().item(), 6),
+        "top5_agreement": ranking_agreement(reference, candidate, buckets),
+        "reference_bulk_texts_per_s": ref_bulk,
+        "bulk_texts_per_s": bulk,
+        "reference_single_texts_per_s": ref_single,
+        "single_texts_per_s": single,
+        "bulk_speedup": round(bulk / ref_bulk, 2),
+        "single_speedup": round(single / ref_single, 2),
+    }
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:32} {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import torch
+from issue_index import record_id
+
+
+# Groups of near-duplicate open issues, e.g. forty complaints about the same
+# broken road.
+#
+# Within each (category, pincode) bucket, every pair of issues whose cosine
+# similarity reaches `threshold` is linked, and the connected components are
+# the clusters. Scores are computed block by block as matrix products, so no
+# bucket ever needs a full N x N matrix in memory at once.
+#
+# Each bucket is stored with a fingerprint of its issue ids and embeddings.
+# A run only recomputes buckets whose fingerprint changed, including across
+# restarts when the clusters are persisted to `path`.
+class DuplicateClusters:
+    def __init__(self, issue_index, path=None, threshold=0.85, block_size=1024):
+        self.index = issue_index
+        self.path = path
+        self.threshold = threshold
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._buckets = {}       # (category, pincode) -> {"fingerprint", "version", "clusters"}
+        self._cluster_of = {}    # issueId -> (bucket key, cluster position)
+        self._loaded_mtime = None
+        self._dirty = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    def __len__(self):
+        return sum(len(b["clusters"]) for b in self._buckets.values())
+
+    # Recompute the clusters of every bucket that changed since the last run
+    def run(self):
+        with self._run_lock:
+            return self._run()
+
+    def _run(self):
+        started = time.monotonic()
+        previous = self._buckets
+        buckets = {}
+        recomputed = 0
+
+        for key in self.index.bucket_keys():
+            version = self.index.bucket_version(*key)
+            old = previous.get(key)
+            if old is not None and old.get("version") == version:
+                buckets[key] = old
+                continue
+
+            records, embeddings = self.index.bucket(*key, cache=False)
+            if not records:
+                continue
+            issue_ids = [record_id(r) for r in records]
+            fingerprint = bucket_fingerprint(issue_ids, embeddings)
+            if old is not None and old["fingerprint"] == fingerprint:
+                buckets[key] = dict(old, version=version)
+                continue
+
+            groups = cluster_embeddings(embeddings, self.threshold, self.block_size)
+            buckets[key] = {
+                "fingerprint": fingerprint,
+                "version": version,
+                "clusters": sorted(
+                    (sorted(issue_ids[i] for i in group) for group in groups if len(group) > 1),
+                    key=lambda ids: (-len(ids), ids[0]),
+                ),
+            }
+            recomputed += 1
+
+        with self._lock:
+            self._set_buckets(buckets)
+
+        self.last_run = {
+            "finished_at": time.time(),
+            "seconds": round(time.monotonic() - started, 3),
+            "buckets": len(buckets),
+            "recomputed": recomputed,
+            "removed": len(set(previous) - set(buckets)),
+            "clusters": len(self),
+        }
+        if self.path:
+            self.save()
+        print(f"[CLUSTERS] {self.last_run['clusters']} duplicate clusters, "
+              f"{recomputed}/{len(buckets)} buckets recomputed in {self.last_run['seconds']}s")
+        return self.last_run
+
+    # Clusters with at least min_size issues, largest first, optionally
+    # limited to one category and/or pincode
+    def clusters(self, category=None, pincode=None, min_size=2):
+        with self._lock:
+            items = [
+                cluster_entry(key, ids)
+                for key, bucket in self._buckets.items()
+                if (category is None or key[0] == category) and (pincode is None or key[1] == pincode)
+                for ids in bucket["clusters"]
+                if len(ids) >= min_size
+            ]
+        items.sort(key=lambda c: (-c["size"], c["clusterId"]))
+        return items
+
+    # Cluster containing issue_id, or None when it has no near-duplicates
+    def cluster_for(self, issue_id):
+        with self._lock:
+            found = self._cluster_of.get(issue_id)
+            if found is None:
+                return None
+            key, pos = found
+            return cluster_entry(key, self._buckets[key]["clusters"][pos])
+
+    def save(self):
+        with self._lock:
+            data = {
+                "threshold": self.threshold,
+                "last_run": self.last_run,
+                "buckets": [
+                    {"category": key[0], "pincode": key[1],
+                     "fingerprint": bucket["fingerprint"], "clusters": bucket["clusters"]}
+                    for key, bucket in self._buckets.items()
+                ],
+            }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(self.path + ".tmp", self.path)
+
+    # Load persisted clusters if the file changed since the last load. Clusters
+    # computed with a different threshold are ignored.
+    def load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except (OSError, TypeError):
+            return False
+        if mtime == self._loaded_mtime:
+            return False
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self._loaded_mtime = mtime
+        if data.get("threshold") != self.threshold:
+            print(f"[CLUSTERS] Ignoring {self.path}: computed with threshold {data.get('threshold')}")
+            return False
+
+        buckets = {
+            (b["category"], b["pincode"]): {"fingerprint": b["fingerprint"], "clusters": b["clusters"]}
+            for b in data["buckets"]
+        }
+        with self._lock:
+            self._set_buckets(buckets)
+        self.last_run = data.get("last_run")
+        return True
+
+    # Run once now, then again at most every `interval` seconds while the
+    # index keeps changing
+    def start(self, interval=300.0):
+        self.load()
+        self.index.subscribe(lambda *args: self._dirty.set())
+        self._dirty.set()
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval,), name="duplicate-clusters", daemon=True
+        )
+        self._thread.start()
+
+    def stats(self):
+        return {
+            "threshold": self.threshold,
+            "clusters": len(self),
+            "last_run": self.last_run,
+        }
+
+    def _loop(self, interval):
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            try:
+                self.run()
+            except Exception as e:
+                print(f"[ERROR] Duplicate clustering failed: {e}")
+            time.sleep(interval)
+
+    def _set_buckets(self, buckets):
+        self._buckets = buckets
+        self._cluster_of = {
+            issue_id: (key, pos)
+            for key, bucket in buckets.items()
+            for pos, ids in enumerate(bucket["clusters"])
+            for issue_id in ids
+        }
+
+
+# Connected components of the graph linking rows with cosine similarity >=
+# threshold. Rows are unit-normalized, so each block of scores is a plain
+# matrix product against the rows after it.
+def cluster_embeddings(embeddings, threshold, block_size=1024):
+    n = embeddings.shape[0]
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    embeddings = embeddings.float()
+    for start in range(0, n, block_size):
+        block = embeddings[start:start + block_size]
+        scores = block @ embeddings[start:].T
+        # Keep each pair once: column j (offset by start) must come after row i
+        pairs = torch.nonzero(torch.triu(scores >= threshold, diagonal=1)).tolist()
+        for i, j in pairs:
+            a, b = find(start + i), find(start + j)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def bucket_fingerprint(issue_ids, embeddings):
+    order = sorted(range(len(issue_ids)), key=issue_ids.__getitem__)
+    digest = hashlib.sha1()
+    digest.update("\0".join(issue_ids[i] for i in order).encode("utf-8"))
+    digest.update(embeddings[order].float().contiguous().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cluster_entry(key, issue_ids):
+    return {
+        "clusterId": issue_ids[0],
+        "category": key[0],
+        "pincode": key[1],
+        "size": len(issue_ids),
+        "issueIds": issue_ids,
+    }
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+import torch
+
+
+# Persistent embedding store keyed by sha256(model fingerprint + text).
+#
+# Layout in `directory`:
+#   meta.json        model fingerprint and embedding dimension
+#   keys.txt         one hex key per row, append-only
+#   embeddings.f32   raw float32 rows, append-only, memory-mapped on load
+#
+# A different model fingerprint wipes the store. Edited issues append new
+# rows, so compact() rewrites the files keeping only the keys still in use.
+class EmbeddingCache:
+    def __init__(self, directory, model_id):
+        self.directory = directory
+        self.model_id = model_id
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._rows = {}     # key -> row
+        self._count = 0     # rows in embeddings.f32
+        self._matrix = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.directory, "meta.json")
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self.directory, "keys.txt")
+
+    @property
+    def _data_path(self):
+        return os.path.join(self.directory, "embeddings.f32")
+
+    def __len__(self):
+        return len(self._rows)
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    # Embed texts, calling encode_fn only for texts not already stored
+    def encode(self, texts, encode_fn):
+        keys = [self.key(t) for t in texts]
+
+        with self._lock:
+            missing = [i for i, k in enumerate(keys) if k not in self._rows]
+
+        if missing:
+            # Encode each distinct missing text once
+            unique = {}
+            for i in missing:
+                unique.setdefault(keys[i], texts[i])
+            encoded = encode_fn(list(unique.values()))
+            encoded = encoded.detach().cpu().numpy().astype(np.float32, copy=False)
+            with self._lock:
+                # Another thread may have stored some of them meanwhile
+                fresh = [i for i, k in enumerate(unique) if k not in self._rows]
+                self._append([list(unique)[i] for i in fresh], encoded[fresh])
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            if not texts:
+                return torch.empty((0, self.dim or 0))
+            rows = [self._rows[k] for k in keys]
+            return torch.from_numpy(np.array(self._matrix[rows]))
+
+    # Rewrite the store keeping only live_keys. Skipped unless at least
+    # min_dead_ratio of the stored rows are no longer used.
+    def compact(self, live_keys, min_dead_ratio=0.25):
+        with self._lock:
+            live = [k for k in self._rows if k in live_keys]
+            dead = len(self._rows) - len(live)
+            if not self._rows or dead / len(self._rows) < min_dead_ratio:
+                return 0
+
+            live.sort(key=self._rows.get)
+            matrix = np.array(self._matrix[[self._rows[k] for k in live]]) if live \
+                else np.empty((0, self.dim), dtype=np.float32)
+
+            self._matrix = None
+            _atomic_write(self._data_path, matrix.tobytes())
+            _atomic_write(self._keys_path, "".join(k + "\n" for k in live).encode())
+            self._rows = {k: i for i, k in enumerate(live)}
+            self._count = len(live)
+            self._map()
+
+            print(f"[CACHE] Compacted embedding cache: dropped {dead}, kept {len(live)}")
+            return dead
+
+    def clear(self):
+        with self._lock:
+            self._matrix = None
+            self._rows = {}
+            self._count = 0
+            self.dim = None
+            for path in (self._keys_path, self._data_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._write_meta()
+
+    def _load(self):
+        meta = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+        if meta.get("model_id") != self.model_id:
+            if meta:
+                print("[CACHE] Model changed, invalidating embedding cache")
+            self.clear()
+            return
+
+        self.dim = meta.get("dim")
+        if not self.dim or not os.path.exists(self._keys_path):
+            return
+
+        with open(self._keys_path, "r", encoding="utf-8") as f:
+            keys = f.read().split()
+
+        # A crash between the two appends can leave a partial tail; only
+        # trust rows present in both files
+        row_bytes = self.dim * 4
+        stored_rows = os.path.getsize(self._data_path) // row_bytes \
+            if os.path.exists(self._data_path) else 0
+        if len(keys) != stored_rows:
+            keys = keys[:stored_rows]
+            _atomic_write(self._keys_path, "".join(k + "\n" for k in keys).encode())
+        self._rows = {k: i for i, k in enumerate(keys)}
+        self._count = len(keys)
+        self._map()
+        print(f"[CACHE] Loaded {len(self._rows)} cached embeddings")
+
+    def _map(self):
+        if not self._count:
+            self._matrix = np.empty((0, self.dim or 0), dtype=np.float32)
+            return
+        self._matrix = np.memmap(
+            self._data_path, dtype=np.float32, mode="r", shape=(self._count, self.dim)
+        )
+
+    def _append(self, keys, matrix):
+        if self.dim is None:
+            self.dim = matrix.shape[1]
+            self._write_meta()
+
+        if not keys:
+            return
+
+        start = self._count
+        with open(self._data_path, "ab") as f:
+            f.truncate(start * self.dim * 4)
+            f.write(matrix.tobytes())
+        with open(self._keys_path, "a", encoding="utf-8") as f:
+            f.write("".join(k + "\n" for k in keys))
+
+        for i, k in enumerate(keys):
+            self._rows[k] = start + i
+        self._count += len(keys)
+        self._map()
+
+    def _write_meta(self):
+        _atomic_write(
+            self._meta_path,
+            json.dumps({"model_id": self.model_id, "dim": self.dim}).encode("utf-8"),
+        )
+
+
+# Identify a model directory by the names and contents of its weight,
+# config and tokenizer files, so replacing model/fine_tuned_sbert
+# invalidates the cache while copying or touching it (a new checkout or
+# container image) does not. Documentation files are left out.
+def model_fingerprint(model_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(model_path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".md"):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, model_path)
+            digest.update(f"{rel}:{os.path.getsize(path)}\n".encode("utf-8"))
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+# Coalesces single-text encode calls from concurrent request threads into
+# batched forward passes. A lone text at idle is encoded at once, since no
+# other request could join it. Under load (other texts already waiting, or
+# texts that arrived while the previous batch was encoding) the first
+# queued text opens a window of max_wait_ms; the batch is encoded when the
+# window closes or max_batch_size texts are waiting, whichever comes first.
+class EncodeBatcher:
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=5.0):
+        self.encode_fn = encode_fn  # callable(list[str]) -> 2D tensor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._encoding = False
+        self._arrived_while_encoding = False
+
+        self._batches = 0
+        self._waited = 0
+        self._encoded = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = {}  # batch size -> count
+
+        self._worker = threading.Thread(target=self._run, name="encode-batcher", daemon=True)
+        self._worker.start()
+
+    # Embed one text; blocks the calling thread until its batch is done
+    def encode(self, text, timeout=None):
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("EncodeBatcher is closed")
+            self._queue.append((text, future))
+            if self._encoding:
+                self._arrived_while_encoding = True
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            self._cond.notify()
+        return future.result(timeout)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_ms,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": self._batches,
+                "waited_batches": self._waited,
+                "encoded": self._encoded,
+                "avg_batch_size": round(self._encoded / self._batches, 2) if self._batches else 0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._worker.join()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            # Under load, hold the window open for more texts unless the
+            # batch is full
+            if len(self._queue) > 1 or self._arrived_while_encoding:
+                self._waited += 1
+                deadline = time.monotonic() + self.max_wait_ms / 1000.0
+                while len(self._queue) < self.max_batch_size and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            self._encoding = True
+            self._arrived_while_encoding = False
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            texts = [text for text, _ in batch]
+            try:
+                embeddings = self.encode_fn(texts)
+            except Exception as e:
+                with self._cond:
+                    self._encoding = False
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+            with self._cond:
+                self._encoding = False
+                self._batches += 1
+                self._encoded += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
@@ -0,0 +1,25 @@
+import os
+
+# Gunicorn settings for SIMILARITY_ROLE=worker (see serve.py).
+#
+# The app is imported once in the master so the model weights are loaded
+# before forking and shared copy-on-write by every worker. The index itself
+# comes from the snapshot the publisher writes, memory-mapped by each worker.
+
+# Set before the app is preloaded so it skips Firestore and the initial load
+os.environ["SIMILARITY_ROLE"] = "worker"
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+# app.startup() splits the CPU cores between workers
+os.environ["WEB_CONCURRENCY"] = str(workers)
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+# Threads and torch's thread pool do not survive fork, so each worker starts
+# its own batcher and snapshot follower here
+def post_fork(server, worker):
+    import app
+    app.startup()
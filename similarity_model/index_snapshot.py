@@ -0,0 +1,199 @@
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+import numpy as np
+import torch
+
+
+# Versioned on-disk snapshots of an IssueIndex, used to share one embedding
+# matrix between worker processes.
+#
+# A publisher writes each snapshot into a fresh directory and then atomically
+# replaces the CURRENT pointer file, so readers only ever see complete
+# snapshots. Workers memory-map the embedding rows; the kernel page cache
+# holds one physical copy for every worker on the node.
+#
+#   <directory>/CURRENT                 name of the latest version
+#   <directory>/<version>/meta.json     storage mode, dtype and shape
+#   <directory>/<version>/embeddings.bin
+#   <directory>/<version>/scales.bin
+#   <directory>/<version>/records.pkl
+#   <directory>/<version>/ann.pkl       trained IVF lists, when the publisher has them
+
+_DTYPES = {
+    torch.float32: np.float32,
+    torch.float16: np.float16,
+    torch.int8: np.int8,
+}
+
+
+def publish_snapshot(index, directory, keep=3, ann_index=None):
+    # The ANN lists follow index changes under the index lock, so reading
+    # both under it keeps them in step
+    with index.lock:
+        records, packed, scales = index.export_state()
+        ann_state = ann_index.export_state() if ann_index is not None else None
+    version = f"v{time.time_ns()}"
+    target = os.path.join(directory, version)
+    os.makedirs(target)
+
+    packed = packed.detach().cpu().contiguous()
+    scales = scales.detach().cpu().float().contiguous()
+    with open(os.path.join(target, "embeddings.bin"), "wb") as f:
+        f.write(packed.numpy().tobytes())
+    with open(os.path.join(target, "scales.bin"), "wb") as f:
+        f.write(scales.numpy().tobytes())
+    with open(os.path.join(target, "records.pkl"), "wb") as f:
+        pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+    if ann_state is not None:
+        with open(os.path.join(target, "ann.pkl"), "wb") as f:
+            pickle.dump(ann_state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    with open(os.path.join(target, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "storage": index.storage,
+            "dtype": np.dtype(_DTYPES[packed.dtype]).name,
+            "rows": len(records),
+            "dim": packed.shape[1] if packed.dim() == 2 else 0,
+            "ann": ann_state is not None,
+        }, f)
+
+    pointer = os.path.join(directory, "CURRENT")
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer + ".tmp", pointer)
+
+    # Workers still mapping an old version keep its files alive until they
+    # move on, so older versions can be unlinked right away
+    versions = sorted(v for v in os.listdir(directory) if v.startswith("v"))
+    for old in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+    return version
+
+
+def current_version(directory):
+    try:
+        with open(os.path.join(directory, "CURRENT"), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+# Load a snapshot into `index` with the embedding rows memory-mapped
+# copy-on-write (reads share the page cache, writes stay private). With
+# ann_index, also load the IVF lists published with it, or train them here
+# if the snapshot has none.
+def load_snapshot(index, directory, version, ann_index=None):
+    source = os.path.join(directory, version)
+    with open(os.path.join(source, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta["storage"] != index.storage:
+        raise ValueError(
+            f"Snapshot {version} uses {meta['storage']} storage, index uses {index.storage}"
+        )
+
+    with open(os.path.join(source, "records.pkl"), "rb") as f:
+        records = pickle.load(f)
+
+    rows, dim = meta["rows"], meta["dim"]
+    if rows:
+        packed = torch.from_numpy(np.memmap(
+            os.path.join(source, "embeddings.bin"), dtype=meta["dtype"], mode="c", shape=(rows, dim)
+        ))
+        scales = torch.from_numpy(np.memmap(
+            os.path.join(source, "scales.bin"), dtype=np.float32, mode="c", shape=(rows,)
+        ))
+    else:
+        packed = torch.empty((0, dim), dtype=getattr(torch, meta["dtype"]))
+        scales = torch.empty(0)
+
+    index.load_state(records, packed, scales)
+
+    if ann_index is not None:
+        if meta.get("ann"):
+            with open(os.path.join(source, "ann.pkl"), "rb") as f:
+                ann_index.load_state(pickle.load(f))
+        else:
+            print(f"[SNAPSHOT] {version} has no ANN index; training one in worker {os.getpid()}")
+            ann_index.rebuild()
+    return meta
+
+
+# Publisher side: writes a snapshot after the index changes, at most once
+# every min_interval seconds
+class SnapshotPublisher:
+    def __init__(self, index, directory, min_interval=5.0, keep=3, ann_index=None):
+        self.index = index
+        self.ann_index = ann_index
+        self.directory = directory
+        self.min_interval = min_interval
+        self.keep = keep
+        self.version = None
+        self._dirty = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    def publish(self):
+        self._dirty.clear()
+        self.version = publish_snapshot(self.index, self.directory, self.keep, self.ann_index)
+        print(f"[SNAPSHOT] Published {self.version} ({len(self.index)} issues)")
+        return self.version
+
+    def start(self):
+        self.publish()
+        self.index.subscribe(lambda *args: self._dirty.set())
+        self._thread = threading.Thread(target=self._run, name="snapshot-publisher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            time.sleep(self.min_interval)
+            try:
+                self.publish()
+            except Exception as e:
+                print(f"[ERROR] Failed to publish index snapshot: {e}")
+
+
+# Worker side: loads the latest snapshot and polls CURRENT for new ones.
+# Each swap replaces the whole index state under the index lock, so requests
+# see either the old or the new snapshot, never a mix.
+class SnapshotFollower:
+    def __init__(self, index, directory, poll_interval=2.0, ann_index=None):
+        self.index = index
+        self.ann_index = ann_index
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.version = None
+        self._thread = None
+
+    def refresh(self):
+        version = current_version(self.directory)
+        if version is None or version == self.version:
+            return False
+        load_snapshot(self.index, self.directory, version, self.ann_index)
+        self.version = version
+        print(f"[SNAPSHOT] Worker {os.getpid()} loaded {version} ({len(self.index)} issues)")
+        return True
+
+    def start(self, wait_timeout=600.0):
+        deadline = time.monotonic() + wait_timeout
+        while not self.refresh():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"No index snapshot published in {self.directory}")
+            time.sleep(0.5)
+
+        self._thread = threading.Thread(target=self._run, name="snapshot-follower", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[ERROR] Failed to load index snapshot: {e}")
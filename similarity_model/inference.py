@@ -0,0 +1,43 @@
+import torch
+from sentence_transformers import SentenceTransformer
+
+
+# torch  plain float32 SentenceTransformer (default)
+# int8   dynamic int8 quantization of the transformer's Linear layers
+# onnx   sentence-transformers' ONNX Runtime backend (needs optimum[onnxruntime])
+BACKENDS = ("torch", "int8", "onnx")
+
+
+# Load the SBERT model with the requested CPU inference backend. num_threads
+# caps torch's intra-op threads; max_seq_length truncates long issue texts.
+def load_model(model_path, backend="torch", num_threads=None, max_seq_length=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown SBERT backend {backend!r}, expected one of {BACKENDS}")
+
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+    if backend == "onnx":
+        try:
+            model = SentenceTransformer(model_path, device="cpu", backend="onnx")
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnx backend needs `pip install optimum[onnxruntime]`"
+            ) from e
+    else:
+        model = SentenceTransformer(model_path, device="cpu" if backend == "int8" else None)
+        if backend == "int8":
+            model = torch.ao.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+    if max_seq_length:
+        model.max_seq_length = int(max_seq_length)
+
+    return model
+
+
+# Identity of a backend configuration; embeddings from different settings
+# must not share an embedding cache
+def backend_id(backend="torch", max_seq_length=None):
+    return f"{backend}:{max_seq_length or 'default'}"
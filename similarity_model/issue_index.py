@@ -0,0 +1,333 @@
+import pickle
+import threading
+import zlib
+import torch
+
+
+STORAGE_MODES = ("full", "fp16", "int8")
+
+
+# In-memory store of open issues and their embeddings, grouped into
+# (category, pincode) buckets so /find_similar only scores its own bucket.
+#
+# Rows live in a growable embedding buffer; removing a row moves the last row
+# into its slot, so adds and removes never rebuild the whole matrix.
+#
+# storage="full" keeps float32 embeddings and the issue dicts as loaded.
+# The compact modes keep embeddings as float16, or as int8 with a per-row
+# scale, and each issue as an IssueRow holding only the bucket fields plus
+# a compressed payload that is unpacked for the top-k results only.
+# Against float32, cosine scores differ by at most ~1e-3 with fp16 and
+# ~1e-2 with int8 for the unit-normalized SBERT embeddings.
+class IssueIndex:
+    def __init__(self, storage="full"):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode {storage!r}, expected one of {STORAGE_MODES}")
+        self.storage = storage
+        self._lock = threading.RLock()
+        self._records = []
+        self._buffer = torch.empty(0)
+        self._scales = torch.empty(0)  # per-row scale, int8 storage only
+        self._size = 0
+        self._row_of = {}          # issueId -> row
+        self._buckets = {}         # (category, pincode) -> list of rows
+        self._bucket_cache = {}    # (category, pincode) -> (records, embeddings)
+        self._generation = 0       # bumped on every full build
+        self._versions = {}        # (category, pincode) -> change counter
+        self._listeners = []       # callables notified of every change
+        self._shared = False       # buffer is a mapped snapshot shared with other processes
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def records(self):
+        return self._records
+
+    @property
+    def compact(self):
+        return self.storage != "full"
+
+    # Held while the index changes and while listeners are notified; hold it
+    # to read the index together with state its listeners keep in step
+    @property
+    def lock(self):
+        return self._lock
+
+    # Float32 view of every stored embedding
+    @property
+    def embeddings(self):
+        return self._unpack(self._buffer[:self._size], self._scales[:self._size])
+
+    # Replace the whole index with freshly loaded records and embeddings
+    def build(self, records, embeddings):
+        with self._lock:
+            self._records = []
+            self._row_of = {}
+            self._buckets = {}
+            self._bucket_cache = {}
+            self._versions = {}
+            self._generation += 1
+            self._size = 0
+            self._shared = False
+
+            if not records:
+                self._buffer = torch.empty(0)
+                self._scales = torch.empty(0)
+                self._notify("build", None, None, None)
+                return
+
+            self._buffer, self._scales = self._pack(embeddings)
+            for row, record in enumerate(records):
+                self._records.append(self._store(record))
+                self._row_of[record["issueId"]] = row
+                self._buckets.setdefault(bucket_key(record), []).append(row)
+            self._size = len(records)
+            self._notify("build", None, None, None)
+
+    # Snapshot of the records and stacked float32 embeddings in one bucket.
+    # Records may be IssueRows in compact mode; pass them through hydrate().
+    # Background scans over every bucket pass cache=False, so they do not
+    # leave a float32 copy of each one behind.
+    def bucket(self, category, pincode, cache=True):
+        key = (category, pincode)
+        with self._lock:
+            cached = self._bucket_cache.get(key)
+            if cached is not None:
+                return cached
+
+            rows = self._buckets.get(key)
+            if not rows:
+                return [], None
+
+            snapshot = (
+                [self._records[r] for r in rows],
+                self._unpack(self._buffer[rows], self._scales[rows] if self.storage == "int8" else None),
+            )
+            # Compact mode dequantizes per query instead of keeping a float32
+            # copy of every bucket around; a shared snapshot is not copied
+            # into per-process memory either
+            if cache and not self.compact and not self._shared:
+                self._bucket_cache[key] = snapshot
+            return snapshot
+
+    def bucket_keys(self):
+        with self._lock:
+            return list(self._buckets)
+
+    # Changes whenever the bucket's contents change; lets callers cache
+    # per-bucket results without explicit invalidation
+    def bucket_version(self, category, pincode):
+        with self._lock:
+            return (self._generation, self._versions.get((category, pincode), 0))
+
+    # Stored records plus the packed embedding rows and scales, as written to
+    # a snapshot by index_snapshot.py
+    def export_state(self):
+        with self._lock:
+            return list(self._records), self._buffer[:self._size], self._scales[:self._size]
+
+    # Replace the whole index with exported state without copying the
+    # embedding rows, so a memory-mapped snapshot stays shared between
+    # processes
+    def load_state(self, records, packed, scales):
+        with self._lock:
+            self._records = list(records)
+            self._buffer = packed
+            self._scales = scales
+            self._size = len(self._records)
+            self._row_of = {}
+            self._buckets = {}
+            self._bucket_cache = {}
+            self._versions = {}
+            self._generation += 1
+            self._shared = True
+            for row, record in enumerate(self._records):
+                self._row_of[record_id(record)] = row
+                self._buckets.setdefault(bucket_key(record), []).append(row)
+            self._notify("build", None, None, None)
+
+    # Consistent copy of all stored records and their float32 embeddings
+    def snapshot(self):
+        with self._lock:
+            return list(self._records), self.embeddings.clone()
+
+    # Stored records and float32 embeddings for the given issue ids, skipping
+    # ids that are no longer indexed
+    def subset(self, issue_ids):
+        with self._lock:
+            rows = [self._row_of[i] for i in issue_ids if i in self._row_of]
+            if not rows:
+                return [], None
+            return (
+                [self._records[r] for r in rows],
+                self._unpack(self._buffer[rows], self._scales[rows] if self.storage == "int8" else None),
+            )
+
+    # Register fn(event, issue_id, record, embedding) to be called, under the
+    # index lock, after every "build", "upsert" and "remove"
+    def subscribe(self, fn):
+        self._listeners.append(fn)
+
+    # Full issue dict for issue_id, or None
+    def get(self, issue_id):
+        with self._lock:
+            row = self._row_of.get(issue_id)
+            return hydrate(self._records[row]) if row is not None else None
+
+    # Add a new issue or replace an existing one. When embedding is None the
+    # stored embedding is kept (metadata-only change).
+    def upsert(self, record, embedding=None):
+        issue_id = record["issueId"]
+        with self._lock:
+            row = self._row_of.get(issue_id)
+
+            if row is None:
+                if embedding is None:
+                    raise ValueError(f"New issue {issue_id} needs an embedding")
+                row = self._append_row(embedding)
+                self._records.append(self._store(record))
+                self._row_of[issue_id] = row
+                self._add_to_bucket(bucket_key(record), row)
+                self._notify("upsert", issue_id, record, embedding)
+                return
+
+            old_key = bucket_key(self._records[row])
+            new_key = bucket_key(record)
+            self._records[row] = self._store(record)
+            if embedding is not None:
+                self._set_row(row, embedding)
+
+            if old_key != new_key:
+                self._remove_from_bucket(old_key, row)
+                self._add_to_bucket(new_key, row)
+            else:
+                self._invalidate(new_key)
+            self._notify("upsert", issue_id, record, embedding)
+
+    def remove(self, issue_id):
+        with self._lock:
+            row = self._row_of.pop(issue_id, None)
+            if row is None:
+                return False
+
+            self._remove_from_bucket(bucket_key(self._records[row]), row)
+
+            last = self._size - 1
+            if row != last:
+                # Move the last row into the freed slot
+                moved = self._records[last]
+                moved_key = bucket_key(moved)
+                self._records[row] = moved
+                self._buffer[row] = self._buffer[last]
+                if self.storage == "int8":
+                    self._scales[row] = self._scales[last]
+                self._row_of[record_id(moved)] = row
+                rows = self._buckets[moved_key]
+                rows[rows.index(last)] = row
+                self._invalidate(moved_key)
+
+            self._records.pop()
+            self._size = last
+            self._notify("remove", issue_id, None, None)
+            return True
+
+    def _append_row(self, embedding):
+        embedding = embedding.reshape(-1)
+        if self._size == 0 and self._buffer.dim() != 2:
+            packed, _ = self._pack(embedding.unsqueeze(0))
+            self._buffer = torch.empty(
+                (16, embedding.shape[0]), dtype=packed.dtype, device=embedding.device
+            )
+            self._scales = torch.ones(16, device=embedding.device)
+        elif self._size == self._buffer.shape[0]:
+            capacity = max(16, self._size * 2)
+            grown = torch.empty(
+                (capacity, self._buffer.shape[1]),
+                dtype=self._buffer.dtype,
+                device=self._buffer.device,
+            )
+            grown[:self._size] = self._buffer[:self._size]
+            self._buffer = grown
+            scales = torch.ones(capacity, device=self._buffer.device)
+            scales[:self._size] = self._scales[:self._size]
+            self._scales = scales
+
+        row = self._size
+        self._set_row(row, embedding)
+        self._size += 1
+        return row
+
+    def _set_row(self, row, embedding):
+        packed, scale = self._pack(embedding.reshape(1, -1))
+        self._buffer[row] = packed[0]
+        if self.storage == "int8":
+            self._scales[row] = scale[0]
+
+    # Encode a 2D float embedding matrix for storage; returns (rows, scales)
+    def _pack(self, embeddings):
+        embeddings = embeddings.float()
+        ones = torch.ones(embeddings.shape[0], device=embeddings.device)
+        if self.storage == "fp16":
+            return embeddings.half(), ones
+        if self.storage == "int8":
+            scales = embeddings.abs().amax(dim=1).clamp_min(1e-12) / 127.0
+            packed = torch.round(embeddings / scales.unsqueeze(1)).to(torch.int8)
+            return packed, scales
+        return embeddings.clone(), ones
+
+    def _unpack(self, packed, scales=None):
+        if self.storage == "int8":
+            return packed.float() * scales.unsqueeze(1)
+        return packed.float()
+
+    def _store(self, record):
+        return IssueRow(record) if self.compact else record
+
+    def _add_to_bucket(self, key, row):
+        self._buckets.setdefault(key, []).append(row)
+        self._invalidate(key)
+
+    def _remove_from_bucket(self, key, row):
+        rows = self._buckets.get(key, [])
+        if row in rows:
+            rows.remove(row)
+        if not rows:
+            self._buckets.pop(key, None)
+        self._invalidate(key)
+
+    def _notify(self, event, issue_id, record, embedding):
+        for fn in self._listeners:
+            fn(event, issue_id, record, embedding)
+
+    def _invalidate(self, key):
+        self._bucket_cache.pop(key, None)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+
+# Issue with only the fields the index needs kept as attributes; everything
+# else is pickled and zlib-compressed until a result needs it
+class IssueRow:
+    __slots__ = ("issue_id", "category", "pincode", "payload")
+
+    def __init__(self, record):
+        self.issue_id = record["issueId"]
+        self.category = record["category"]
+        self.pincode = record["pincode"]
+        self.payload = zlib.compress(pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def hydrate(self):
+        return pickle.loads(zlib.decompress(self.payload))
+
+
+# Full issue dict for a stored record (dict or IssueRow)
+def hydrate(record):
+    return record.hydrate() if isinstance(record, IssueRow) else record
+
+def record_id(record):
+    return record.issue_id if isinstance(record, IssueRow) else record["issueId"]
+
+def bucket_key(record):
+    if isinstance(record, IssueRow):
+        return (record.category, record.pincode)
+    return (record["category"], record["pincode"])
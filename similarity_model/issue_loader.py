@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+import torch
+from issue_records import parse_issue, issue_text
+
+
+# Fields read from each issue document. Feedback, comments and anything else
+# the similarity service never returns are left in Firestore.
+ISSUE_FIELDS = [
+    "issueTitle", "description", "category", "address",
+    "upvotes", "media", "dateOfComplaint", "status",
+]
+
+_DONE = object()
+
+
+# Projected query for the similarity index. Resolved issues are still
+# skipped by parse_issue rather than filtered server-side: a "not-in"
+# status filter would also drop documents that have no status field, which
+# the index has always kept.
+def open_issues_query(db):
+    return db.collection("issues").select(ISSUE_FIELDS)
+
+
+# Stream documents from `query` on a background thread while the caller
+# encodes completed batches, so fetching and encoding overlap. At most
+# max_pending_batches parsed batches wait in memory at any time.
+# Returns (records, embeddings) like the one-shot loader.
+def load_issues(query, encode, batch_size=256, max_pending_batches=4, progress_every=5000):
+    batches = queue.Queue(maxsize=max(1, max_pending_batches))
+    stop = threading.Event()
+    fetched = [0]
+
+    def fetch():
+        try:
+            batch = []
+            for doc in query.stream():
+                if stop.is_set():
+                    return
+                fetched[0] += 1
+                record = parse_issue(doc.id, doc.to_dict())
+                if record:
+                    batch.append(record)
+                if len(batch) >= batch_size:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+            batches.put(_DONE)
+        except Exception as e:
+            batches.put(e)
+
+    fetcher = threading.Thread(target=fetch, name="issue-fetcher", daemon=True)
+    fetcher.start()
+
+    records = []
+    embedded = []
+    started = time.monotonic()
+    next_report = progress_every
+    try:
+        while True:
+            batch = batches.get()
+            if batch is _DONE:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+
+            embedded.append(encode([issue_text(r) for r in batch]))
+            records.extend(batch)
+
+            if progress_every and len(records) >= next_report:
+                rate = len(records) / max(time.monotonic() - started, 1e-9)
+                print(f"[LOAD] {fetched[0]} fetched, {len(records)} encoded ({rate:.0f} issues/s)")
+                next_report += progress_every
+    finally:
+        stop.set()
+        # The fetcher may be blocked on a full queue (the consumer stopped
+        # early, e.g. encode raised); keep taking batches until it exits
+        while fetcher.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        fetcher.join()
+
+    if not records:
+        return [], torch.tensor([])
+
+    print(f"[LOAD] Done: {fetched[0]} fetched, {len(records)} encoded in "
+          f"{time.monotonic() - started:.1f}s")
+    return records, torch.cat(embedded)
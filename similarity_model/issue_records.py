@@ -0,0 +1,64 @@
+# Pincode extraction is shared with the sentiment service's area rollups
+from common.pincode import PINCODE_PATTERN, extract_pincode
+
+# Flatten description for similarity matching
+def flatten_description(desc):
+    if isinstance(desc, list):
+        return " ".join([d.get("text", "") for d in desc])
+    return desc if isinstance(desc, str) else ""
+
+# Text that gets embedded for an issue record
+def issue_text(record):
+    return record["issueTitle"] + " " + flatten_description(record["description"])
+
+def is_resolved(data):
+    return str(data.get("status", "")).lower() == "resolved"
+
+# Turn a Firestore issue document into a similarity record.
+# Returns None for resolved or incomplete issues.
+def parse_issue(doc_id, data):
+    # Skip resolved issues
+    if is_resolved(data):
+        print(f"[SKIP] Resolved issue skipped: {doc_id}")
+        return None
+
+    required_fields = ["issueTitle", "description", "category", "address"]
+    missing_fields = [k for k in required_fields if not data.get(k)]
+    if missing_fields:
+        print(f"[SKIP] Missing fields: {missing_fields} in document: {data}")
+        return None
+
+    pincode = extract_pincode(data["address"])
+    if not pincode:
+        print(f"[SKIP] No pincode found for address: {data['address']}")
+        return None
+
+    # 🔹 Ensure description is stored as a list of dictionaries
+    descriptions = data.get("description", [])
+
+    # Convert all entries to dictionary format
+    extracted_descriptions = []
+    for d in descriptions:
+        if isinstance(d, dict):
+            extracted_descriptions.append({
+                "text": d.get("text", ""),
+                "date": d.get("date", None)
+            })
+        elif isinstance(d, str):
+            extracted_descriptions.append({
+                "text": d,
+                "date": None  # No date available
+            })
+
+    return {
+        "issueId": doc_id,
+        "issueTitle": data["issueTitle"],
+        "description": extracted_descriptions,
+        "category": data["category"],
+        "address": data["address"],
+        "pincode": pincode,
+        "upvotes": data.get("upvotes", 0),
+        "media": data.get("media", []),
+        "dateOfComplaint": data.get("dateOfComplaint", None),
+        "status": data.get("status", "Unknown")
+    }
@@ -0,0 +1,142 @@
+import threading
+from issue_records import parse_issue, issue_text
+
+
+# Applies added / changed / removed issue documents to an IssueIndex as
+# deltas. Only rows whose title or description changed are re-embedded;
+# resolved, deleted or now-invalid issues are dropped from the index.
+# Documents that match what is already indexed are skipped, so the first
+# snapshot of a listener (every document reported as added) leaves the
+# index and its bucket versions alone.
+class IssueSync:
+    def __init__(self, index, encode):
+        self.index = index
+        self.encode = encode  # callable(list[str]) -> 2D embedding tensor
+        self._watch = None
+        self._lock = threading.Lock()
+
+    # changes: iterable of (change_type, doc_id, data) where change_type is
+    # "ADDED", "MODIFIED" or "REMOVED". Only the last change to each document
+    # counts, since removals are applied before the deferred encodes.
+    def apply_changes(self, changes):
+        latest = {}
+        for change_type, doc_id, data in changes:
+            latest[doc_id] = (change_type, data)
+
+        with self._lock:
+            to_encode = []
+            metadata_only = []
+            removed = 0
+            unchanged = 0
+
+            for doc_id, (change_type, data) in latest.items():
+                record = None
+                if change_type != "REMOVED" and data is not None:
+                    record = parse_issue(doc_id, data)
+
+                if record is None:
+                    if self.index.remove(doc_id):
+                        removed += 1
+                    continue
+
+                existing = self.index.get(doc_id)
+                if existing == record:
+                    unchanged += 1
+                elif existing is not None and issue_text(existing) == issue_text(record):
+                    metadata_only.append(record)
+                else:
+                    to_encode.append(record)
+
+            for record in metadata_only:
+                self.index.upsert(record)
+
+            if to_encode:
+                embeddings = self.encode([issue_text(r) for r in to_encode])
+                for record, embedding in zip(to_encode, embeddings):
+                    self.index.upsert(record, embedding)
+
+            if to_encode or removed:
+                print(f"[SYNC] Re-embedded {len(to_encode)}, removed {removed}, "
+                      f"{len(self.index)} issues indexed")
+
+            return {"encoded": len(to_encode), "updated": len(metadata_only), "removed": removed,
+                    "unchanged": unchanged}
+
+    # Firestore on_snapshot callback
+    def on_snapshot(self, col_snapshot, changes, read_time):
+        try:
+            self.apply_changes(
+                (change.type.name, change.document.id, change.document.to_dict())
+                for change in changes
+            )
+        except Exception as e:
+            # Never let a bad document kill the watch thread
+            print(f"[ERROR] Failed to apply issue changes: {e}")
+
+    # Start listening to a Firestore query or collection (or InMemoryChangeFeed)
+    def start(self, query):
+        self._watch = query.on_snapshot(self.on_snapshot)
+        return self._watch
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+
+# Local stand-in for a Firestore collection's on_snapshot change feed, used
+# by the tests. set() and delete() deliver changes to listeners synchronously.
+class InMemoryChangeFeed:
+    def __init__(self, docs=None):
+        self.docs = dict(docs or {})
+        self._listeners = []
+
+    def on_snapshot(self, callback):
+        self._listeners.append(callback)
+        # Like Firestore, the first snapshot reports every document as added
+        callback(None, [_Change("ADDED", i, d) for i, d in self.docs.items()], None)
+        return _Watch(self._listeners, callback)
+
+    def set(self, doc_id, data):
+        change_type = "MODIFIED" if doc_id in self.docs else "ADDED"
+        self.docs[doc_id] = data
+        self._emit([_Change(change_type, doc_id, data)])
+
+    def delete(self, doc_id):
+        data = self.docs.pop(doc_id, None)
+        if data is not None:
+            self._emit([_Change("REMOVED", doc_id, data)])
+
+    def _emit(self, changes):
+        for callback in list(self._listeners):
+            callback(None, changes, None)
+
+
+class _ChangeType:
+    def __init__(self, name):
+        self.name = name
+
+
+class _Document:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Change:
+    def __init__(self, change_type, doc_id, data):
+        self.type = _ChangeType(change_type)
+        self.document = _Document(doc_id, data)
+
+
+class _Watch:
+    def __init__(self, listeners, callback):
+        self._listeners = listeners
+        self._callback = callback
+
+    def unsubscribe(self):
+        if self._callback in self._listeners:
+            self._listeners.remove(self._callback)
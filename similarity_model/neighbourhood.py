@@ -0,0 +1,40 @@
+import json
+import os
+
+
+# Search radius for /find_similar:
+#   exact     same pincode only (default, uses the bucket index)
+#   prefix    pincodes sharing the first PINCODE_PREFIX_LEN digits
+#   adjacent  the pincode plus its neighbours in the adjacency table
+#   category  every open issue in the category
+RADIUS_MODES = ("exact", "prefix", "adjacent", "category")
+
+
+# Load {pincode: [neighbouring pincodes]} from a JSON file. Adjacency is
+# made symmetric so the table only needs each pair listed once.
+def load_adjacency(path):
+    if not path or not os.path.exists(path):
+        return {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        table = json.load(f)
+
+    adjacency = {}
+    for pincode, neighbours in table.items():
+        for neighbour in neighbours:
+            adjacency.setdefault(str(pincode), set()).add(str(neighbour))
+            adjacency.setdefault(str(neighbour), set()).add(str(pincode))
+    return adjacency
+
+
+# Predicate over candidate pincodes for a radius mode, or None for no filter
+def pincode_filter(pincode, radius, prefix_len=5, adjacency=None):
+    if radius == "category":
+        return None
+    if radius == "prefix":
+        prefix = pincode[:prefix_len]
+        return lambda candidate: candidate.startswith(prefix)
+    if radius == "adjacent":
+        allowed = {pincode} | (adjacency or {}).get(pincode, set())
+        return lambda candidate: candidate in allowed
+    return lambda candidate: candidate == pincode
@@ -0,0 +1,7 @@
+from common.lru_cache import LRUCache
+
+
+# Cache key for query text: case and whitespace do not change the embedding
+# of the (uncased) SBERT model
+def normalize_text(text):
+    return " ".join(str(text).lower().split())
@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+from flask import Response
+
+# orjson is optional; it serializes the result lists several times faster
+# than the standard library
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+# Per-endpoint response size and serialization time
+class ResponseStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def record(self, endpoint, size, seconds):
+        with self._lock:
+            entry = self._endpoints.setdefault(
+                endpoint, {"responses": 0, "bytes": 0, "max_bytes": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            entry["responses"] += 1
+            entry["bytes"] += size
+            entry["max_bytes"] = max(entry["max_bytes"], size)
+            entry["seconds"] += seconds
+            entry["max_seconds"] = max(entry["max_seconds"], seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "encoder": "orjson" if orjson is not None else "json",
+                "endpoints": {
+                    endpoint: {
+                        "responses": e["responses"],
+                        "avg_bytes": round(e["bytes"] / e["responses"]),
+                        "max_bytes": e["max_bytes"],
+                        "avg_ms": round(e["seconds"] / e["responses"] * 1000, 3),
+                        "max_ms": round(e["max_seconds"] * 1000, 3),
+                    }
+                    for endpoint, e in self._endpoints.items()
+                },
+            }
+
+
+# Drop-in for `jsonify(payload), status` that uses the fast encoder and
+# records the body size and encoding time under `endpoint`
+def json_response(payload, status, endpoint, response_stats):
+    start = time.perf_counter()
+    body = dumps(payload)
+    response_stats.record(endpoint, len(body), time.perf_counter() - start)
+    return Response(body, status=status, mimetype="application/json")
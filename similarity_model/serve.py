@@ -0,0 +1,97 @@
+"""Run the similarity service with several worker processes.
+
+Starts one publisher (SIMILARITY_ROLE=publisher), which loads issues from
+Firestore, keeps them in sync and publishes index snapshots, then starts
+gunicorn with N workers that serve /find_similar from the latest snapshot.
+Workers share the model weights (preloaded before fork) and the embedding
+matrix (memory-mapped from the snapshot), so memory grows by far less than N
+copies of the single-process service.
+
+    python serve.py --workers 4
+    python serve.py --workers 4 --bind 0.0.0.0:5000 --snapshot-dir cache/snapshots
+
+If either process exits the other is stopped too.
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from index_snapshot import current_version
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--threads", type=int, default=int(os.getenv("GUNICORN_THREADS", "4")),
+                        help="request threads per worker")
+    parser.add_argument("--bind", default=os.getenv("BIND", "0.0.0.0:5000"))
+    parser.add_argument("--snapshot-dir", default=os.getenv("SNAPSHOT_DIR", os.path.join("cache", "snapshots")))
+    parser.add_argument("--startup-timeout", type=float, default=600.0,
+                        help="seconds to wait for the publisher's first snapshot")
+    args = parser.parse_args()
+
+    os.chdir(HERE)
+    env = dict(os.environ, SNAPSHOT_DIR=args.snapshot_dir)
+    previous = current_version(args.snapshot_dir)
+
+    publisher = subprocess.Popen(
+        [sys.executable, "app.py"], env=dict(env, SIMILARITY_ROLE="publisher")
+    )
+    processes = [publisher]
+
+    def stop(*_):
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    signal.signal(signal.SIGTERM, lambda *_: (stop(), sys.exit(0)))
+
+    try:
+        # Workers only start once the publisher has a fresh snapshot out
+        deadline = time.monotonic() + args.startup_timeout
+        while current_version(args.snapshot_dir) in (None, previous):
+            if publisher.poll() is not None:
+                print(f"[ERROR] Publisher exited with code {publisher.returncode}")
+                return publisher.returncode or 1
+            if time.monotonic() > deadline:
+                print("[ERROR] Timed out waiting for the first index snapshot")
+                stop()
+                return 1
+            time.sleep(0.5)
+
+        processes.append(subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", "app:app",
+                "--config", "gunicorn.conf.py",
+                "--workers", str(args.workers),
+                "--threads", str(args.threads),
+                "--bind", args.bind,
+            ],
+            env=dict(env, SIMILARITY_ROLE="worker", WEB_CONCURRENCY=str(args.workers)),
+        ))
+        print(f"[INFO] Serving on {args.bind} with {args.workers} workers")
+
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        for name, process in zip(("Publisher", "Gunicorn"), processes):
+            if process.poll() is not None:
+                print(f"[ERROR] {name} exited with code {process.returncode}")
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
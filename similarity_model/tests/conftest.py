@@ -0,0 +1,50 @@
+import hashlib
+import os
+import sys
+
+import pytest
+import torch
+
+# Service modules import each other by name and shared code from ../common
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+sys.path.append(os.path.dirname(SERVICE_DIR))
+
+DIM = 16
+
+
+# Deterministic unit-length embedding for a text, standing in for SBERT
+def fake_embedding(text):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    generator = torch.Generator().manual_seed(int.from_bytes(digest[:8], "little"))
+    return torch.nn.functional.normalize(torch.randn(DIM, generator=generator), dim=0)
+
+
+def fake_encode(texts):
+    return torch.stack([fake_embedding(t) for t in texts]) if texts else torch.empty((0, DIM))
+
+
+# Firestore issue document as the app stores it
+def issue_doc(title, category="Roads", pincode="560001", **fields):
+    doc = {
+        "issueTitle": title,
+        "description": [{"text": f"{title} details", "date": None}],
+        "category": category,
+        "address": f"12 Main Road, Bengaluru {pincode}",
+        "upvotes": 0,
+        "status": "Open",
+    }
+    doc.update(fields)
+    return doc
+
+
+@pytest.fixture
+def encode():
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return fake_encode(texts)
+
+    encode.calls = calls
+    return encode
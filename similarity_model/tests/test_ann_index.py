@@ -0,0 +1,175 @@
+import time
+
+import pytest
+import torch
+
+import ann_index
+from ann_index import IVFIndex
+from index_snapshot import SnapshotFollower, SnapshotPublisher
+from issue_index import IssueIndex
+
+DIM = 16
+
+
+# n issues per category around a few topics, so k-means has structure to find
+def clustered_records(n, categories=("Roads", "Water"), topics=8, seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    centres = torch.nn.functional.normalize(torch.randn(topics, DIM, generator=generator), dim=1)
+    records = []
+    rows = []
+    for category in categories:
+        for i in range(n):
+            noise = 0.3 * torch.randn(DIM, generator=generator)
+            rows.append(torch.nn.functional.normalize(centres[i % topics] + noise, dim=0))
+            records.append({"issueId": f"{category}-{i}", "category": category,
+                            "pincode": f"5600{i % 10:02d}"})
+    return records, torch.stack(rows)
+
+
+@pytest.fixture
+def index():
+    issue_index = IssueIndex()
+    issue_index.build(*clustered_records(300))
+    return issue_index
+
+
+def test_recall_against_brute_force(index):
+    ann = IVFIndex(index, nprobe=4, min_train_size=64)
+    stats = ann.stats()
+    assert stats["issues"] == 600
+    assert all(c["lists"] > 1 for c in stats["categories"].values())
+    assert ann.measure_recall(sample_size=100) >= 0.9
+
+    # Probing every list is exact
+    ann.nprobe = 1000
+    assert ann.measure_recall(sample_size=100) == 1.0
+
+
+def test_search_filters_by_pincode(index):
+    ann = IVFIndex(index, min_train_size=64)
+    query = index.subset(["Roads-3"])[1][0]
+    candidates = ann.search("Roads", query, allowed=lambda pincode: pincode == "560003", k=5)
+    assert candidates and all(index.get(i)["pincode"] == "560003" for i in candidates)
+    assert ann.search("Parks", query) == []
+
+
+def test_sparse_filter_stops_at_the_probe_budget(index):
+    ann = IVFIndex(index, nprobe=2, min_train_size=64)
+    lists = ann.stats()["categories"]["Roads"]["lists"]
+    assert lists > 4
+    query = index.subset(["Roads-3"])[1][0]
+    checked = []
+
+    def nowhere(pincode):
+        checked.append(pincode)
+        return False
+
+    # Nothing passes: gives up after 2 * nprobe lists instead of walking all
+    assert ann.search("Roads", query, allowed=nowhere, k=5) is None
+    assert 0 < len(checked) < 300
+
+    # With a budget covering every list, the answer is complete (and empty)
+    assert ann.search("Roads", query, allowed=nowhere, k=5, max_probes=lists) == []
+
+
+def test_changes_are_applied_incrementally(index):
+    ann = IVFIndex(index, nprobe=1000, min_train_size=64)
+    embedding = index.subset(["Roads-1"])[1][0]
+
+    index.upsert({"issueId": "new", "category": "Roads", "pincode": "560001"}, embedding)
+    assert "new" in ann.search("Roads", embedding, k=5)
+
+    # Moving to another category keeps the stored embedding
+    index.upsert({"issueId": "new", "category": "Water", "pincode": "560001"})
+    assert "new" not in ann.search("Roads", embedding, k=5)
+    assert "new" in ann.search("Water", embedding, k=5)
+
+    index.remove("new")
+    assert "new" not in ann.search("Water", embedding, k=5)
+    assert ann.stats()["issues"] == 600
+
+
+def test_reloading_the_index_does_not_retrain(index, monkeypatch):
+    ann = IVFIndex(index, min_train_size=64)
+    calls = []
+    monkeypatch.setattr(ann_index, "_spherical_kmeans", lambda *args: calls.append(args))
+
+    index.load_state(*index.export_state())
+    assert calls == []
+
+
+def test_growing_category_retrains_in_the_background(index):
+    ann = IVFIndex(index, min_train_size=64, retrain_factor=2)
+    before = ann.stats()["categories"]["Roads"]["lists"]
+
+    records, embeddings = clustered_records(300, categories=("Roads",), seed=1)
+    for record, embedding in zip(records, embeddings):
+        record["issueId"] += "-new"
+        index.upsert(record, embedding)
+
+    deadline = time.monotonic() + 10
+    while ann.stats()["categories"]["Roads"]["lists"] == before and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert ann.stats()["categories"]["Roads"]["lists"] > before
+    assert ann.stats()["categories"]["Roads"]["issues"] == 600
+    ann.nprobe = 1000
+    assert ann.measure_recall(sample_size=100) == 1.0
+
+
+def test_state_round_trip_gives_the_same_candidates(index):
+    ann = IVFIndex(index, nprobe=2, min_train_size=64)
+    loaded = IVFIndex(index, nprobe=2, train=False)
+    loaded.load_state(ann.export_state())
+
+    _, embeddings = index.snapshot()
+    for row in range(0, 600, 37):
+        category = "Roads" if row < 300 else "Water"
+        assert sorted(loaded.search(category, embeddings[row])) == sorted(ann.search(category, embeddings[row]))
+
+
+def test_workers_load_the_published_lists(index, tmp_path, monkeypatch):
+    ann = IVFIndex(index, nprobe=2, min_train_size=64)
+    SnapshotPublisher(index, str(tmp_path), ann_index=ann).publish()
+
+    calls = []
+    monkeypatch.setattr(ann_index, "_spherical_kmeans", lambda *args: calls.append(args))
+    worker_index = IssueIndex()
+    worker_ann = IVFIndex(worker_index, nprobe=2, train=False)
+    assert SnapshotFollower(worker_index, str(tmp_path), ann_index=worker_ann).refresh()
+
+    assert calls == []
+    assert worker_ann.stats() == ann.stats()
+    query = index.subset(["Water-7"])[1][0]
+    assert worker_ann.search("Water", query) == ann.search("Water", query)
+
+
+def test_snapshot_without_lists_trains_in_the_worker(index, tmp_path):
+    SnapshotPublisher(index, str(tmp_path)).publish()
+
+    worker_index = IssueIndex()
+    worker_ann = IVFIndex(worker_index, min_train_size=64, train=False)
+    SnapshotFollower(worker_index, str(tmp_path), ann_index=worker_ann).refresh()
+    assert worker_ann.stats()["issues"] == 600
+
+
+def test_changes_during_training_are_kept(index, monkeypatch):
+    ann = IVFIndex(index, nprobe=1000, min_train_size=64)
+    embedding = index.subset(["Water-2"])[1][0]
+    kmeans = ann_index._spherical_kmeans
+    changes = [
+        lambda: index.upsert({"issueId": "late", "category": "Water", "pincode": "560002"}, embedding),
+        lambda: index.remove("Water-2"),
+    ]
+
+    # Training runs outside the index lock, so the index keeps changing
+    def train_while_changing(*args):
+        if changes:
+            changes.pop(0)()
+        return kmeans(*args)
+
+    monkeypatch.setattr(ann_index, "_spherical_kmeans", train_while_changing)
+    ann.rebuild()
+
+    candidates = ann.search("Water", embedding, k=5)
+    assert "late" in candidates and "Water-2" not in candidates
+    assert ann.stats()["issues"] == len(index) == 600
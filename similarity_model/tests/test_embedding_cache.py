@@ -0,0 +1,27 @@
+import os
+
+from embedding_cache import model_fingerprint
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def test_model_fingerprint_follows_file_contents(tmp_path):
+    model = tmp_path / "model"
+    write(str(model / "config.json"), b'{"hidden_size": 16}')
+    write(str(model / "model.safetensors"), b"\x00" * 1024)
+    write(str(model / "1_Pooling" / "config.json"), b'{"pooling_mode_mean_tokens": true}')
+    write(str(model / "README.md"), b"# Model")
+    fingerprint = model_fingerprint(str(model))
+
+    # Touching or copying the files, or editing docs, keeps it
+    os.utime(model / "model.safetensors", ns=(0, 0))
+    write(str(model / "README.md"), b"# Fine-tuned model")
+    assert model_fingerprint(str(model)) == fingerprint
+
+    # Changed weights of the same size do not
+    write(str(model / "model.safetensors"), b"\x01" + b"\x00" * 1023)
+    assert model_fingerprint(str(model)) != fingerprint
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from conftest import fake_encode
+from encode_batcher import EncodeBatcher
+
+
+def test_lone_text_is_encoded_without_waiting():
+    batcher = EncodeBatcher(fake_encode, max_wait_ms=2000)
+    try:
+        start = time.monotonic()
+        batcher.encode("pothole")
+        batcher.encode("streetlight")
+        assert time.monotonic() - start < 1.0
+        assert batcher.stats()["waited_batches"] == 0
+    finally:
+        batcher.close()
+
+
+def test_texts_arriving_during_a_batch_are_coalesced():
+    release = threading.Event()
+    calls = []
+
+    def slow_encode(texts):
+        calls.append(list(texts))
+        if len(calls) == 1:
+            release.wait(5)
+        return fake_encode(texts)
+
+    batcher = EncodeBatcher(slow_encode, max_batch_size=4, max_wait_ms=2000)
+    try:
+        first = threading.Thread(target=batcher.encode, args=("first",))
+        first.start()
+        while not calls:
+            time.sleep(0.001)
+
+        # Queued while the first batch runs; the batch fills up, so nobody
+        # waits out the window
+        others = [threading.Thread(target=batcher.encode, args=(f"text {i}",)) for i in range(4)]
+        for thread in others:
+            thread.start()
+        while batcher.stats()["queue_depth"] < 4:
+            time.sleep(0.001)
+        release.set()
+        for thread in [first] + others:
+            thread.join(5)
+
+        assert calls[0] == ["first"]
+        assert sorted(calls[1]) == [f"text {i}" for i in range(4)]
+        assert batcher.stats()["waited_batches"] == 1
+    finally:
+        batcher.close()
@@ -0,0 +1,278 @@
+import pytest
+import torch
+
+from conftest import fake_embedding, issue_doc
+from duplicate_clusters import DuplicateClusters
+from issue_index import STORAGE_MODES, IssueIndex, hydrate, record_id
+from issue_records import issue_text, parse_issue
+from issue_sync import InMemoryChangeFeed, IssueSync
+
+# Largest cosine error each storage mode may introduce
+TOLERANCE = {"full": 1e-6, "fp16": 1e-3, "int8": 1e-2}
+
+
+def records_for(docs):
+    records = [parse_issue(doc_id, data) for doc_id, data in docs.items()]
+    return [r for r in records if r is not None]
+
+
+def build_index(docs, storage="full"):
+    records = records_for(docs)
+    index = IssueIndex(storage=storage)
+    index.build(records, torch.stack([fake_embedding(issue_text(r)) for r in records]))
+    return index
+
+
+# Bucket contents as {issueId: (record, embedding)}
+def bucket_contents(index, category, pincode):
+    records, embeddings = index.bucket(category, pincode)
+    if not records:
+        return {}
+    return {record_id(r): (hydrate(r), e) for r, e in zip(records, embeddings)}
+
+
+# Every bucket of `index` holds exactly what a fresh build from `docs` holds
+def assert_matches_fresh_build(index, docs):
+    expected = build_index(docs, storage=index.storage)
+    assert len(index) == len(expected)
+    assert sorted(index.bucket_keys()) == sorted(expected.bucket_keys())
+    for key in expected.bucket_keys():
+        actual = bucket_contents(index, *key)
+        wanted = bucket_contents(expected, *key)
+        assert actual.keys() == wanted.keys()
+        for issue_id, (record, embedding) in wanted.items():
+            assert actual[issue_id][0] == record
+            assert torch.allclose(actual[issue_id][1], embedding, atol=TOLERANCE[index.storage])
+
+
+@pytest.fixture
+def docs():
+    return {
+        "a": issue_doc("Pothole on 5th cross"),
+        "b": issue_doc("Broken streetlight", category="Electricity"),
+        "c": issue_doc("Garbage not collected", category="Sanitation", pincode="560002"),
+        "d": issue_doc("Deep pothole near school"),
+        "e": issue_doc("Waterlogging after rain"),
+    }
+
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_build_groups_issues_into_buckets(docs, storage):
+    index = build_index(docs, storage)
+
+    assert len(index) == 5
+    assert set(bucket_contents(index, "Roads", "560001")) == {"a", "d", "e"}
+    assert set(bucket_contents(index, "Sanitation", "560002")) == {"c"}
+    assert index.bucket("Roads", "999999") == ([], None)
+
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_add_update_remove_round_trip(docs, storage):
+    index = build_index(docs, storage)
+
+    docs["f"] = issue_doc("Open manhole")
+    record = parse_issue("f", docs["f"])
+    index.upsert(record, fake_embedding(issue_text(record)))
+    assert_matches_fresh_build(index, docs)
+
+    # Metadata-only change keeps the stored embedding
+    docs["a"] = issue_doc("Pothole on 5th cross", upvotes=7)
+    index.upsert(parse_issue("a", docs["a"]))
+    assert_matches_fresh_build(index, docs)
+    assert index.get("a")["upvotes"] == 7
+
+    # Text change with a new embedding
+    docs["d"] = issue_doc("Deep pothole near the school gate")
+    record = parse_issue("d", docs["d"])
+    index.upsert(record, fake_embedding(issue_text(record)))
+    assert_matches_fresh_build(index, docs)
+
+    # Moving to another bucket
+    docs["e"] = issue_doc("Waterlogging after rain", pincode="560002")
+    index.upsert(parse_issue("e", docs["e"]))
+    assert_matches_fresh_build(index, docs)
+    assert "e" not in bucket_contents(index, "Roads", "560001")
+
+    del docs["b"]
+    assert index.remove("b")
+    assert not index.remove("b")
+    assert_matches_fresh_build(index, docs)
+    assert "Electricity" not in [category for category, _ in index.bucket_keys()]
+
+
+def test_new_issue_needs_an_embedding(docs):
+    index = build_index(docs)
+    with pytest.raises(ValueError):
+        index.upsert(parse_issue("z", issue_doc("No embedding")))
+
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_swap_remove_moves_last_row(docs, storage):
+    index = build_index(docs, storage)
+    last = record_id(index.records[-1])
+
+    # Removing the first row moves the last one into its slot
+    del docs[record_id(index.records[0])]
+    index.remove(record_id(index.records[0]))
+
+    assert record_id(index.records[0]) == last
+    records, embeddings = index.subset([last])
+    assert torch.allclose(embeddings[0], fake_embedding(issue_text(hydrate(records[0]))),
+                          atol=TOLERANCE[storage])
+    assert_matches_fresh_build(index, docs)
+
+    # Removing everything leaves an index that can grow again
+    for issue_id in list(docs):
+        index.remove(issue_id)
+    assert len(index) == 0 and index.bucket_keys() == []
+    record = parse_issue("g", issue_doc("Fallen tree"))
+    index.upsert(record, fake_embedding(issue_text(record)))
+    assert_matches_fresh_build(index, {"g": issue_doc("Fallen tree")})
+
+
+def test_growing_past_capacity_keeps_rows(docs):
+    index = build_index(docs)
+    for n in range(40):
+        docs[f"n{n}"] = issue_doc(f"New issue {n}", pincode=f"56{n:04d}")
+        record = parse_issue(f"n{n}", docs[f"n{n}"])
+        index.upsert(record, fake_embedding(issue_text(record)))
+    assert_matches_fresh_build(index, docs)
+
+
+def test_bucket_versions_change_only_for_touched_buckets(docs):
+    index = build_index(docs)
+    roads = index.bucket_version("Roads", "560001")
+    sanitation = index.bucket_version("Sanitation", "560002")
+
+    index.upsert(parse_issue("a", issue_doc("Pothole on 5th cross", upvotes=3)))
+    assert index.bucket_version("Roads", "560001") != roads
+    assert index.bucket_version("Sanitation", "560002") == sanitation
+
+    # Moving an issue changes both its old and its new bucket
+    roads = index.bucket_version("Roads", "560001")
+    index.upsert(parse_issue("e", issue_doc("Waterlogging after rain", category="Sanitation",
+                                            pincode="560002")))
+    assert index.bucket_version("Roads", "560001") != roads
+    assert index.bucket_version("Sanitation", "560002") != sanitation
+
+    # A swap-remove changes the bucket of the row that moved
+    sanitation = index.bucket_version("Sanitation", "560002")
+    moved = record_id(index.records[-1])
+    moved_key = (hydrate(index.records[-1])["category"], hydrate(index.records[-1])["pincode"])
+    before = index.bucket_version(*moved_key)
+    index.remove(record_id(index.records[0]))
+    assert moved != record_id(index.records[-1])
+    assert index.bucket_version(*moved_key) != before
+
+    # A rebuild changes every bucket
+    versions = {key: index.bucket_version(*key) for key in index.bucket_keys()}
+    index.build(records_for(docs), torch.stack([fake_embedding(issue_text(r)) for r in records_for(docs)]))
+    assert all(index.bucket_version(*key) != version for key, version in versions.items())
+
+
+def test_bucket_snapshot_is_cached_until_the_bucket_changes(docs):
+    index = build_index(docs)
+    first = index.bucket("Roads", "560001")
+    assert index.bucket("Roads", "560001") is first
+
+    index.upsert(parse_issue("d", issue_doc("Deep pothole near school", upvotes=1)))
+    assert index.bucket("Roads", "560001") is not first
+
+
+def test_duplicate_scan_leaves_the_bucket_cache_empty(docs):
+    index = build_index(docs)
+    clusters = DuplicateClusters(index)
+    clusters.run()
+    assert index._bucket_cache == {}
+
+    # A bucket a request already cached is reused, not copied again
+    first = index.bucket("Roads", "560001")
+    assert index.bucket("Roads", "560001", cache=False) is first
+    assert index.bucket("Sanitation", "560002", cache=False)[0]
+    assert list(index._bucket_cache) == [("Roads", "560001")]
+
+
+def test_listeners_see_every_change(docs):
+    index = IssueIndex()
+    events = []
+    index.subscribe(lambda event, issue_id, record, embedding: events.append(
+        (event, issue_id, embedding is not None)
+    ))
+
+    records = records_for(docs)
+    index.build(records, torch.stack([fake_embedding(issue_text(r)) for r in records]))
+    record = parse_issue("f", issue_doc("Open manhole"))
+    index.upsert(record, fake_embedding(issue_text(record)))
+    index.upsert(parse_issue("a", issue_doc("Pothole on 5th cross", upvotes=2)))
+    index.remove("c")
+    index.remove("missing")
+
+    assert events == [
+        ("build", None, False),
+        ("upsert", "f", True),
+        ("upsert", "a", False),
+        ("remove", "c", False),
+    ]
+
+
+@pytest.mark.parametrize("storage", ["fp16", "int8"])
+def test_compact_modes_keep_scores_close(docs, storage):
+    full = build_index(docs, "full")
+    compact = build_index(docs, storage)
+    query = fake_embedding("pothole")
+
+    full_records, full_embeddings = full.bucket("Roads", "560001")
+    compact_records, compact_embeddings = compact.bucket("Roads", "560001")
+    assert [record_id(r) for r in compact_records] == [record_id(r) for r in full_records]
+    assert torch.allclose(compact_embeddings @ query, full_embeddings @ query, atol=TOLERANCE[storage])
+
+    # Compact records hydrate back to the full issue dict
+    assert all(not isinstance(r, dict) for r in compact_records)
+    assert [hydrate(r) for r in compact_records] == full_records
+    assert compact.get("a") == full.get("a")
+
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_export_and_load_state_round_trip(docs, storage):
+    index = build_index(docs, storage)
+    loaded = IssueIndex(storage=storage)
+    loaded.load_state(*index.export_state())
+    assert_matches_fresh_build(loaded, docs)
+
+    # A loaded index still takes changes
+    docs["f"] = issue_doc("Open manhole")
+    record = parse_issue("f", docs["f"])
+    loaded.upsert(record, fake_embedding(issue_text(record)))
+    del docs["a"]
+    loaded.remove("a")
+    assert_matches_fresh_build(loaded, docs)
+
+
+@pytest.mark.parametrize("storage", STORAGE_MODES)
+def test_change_feed_keeps_index_in_sync(docs, storage, encode):
+    feed = InMemoryChangeFeed(docs)
+    index = IssueIndex(storage=storage)
+    sync = IssueSync(index, encode)
+    sync.start(feed)
+    assert_matches_fresh_build(index, feed.docs)
+
+    feed.set("f", issue_doc("Open manhole"))
+    feed.set("a", issue_doc("Pothole on 5th cross", upvotes=4))
+    feed.set("d", issue_doc("Deep pothole near the school gate"))
+    feed.set("e", issue_doc("Waterlogging after rain", category="Drainage"))
+    feed.delete("b")
+    # Resolved and invalid issues leave the index
+    feed.set("c", issue_doc("Garbage not collected", category="Sanitation", pincode="560002",
+                            status="Resolved"))
+    feed.set("g", issue_doc("No pincode here", address="Main Road"))
+    assert "c" not in [record_id(r) for r in index.records]
+    assert "g" not in [record_id(r) for r in index.records]
+    assert_matches_fresh_build(index, feed.docs)
+
+    # Reopening brings the issue back
+    feed.set("c", issue_doc("Garbage not collected", category="Sanitation", pincode="560002"))
+    assert_matches_fresh_build(index, feed.docs)
+
+    sync.stop()
+    feed.set("h", issue_doc("Not synced"))
+    assert index.get("h") is None
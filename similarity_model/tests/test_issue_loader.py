@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from conftest import fake_encode, issue_doc
+from issue_loader import load_issues
+
+
+class Doc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Query:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def stream(self):
+        for doc_id, data in self.docs.items():
+            yield Doc(doc_id, data)
+
+
+def fetcher_alive():
+    return any(t.name == "issue-fetcher" for t in threading.enumerate())
+
+
+def test_loads_open_issues_in_batches(encode):
+    docs = {f"i{n}": issue_doc(f"Issue {n}") for n in range(10)}
+    docs["resolved"] = issue_doc("Fixed", status="Resolved")
+    no_status = issue_doc("Imported issue")
+    del no_status["status"]
+    docs["imported"] = no_status
+
+    records, embeddings = load_issues(Query(docs), encode, batch_size=4, progress_every=0)
+
+    assert [r["issueId"] for r in records] == [f"i{n}" for n in range(10)] + ["imported"]
+    assert records[-1]["status"] == "Unknown"
+    assert embeddings.shape[0] == len(records)
+    assert [len(batch) for batch in encode.calls] == [4, 4, 3]
+
+
+def test_failed_encode_stops_the_fetcher():
+    docs = {f"i{n}": issue_doc(f"Issue {n}") for n in range(100)}
+
+    def encode(texts):
+        raise RuntimeError("model crashed")
+
+    # The fetcher fills the queue and blocks on it while encode fails
+    with pytest.raises(RuntimeError):
+        load_issues(Query(docs), encode, batch_size=2, max_pending_batches=1, progress_every=0)
+    assert not fetcher_alive()
+
+
+def test_fetch_errors_reach_the_caller():
+    class Broken(Query):
+        def stream(self):
+            yield Doc("i0", issue_doc("Issue 0"))
+            raise ConnectionError("stream reset")
+
+    with pytest.raises(ConnectionError):
+        load_issues(Broken({}), fake_encode, batch_size=2, progress_every=0)
+    assert not fetcher_alive()
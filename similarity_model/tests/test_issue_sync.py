@@ -0,0 +1,101 @@
+import torch
+
+from conftest import fake_encode, issue_doc
+from issue_index import IssueIndex
+from issue_records import issue_text, parse_issue
+from issue_sync import InMemoryChangeFeed, IssueSync
+
+
+def loaded_index(docs):
+    records = [parse_issue(doc_id, data) for doc_id, data in docs.items()]
+    index = IssueIndex()
+    index.build(records, fake_encode([issue_text(r) for r in records]))
+    return index
+
+
+def docs():
+    return {
+        "a": issue_doc("Pothole on 5th cross"),
+        "b": issue_doc("Broken streetlight", category="Electricity"),
+        "c": issue_doc("Deep pothole near school"),
+    }
+
+
+def test_first_snapshot_of_loaded_issues_changes_nothing(encode):
+    index = loaded_index(docs())
+    versions = {key: index.bucket_version(*key) for key in index.bucket_keys()}
+    events = []
+    index.subscribe(lambda *args: events.append(args))
+
+    sync = IssueSync(index, encode)
+    sync.start(InMemoryChangeFeed(docs()))
+
+    assert encode.calls == []
+    assert events == []
+    assert {key: index.bucket_version(*key) for key in index.bucket_keys()} == versions
+
+
+def test_only_changed_documents_are_applied(encode):
+    index = loaded_index(docs())
+    sync = IssueSync(index, encode)
+    feed = InMemoryChangeFeed(docs())
+    sync.start(feed)
+
+    # Unchanged re-delivery
+    roads = index.bucket_version("Roads", "560001")
+    feed.set("a", issue_doc("Pothole on 5th cross"))
+    assert index.bucket_version("Roads", "560001") == roads
+
+    # Metadata change: applied without encoding
+    feed.set("a", issue_doc("Pothole on 5th cross", upvotes=3))
+    assert index.get("a")["upvotes"] == 3
+    assert index.bucket_version("Roads", "560001") != roads
+    assert encode.calls == []
+
+    # Text change: only that issue is encoded
+    feed.set("c", issue_doc("Deep pothole near the school gate"))
+    assert encode.calls == [["Deep pothole near the school gate Deep pothole near the school gate details"]]
+
+
+def test_apply_changes_reports_counts(encode):
+    index = loaded_index(docs())
+    sync = IssueSync(index, encode)
+
+    result = sync.apply_changes([
+        ("ADDED", "a", issue_doc("Pothole on 5th cross")),
+        ("MODIFIED", "b", issue_doc("Broken streetlight", category="Electricity", upvotes=1)),
+        ("MODIFIED", "c", issue_doc("Pothole fixed badly")),
+        ("ADDED", "d", issue_doc("Open manhole")),
+        ("REMOVED", "e", None),
+    ])
+    assert result == {"encoded": 2, "updated": 1, "removed": 0, "unchanged": 1}
+
+    result = sync.apply_changes([("MODIFIED", "a", issue_doc("Pothole on 5th cross", status="Resolved"))])
+    assert result["removed"] == 1
+    assert index.get("a") is None
+    assert torch.equal(index.subset(["d"])[1][0], fake_encode(["Open manhole Open manhole details"])[0])
+
+
+def test_only_the_last_change_to_a_document_counts(encode):
+    index = loaded_index(docs())
+    sync = IssueSync(index, encode)
+
+    result = sync.apply_changes([
+        ("ADDED", "d", issue_doc("Open manhole")),
+        ("REMOVED", "d", None),
+        ("MODIFIED", "a", issue_doc("Pothole on 5th cross, now deeper")),
+        ("REMOVED", "a", None),
+        ("MODIFIED", "c", issue_doc("Deep pothole near the school gate")),
+        ("MODIFIED", "c", issue_doc("Deep pothole near the school gate", upvotes=2)),
+    ])
+    assert result == {"encoded": 1, "updated": 0, "removed": 1, "unchanged": 0}
+    assert index.get("d") is None and index.get("a") is None
+    assert index.get("c")["upvotes"] == 2
+    assert encode.calls == [["Deep pothole near the school gate Deep pothole near the school gate details"]]
+
+    # Removed, then added back
+    sync.apply_changes([
+        ("REMOVED", "b", None),
+        ("ADDED", "b", issue_doc("Broken streetlight", category="Electricity")),
+    ])
+    assert index.get("b") is not None